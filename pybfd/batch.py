@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# 
+# Copyright (c) 2013 Groundworks Technologies
+# 
+# This code is part PyBFD module (libbfd & libopcodes extension module)
+#
+
+import json
+
+from argparse import ArgumentParser, FileType
+from multiprocessing import Pipe, Process, cpu_count
+from os import kill, walk
+from os.path import isdir, islink, isfile, join
+from select import select
+from signal import SIGKILL
+from sys import stdout
+from time import time
+
+import bfd
+from opcodes import Opcodes
+from parallel import get_code_sections
+
+__author__      = "Groundworks Technologies OSS Team"
+__contact__     = "oss@groundworkstech.com"
+__company__     = "Groundworks Technologies"
+__year__        = "2013"
+__version__     = "0.1"
+__description__ = "Scan binaries in parallel and report them as NDJSON"
+
+__all__ = ["iter_paths", "scan_file", "scan"]
+
+# Default number of seconds a single file may take.
+DEFAULT_TIMEOUT = 60
+
+
+def _decode(value):
+    """Return a unicode string from a (possibly non UTF-8) byte string."""
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return value.decode("latin-1")
+
+def iter_paths(paths, files_from=None):
+    """
+    Iterate through the given file paths, the files inside the given
+    directory trees and the paths listed (one per line) in the files_from
+    file object. Symbolic links found inside directories are skipped.
+
+    """
+    if files_from is not None:
+        for line in files_from:
+            path = line.rstrip("\r\n")
+            if path:
+                yield path
+
+    for path in paths:
+        if not isdir(path):
+            yield path
+            continue
+
+        for root, dirnames, filenames in walk(path):
+            dirnames.sort()
+
+            for filename in sorted(filenames):
+                filename = join(root, filename)
+
+                if isfile(filename) and not islink(filename):
+                    yield filename
+
+def scan_file(path, symbols=True, disassemble=False):
+    """
+    Open the given file and extract its sections and (optionally) symbols
+    and disassembly.
+
+    @return : A dict ready to be serialized as JSON.
+
+    """
+    abfd = bfd.Bfd(path)
+
+    try:
+        record = {
+            "path" : _decode(path),
+            "format" : abfd.file_format_name,
+            "target" : abfd.target,
+            "architecture" : abfd.architecture_name,
+            }
+
+        if abfd.is_archive:
+            record["members"] = [
+                _decode(name) for name in abfd.archive_filenames]
+            return record
+
+        record["arch_size"] = abfd.arch_size
+        record["start_address"] = abfd.start_address
+
+        record["sections"] = [{
+            "name" : _decode(section.name),
+            "vma" : section.vma,
+            "size" : section.size,
+            "flags" : section.flags,
+            } for section in sorted(abfd.sections.itervalues(),
+                key=lambda section: section.index)]
+
+        if symbols and abfd.has_symbols:
+            table = abfd.symbols
+            record["symbols"] = [{
+                "name" : _decode(symbol.name),
+                "address" : address,
+                "flags" : symbol.flags,
+                } for address, symbol in table.filter_flags()]
+
+        if disassemble:
+            opcodes = Opcodes(abfd)
+            try:
+                record["disassembly"] = dict(
+                    (_decode(section.name), opcodes.disassemble(
+                        section.content, section.vma)) \
+                    for section in get_code_sections(abfd))
+            finally:
+                opcodes.close()
+
+        return record
+
+    finally:
+        abfd.close()
+
+def _worker(connection, symbols, disassemble):
+    """
+    Worker process main loop. Scan every path received until a None is
+    found and send back every result as a JSON line.
+
+    """
+    for path in iter(connection.recv, None):
+        try:
+            record = scan_file(path, symbols, disassemble)
+        except Exception, err:
+            # Report the failure and move on with the next file.
+            record = {"path" : _decode(path), "error" : str(err)}
+
+        connection.send(json.dumps(record))
+
+
+class _Worker(object):
+    """
+    Worker process supervised by the parent. It's given a single path at a
+    time so the parent always knows which file a lost worker was scanning.
+    Only for internal use.
+
+    """
+
+    def __init__(self, symbols, disassemble):
+        self.connection, child_connection = Pipe()
+
+        self.process = Process(target=_worker,
+            args=(child_connection, symbols, disassemble))
+        self.process.daemon = True
+        self.process.start()
+
+        child_connection.close()
+
+        # Path being scanned (if any) and the time it must be done by.
+        self.path = None
+        self.deadline = None
+
+    def assign(self, path, timeout):
+        """Send the path to scan. Return False if the worker is gone."""
+        self.path = path
+        self.deadline = None if timeout is None else time() + timeout
+
+        try:
+            self.connection.send(path)
+        except (IOError, OSError):
+            return False
+
+        return True
+
+    def receive(self):
+        """Return the JSON line of the current path or None if the worker
+        is gone."""
+        try:
+            line = self.connection.recv()
+        except (EOFError, IOError, OSError):
+            return None
+
+        self.path = None
+
+        return line
+
+    def kill(self):
+        """Kill the process (even if hung inside native code)."""
+        try:
+            kill(self.process.pid, SIGKILL)
+        except OSError:
+            pass
+
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        """Let the process finish once idle."""
+        try:
+            self.connection.send(None)
+        except (IOError, OSError):
+            pass
+
+        self.process.join()
+        self.connection.close()
+
+def scan(paths, output, workers=None, timeout=DEFAULT_TIMEOUT, symbols=True,
+    disassemble=False):
+    """
+    Scan the given paths using a pool of worker processes writing one JSON
+    line per file to the output file object (in completion order). Paths
+    are handed out one at a time so only a few of them are in memory at
+    once.
+
+    Workers taking longer than timeout seconds (None for no limit) on a file
+    are killed, and those dying (i.e. crashed inside native code) are
+    replaced. The file being scanned is then reported with a "timeout" or
+    "crashed" error.
+
+    @return : The number of files scanned.
+
+    """
+    if workers is None:
+        workers = cpu_count()
+
+    paths = iter(paths)
+    counter = [0]
+
+    def write(record):
+        output.write(record if isinstance(record, basestring) \
+            else json.dumps(record))
+        output.write("\n")
+        counter[0] += 1
+
+    def assign_next(worker=None):
+        """Give the next path to the worker (a new one if None or dead).
+        Return the worker or None once every path was handed out."""
+        for path in paths:
+            if worker is None:
+                worker = _Worker(symbols, disassemble)
+
+            if worker.assign(path, timeout):
+                return worker
+
+            write({"path" : _decode(path), "error" : "crashed"})
+
+            worker.kill()
+            worker = None
+
+        if worker is not None:
+            worker.stop()
+
+        return None
+
+    busy = filter(None, [assign_next() for i in xrange(workers)])
+
+    while busy:
+        deadlines = [worker.deadline for worker in busy \
+            if worker.deadline is not None]
+
+        wait = 1.0
+        if deadlines:
+            wait = min(wait, max(0, min(deadlines) - time()))
+
+        ready, _, _ = select(
+            [worker.connection for worker in busy], [], [], wait)
+
+        now = time()
+
+        for index, worker in enumerate(busy):
+            if worker.connection in ready:
+                line = worker.receive()
+
+                if line is not None:
+                    write(line)
+                    busy[index] = assign_next(worker)
+                    continue
+
+                error = "crashed"
+
+            elif worker.deadline is not None and now >= worker.deadline:
+                error = "timeout"
+
+            elif not worker.process.is_alive():
+                error = "crashed"
+
+            else:
+                continue
+
+            # The worker is lost along with the file it was scanning.
+            write({"path" : _decode(worker.path), "error" : error})
+
+            worker.kill()
+            busy[index] = assign_next()
+
+        busy = filter(None, busy)
+
+    return counter[0]
+
+def init_parser():
+    """Initialize option parser."""
+    parser = ArgumentParser(description=__description__)
+
+    parser.add_argument("paths", nargs="*",
+        help="Files or directory trees to scan")
+
+    parser.add_argument("-f", "--files-from", type=FileType("r"),
+        help="Read the paths to scan from a file ('-' for stdin)")
+
+    parser.add_argument("-o", "--output", type=FileType("w"), default=stdout,
+        help="Write the results to a file instead of stdout")
+
+    parser.add_argument("-j", "--jobs", type=int, default=cpu_count(),
+        help="Number of worker processes (default: %(default)s)")
+
+    parser.add_argument("-t", "--timeout", type=int, default=DEFAULT_TIMEOUT,
+        help="Maximum number of seconds per file (default: %(default)s)")
+
+    parser.add_argument("--no-symbols", action="store_false", dest="symbols",
+        help="Do not extract symbols")
+
+    parser.add_argument("-d", "--disassemble", action="store_true",
+        help="Disassemble executable sections")
+
+    return parser
+
+def main():
+    parser = init_parser()
+
+    args = parser.parse_args()
+
+    if not args.paths and args.files_from is None:
+        parser.print_help()
+        return
+
+    scan(iter_paths(args.paths, args.files_from), args.output,
+        args.jobs, args.timeout, args.symbols, args.disassemble)
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,12 @@
 //
 
 #include <Python.h>
+#include <pythread.h>
 
 #include <stdio.h>
 #include <stdarg.h>
 #include <string.h>
+#include <sys/stat.h>
 
 #include "bfd_headers.h"
 
@@ -18,6 +20,117 @@
 char** environ;
 #endif
 
+//
+// libbfd isn't thread safe. Every libbfd call (made with or without holding
+// the GIL) is serialized through this lock. Python objects that might run
+// arbitrary code (containers) are created after releasing it whenever
+// possible.
+//
+static PyThread_type_lock bfd_lock = NULL;
+
+//
+// Name     : bfd_lock_acquire
+//
+// Purpose  : Acquire the libbfd lock while holding the GIL. The GIL is
+//              released while waiting so the current owner can finish.
+//
+// Params   : -
+//
+// Returns  : -
+//
+static void
+bfd_lock_acquire(void) {
+    if (!PyThread_acquire_lock(bfd_lock, NOWAIT_LOCK)) {
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(bfd_lock, WAIT_LOCK);
+        Py_END_ALLOW_THREADS
+    }
+}
+
+//
+// Name     : canonicalize_symbol_table
+//
+// Purpose  : Canonicalize both the static and the dynamic symbol tables of the
+//              BFD into a single newly allocated table. It doesn't touch any
+//              Python object.
+//
+// Params   :   @abfd : The current BFD.
+//              @symbol_table : Destination of the table (release with free).
+//
+// Returns  : On success return the total number of symbols found (could be 0).
+//              On error returns -1.
+//
+static long
+canonicalize_symbol_table(bfd* abfd, asymbol*** symbol_table) {
+    long storage_needed_static,
+        storage_needed_dynamic,
+        number_of_symbols_static = 0,
+        number_of_symbols_dynamic = 0;
+
+    // Calculate the space necessary to hold all the symbolic information.
+    // A negative value means that there is no such table (i.e. the dynamic
+    // one on static executables).
+    storage_needed_static = bfd_get_symtab_upper_bound (abfd);
+    storage_needed_dynamic = bfd_get_dynamic_symtab_upper_bound (abfd);
+
+    if (storage_needed_static < 0)
+        storage_needed_static = 0;
+
+    if (storage_needed_dynamic < 0)
+        storage_needed_dynamic = 0;
+
+    // Always allocate room for the table terminator.
+    *symbol_table = (asymbol **) malloc(
+        storage_needed_static + storage_needed_dynamic + sizeof(asymbol *));
+
+    if (!*symbol_table)
+        return -1;
+
+    if (storage_needed_static)
+        number_of_symbols_static =
+            bfd_canonicalize_symtab(abfd, *symbol_table);
+
+    if (number_of_symbols_static < 0)
+        number_of_symbols_static = 0;
+
+    if (storage_needed_dynamic)
+        number_of_symbols_dynamic =
+            bfd_canonicalize_dynamic_symtab(
+                abfd, &(*symbol_table)[number_of_symbols_static]);
+
+    if (number_of_symbols_dynamic < 0)
+        number_of_symbols_dynamic = 0;
+
+    return number_of_symbols_static + number_of_symbols_dynamic;
+}
+
+//
+// Name     : read_symbol_table
+//
+// Purpose  : Canonicalize the symbol tables of the BFD (see
+//              canonicalize_symbol_table) without holding the GIL.
+//
+// Params   :   @abfd : The current BFD.
+//              @symbol_table : Destination of the table (release with free).
+//
+// Returns  : On success return the total number of symbols found (could be 0).
+//              On error returns -1.
+//
+static long
+read_symbol_table(bfd* abfd, asymbol*** symbol_table) {
+    long number_of_symbols;
+
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(bfd_lock, WAIT_LOCK);
+
+    number_of_symbols = canonicalize_symbol_table(abfd, symbol_table);
+
+    PyThread_release_lock(bfd_lock);
+    Py_END_ALLOW_THREADS
+
+    return number_of_symbols;
+}
+
 //
 // Name     : get_symbols
 //
@@ -32,65 +145,48 @@ char** environ;
 //
 int
 get_symbols(bfd* abfd, PyObject** py_symbol_list) {
-    long storage_needed_static,
-        storage_needed_dynamic,
-        number_of_symbols_static,
-        number_of_symbols_dynamic,
-        i;
+    long number_of_symbols, i;
 
     asymbol **symbol_table;
 
     asymbol *symbol;
 
+    PyObject* py_symbol;
+
     // Create a python list to hold all the symbols representations.
     if (!(*py_symbol_list = PyList_New(0)))
         return -1;
 
-    // Calculate the space necessary to hold all the symbolic information.
-    storage_needed_static = bfd_get_symtab_upper_bound (abfd);
-    storage_needed_dynamic = bfd_get_dynamic_symtab_upper_bound (abfd);
-
-    if (storage_needed_static + storage_needed_dynamic <= 0)
-        return -1;
-
-    symbol_table = (asymbol **) malloc(
-        storage_needed_static + storage_needed_dynamic);
-
-    number_of_symbols_static = 
-        bfd_canonicalize_symtab(abfd, symbol_table);
-
-    number_of_symbols_dynamic =
-        bfd_canonicalize_dynamic_symtab(
-            abfd, &symbol_table[number_of_symbols_static]);
+    // The tables are read without holding the GIL and the Python objects
+    // created afterwards.
+    number_of_symbols = read_symbol_table(abfd, &symbol_table);
 
     // Make sure we've got some symbols. Otherwise return.
-    if (number_of_symbols_static + number_of_symbols_dynamic < 0) {
-        // Release unused symbol table and return.
-        if (symbol_table)
-            free (symbol_table);
-
+    if (number_of_symbols < 0)
         return -1;
-    }
 
-    for (i = 0; i < number_of_symbols_static + number_of_symbols_dynamic; i++) {
+    for (i = 0; i < number_of_symbols; i++) {
         
         symbol = symbol_table[i];
 
-        PyList_Append(*py_symbol_list,
-            Py_BuildValue(
+        py_symbol = Py_BuildValue(
                 "(Is" PYBFD_SYMBOL_VALUE_FMT PYBFD_SYMBOL_FLAG_FMT ")",
                 symbol->section->index,
                 symbol->name,
                 symbol->value,
                 symbol->flags
-            ));
+            );
+
+        if (py_symbol) {
+            PyList_Append(*py_symbol_list, py_symbol);
+            Py_DECREF(py_symbol);
+        }
     }
 
     // Release symbol tabel because we don't need it anymore.
-    if (symbol_table)
-        free(symbol_table);
+    free(symbol_table);
 
-    return number_of_symbols_static + number_of_symbols_dynamic;
+    return number_of_symbols;
 
 }
 
@@ -134,6 +230,178 @@ pybfd_get_symbols(PyObject *self, PyObject *args) {
     return NULL;
 }
 
+//
+// Name     : new_native_array
+//
+// Purpose  : Create an array.array object of the given type and length to be
+//              filled in place. Its storage is allocated by the array module
+//              so it's suitably aligned for the item type.
+//
+// Params   :   @typecode : Array type code.
+//              @count : Number of items.
+//              @buffer : Destination of the pointer to the array storage.
+//
+// Returns  : A new array object (zero filled) or NULL on error.
+//
+static PyObject *
+new_native_array(const char* typecode, Py_ssize_t count, void** buffer) {
+    PyObject* array_module;
+    PyObject* item;
+    PyObject* array;
+    Py_ssize_t length;
+
+    if (!(array_module = PyImport_ImportModule("array")))
+        return NULL;
+
+    item = PyObject_CallMethod(array_module, "array", "s[i]", typecode, 0);
+    Py_DECREF(array_module);
+
+    if (!item)
+        return NULL;
+
+    array = PySequence_Repeat(item, count);
+    Py_DECREF(item);
+
+    if (!array)
+        return NULL;
+
+    // The array isn't shared yet so nobody can resize it while filled.
+    if (PyObject_AsWriteBuffer(array, buffer, &length) < 0) {
+        Py_DECREF(array);
+        return NULL;
+    }
+
+    return array;
+}
+
+//
+// Name     : pybfd_get_symbols_columns
+//
+// Purpose  : Transfer all symbolic information in a columnar form instead of
+//              creating a python object per symbol.
+//
+// Params   :   @abfd : The current BFD.
+//
+// Returns  : A tuple of arrays (array.array) with one entry per symbol:
+//              - Address ('L'): section vma + symbol value.
+//              - Value ('L').
+//              - Flags ('I').
+//              - Section index ('i').
+//              - Names: every symbol name concatenated in a single string.
+//              - Name offsets ('L'): start of every name inside the string
+//                  plus its size as the last entry.
+//
+static PyObject *
+pybfd_get_symbols_columns(PyObject *self, PyObject *args) {
+    bfd* abfd;
+    asymbol** symbol_table;
+    asymbol* symbol;
+    long number_of_symbols, i;
+    size_t names_length = 0, name_length;
+
+    unsigned long* addresses;
+    unsigned long* values;
+    unsigned int* flags;
+    int* sections;
+    char* names;
+    unsigned long* name_offsets;
+
+    PyObject* py_addresses = NULL;
+    PyObject* py_values = NULL;
+    PyObject* py_flags = NULL;
+    PyObject* py_sections = NULL;
+    PyObject* py_names = NULL;
+    PyObject* py_name_offsets = NULL;
+
+    if (!PyArg_ParseTuple(args, "n", &abfd)) {
+        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+        return NULL;
+    }
+
+    if (!abfd) {
+        // An error ocurred receviing the bfd struct.
+        PyErr_SetNone(PyExc_IOError);
+        return NULL;
+    }
+
+    number_of_symbols = read_symbol_table(abfd, &symbol_table);
+
+    if (number_of_symbols < 0) {
+        PyErr_SetString(PyExc_TypeError, "Unable to get symbols.");
+        return NULL;
+    }
+
+    for (i = 0; i < number_of_symbols; i++) {
+        if (symbol_table[i]->name)
+            names_length += strlen(symbol_table[i]->name);
+    }
+
+    //
+    // Create the resulting arrays and fill their storage in place. The names
+    // are plain bytes so a string holds them.
+    //
+    if ((py_addresses = new_native_array(
+            "L", number_of_symbols, (void**)&addresses)) &&
+        (py_values = new_native_array(
+            "L", number_of_symbols, (void**)&values)) &&
+        (py_flags = new_native_array(
+            "I", number_of_symbols, (void**)&flags)) &&
+        (py_sections = new_native_array(
+            "i", number_of_symbols, (void**)&sections)) &&
+        (py_name_offsets = new_native_array(
+            "L", number_of_symbols + 1, (void**)&name_offsets)))
+        py_names = PyString_FromStringAndSize(NULL, names_length);
+
+    if (!py_addresses || !py_values || !py_flags || !py_sections ||
+        !py_names || !py_name_offsets) {
+
+        free(symbol_table);
+
+        Py_XDECREF(py_addresses);
+        Py_XDECREF(py_values);
+        Py_XDECREF(py_flags);
+        Py_XDECREF(py_sections);
+        Py_XDECREF(py_names);
+        Py_XDECREF(py_name_offsets);
+
+        return NULL;
+    }
+
+    names = PyString_AS_STRING(py_names);
+
+    names_length = 0;
+
+    for (i = 0; i < number_of_symbols; i++) {
+        symbol = symbol_table[i];
+
+        addresses[i] = symbol->section->vma + symbol->value;
+        values[i] = symbol->value;
+        flags[i] = symbol->flags;
+        sections[i] = symbol->section->index;
+
+        name_offsets[i] = names_length;
+
+        if (symbol->name) {
+            name_length = strlen(symbol->name);
+            memcpy(names + names_length, symbol->name, name_length);
+            names_length += name_length;
+        }
+    }
+
+    name_offsets[number_of_symbols] = names_length;
+
+    // Release symbol tabel because we don't need it anymore.
+    free(symbol_table);
+
+    return Py_BuildValue("(NNNNNN)",
+        py_addresses,
+        py_values,
+        py_flags,
+        py_sections,
+        py_names,
+        py_name_offsets);
+}
+
 //
 // Name     : pybfd_openr
 //
@@ -148,16 +416,21 @@ pybfd_get_symbols(PyObject *self, PyObject *args) {
 static PyObject *
 pybfd_openr(PyObject *self, PyObject *args) {
     bfd* abfd;
+    bfd_error_type error;
 
     const char* filename;
     const char* target;
 
     if (PyArg_ParseTuple(args, "ss", &filename, &target)) {
+        bfd_lock_acquire();
         abfd = bfd_openr(filename, NULL);
+        // Grab the error before other thread changes it.
+        error = abfd ? bfd_error_no_error : bfd_get_error();
+        PyThread_release_lock(bfd_lock);
 
         if (!abfd) {
             // An error ocurred trying to open the file.
-            PyErr_SetString(PyExc_IOError, bfd_errmsg(bfd_get_error()));
+            PyErr_SetString(PyExc_IOError, bfd_errmsg(error));
         }
         else {
             return Py_BuildValue("n", abfd);
@@ -185,17 +458,22 @@ pybfd_openr(PyObject *self, PyObject *args) {
 static PyObject *
 pybfd_fdopenr(PyObject *self, PyObject *args) {
     bfd* abfd;
+    bfd_error_type error;
 
     const char* filename;
     const char* target;
     int fd;
 
     if (PyArg_ParseTuple(args, "ssi", &filename, &target, &fd)) {
+        bfd_lock_acquire();
         abfd = bfd_fdopenr(filename, NULL, fd);
+        // Grab the error before other thread changes it.
+        error = abfd ? bfd_error_no_error : bfd_get_error();
+        PyThread_release_lock(bfd_lock);
 
         if (!abfd) {
             // An error ocurred trying to open the file.
-            PyErr_SetString(PyExc_IOError, bfd_errmsg(bfd_get_error()));
+            PyErr_SetString(PyExc_IOError, bfd_errmsg(error));
         }
         else {
             return Py_BuildValue("n", abfd);
@@ -208,6 +486,162 @@ pybfd_fdopenr(PyObject *self, PyObject *args) {
     return NULL;
 }
 
+//
+// Memory stream used by BFDs opened from a Python object supporting the buffer
+// protocol (see pybfd_openr_memory).
+//
+typedef struct
+{
+    // View of the Python object holding the file content. The object is
+    // kept alive until the BFD is closed.
+    Py_buffer view;
+
+    // Copy of the filename because libbfd only holds a reference to it.
+    char* filename;
+
+} memory_stream;
+
+//
+// Name     : memory_stream_release
+//
+// Purpose  : Release the Python buffer and resources held by a memory stream.
+//
+// Params   :   @stream : The memory stream to release.
+//
+// Returns  : -
+//
+static void
+memory_stream_release(memory_stream* stream) {
+    PyBuffer_Release(&stream->view);
+    free(stream->filename);
+    free(stream);
+}
+
+//
+// Name     : memory_stream_open
+//
+// Purpose  : libbfd iovec open callback. The stream is already open so it's
+//              just handed back to libbfd.
+//
+static void *
+memory_stream_open(struct bfd* abfd, void* open_closure) {
+    return open_closure;
+}
+
+//
+// Name     : memory_stream_pread
+//
+// Purpose  : libbfd iovec read callback. Copy the requested bytes from the
+//              Python buffer.
+//
+// Returns  : The number of bytes read (0 at end of stream).
+//
+static file_ptr
+memory_stream_pread(struct bfd* abfd, void* stream, void* buf, file_ptr nbytes,
+    file_ptr offset) {
+    memory_stream* mstream = (memory_stream*)stream;
+
+    if (offset < 0 || offset >= mstream->view.len)
+        return 0;
+
+    if (nbytes > mstream->view.len - offset)
+        nbytes = mstream->view.len - offset;
+
+    memcpy(buf, (char*)mstream->view.buf + offset, nbytes);
+
+    return nbytes;
+}
+
+//
+// Name     : memory_stream_close
+//
+// Purpose  : libbfd iovec close callback (invoked by bfd_close).
+//
+static int
+memory_stream_close(struct bfd* abfd, void* stream) {
+    memory_stream_release((memory_stream*)stream);
+
+    return 0;
+}
+
+//
+// Name     : memory_stream_stat
+//
+// Purpose  : libbfd iovec stat callback. Only the size is meaningful.
+//
+static int
+memory_stream_stat(struct bfd* abfd, void* stream, struct stat* sb) {
+    memset(sb, 0, sizeof(struct stat));
+    sb->st_size = ((memory_stream*)stream)->view.len;
+
+    return 0;
+}
+
+//
+// Name     : pybfd_openr_memory
+//
+// Purpose  : Create a BFD structure from the content of a Python object
+//              supporting the buffer protocol (str, bytearray, memoryview,
+//              etc.) and target architecture specified. Open for reading!
+//
+// Params   :   @filename : Name given to the BFD.
+//              @target : bfd target architecture.
+//              @data : Object holding the file content.
+//
+// Returns  : A BFD* when successfull or raise on error.
+//
+static PyObject *
+pybfd_openr_memory(PyObject *self, PyObject *args) {
+    bfd* abfd;
+    bfd_error_type error;
+
+    const char* filename;
+    const char* target;
+    memory_stream* stream;
+
+    if (!(stream = (memory_stream*)calloc(1, sizeof(memory_stream)))) {
+        return PyErr_NoMemory();
+    }
+
+    if (PyArg_ParseTuple(args, "sss*", &filename, &target, &stream->view)) {
+        if (!(stream->filename = strdup(filename))) {
+            memory_stream_release(stream);
+            return PyErr_NoMemory();
+        }
+
+        bfd_lock_acquire();
+
+        abfd = bfd_openr_iovec(stream->filename, target,
+            memory_stream_open, stream,
+            memory_stream_pread,
+            memory_stream_close,
+            memory_stream_stat);
+
+        // Grab the error before other thread changes it.
+        error = abfd ? bfd_error_no_error : bfd_get_error();
+
+        PyThread_release_lock(bfd_lock);
+
+        if (!abfd) {
+            // An error ocurred trying to open the stream. The stream belongs
+            // to the BFD only once it was successfully open.
+            memory_stream_release(stream);
+
+            PyErr_SetString(PyExc_IOError, bfd_errmsg(error));
+        }
+        else {
+            return Py_BuildValue("n", abfd);
+        }
+    }
+    else {
+        free(stream);
+
+        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+    }
+
+    return NULL;
+}
+
 //
 // Name     : pybfd_close
 //
@@ -223,6 +657,7 @@ pybfd_close(PyObject *self, PyObject *args) {
     // Close the specified BFD object.
     //
     bfd* abfd;
+    bfd_boolean result;
 
     if (PyArg_ParseTuple(args, "n", &abfd)) {
         // Validate the BFD pointer passes.
@@ -230,7 +665,13 @@ pybfd_close(PyObject *self, PyObject *args) {
             PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
         }
         else {
-            if (bfd_close(abfd) == TRUE) {
+            // The GIL is held on purpose because closing a memory BFD
+            // releases its Python buffer.
+            bfd_lock_acquire();
+            result = bfd_close(abfd);
+            PyThread_release_lock(bfd_lock);
+
+            if (result == TRUE) {
                 Py_RETURN_NONE;
             }
 
@@ -258,6 +699,7 @@ pybfd_close(PyObject *self, PyObject *args) {
 static PyObject *
 pybfd_check_format(PyObject *self, PyObject *args) {
     bfd* abfd;
+    bfd_boolean result;
 
     bfd_format* format;
 
@@ -267,7 +709,11 @@ pybfd_check_format(PyObject *self, PyObject *args) {
             PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
         }
         else {
-            if (bfd_check_format(abfd, (bfd_format)format)) {
+            bfd_lock_acquire();
+            result = bfd_check_format(abfd, (bfd_format)format);
+            PyThread_release_lock(bfd_lock);
+
+            if (result) {
                 Py_RETURN_TRUE;
             }
             Py_RETURN_FALSE;
@@ -281,79 +727,162 @@ pybfd_check_format(PyObject *self, PyObject *args) {
 }
 
 //
-// Name     : pybfd_archive_list_filenames
+// Name     : read_archive_members
 //
-// Purpose  : Return a list of filenames inside an archive.
+// Purpose  : Walk the members of an archive holding the libbfd lock. Only
+//              native memory is touched so Python objects are created once
+//              the lock is released.
 //
-// Params   : @abfd : bfd of archive file.
+// Params   :   abfd : bfd of archive file.
+//              names : Returned member names (malloc'd, each strdup'ed) or
+//                  NULL to keep the members open instead.
+//              members : Returned open member BFDs (malloc'd) when names is
+//                  NULL.
+//              error : Returned libbfd error stopping the walk.
 //
-// Returns  : A list of filenames inside the archive.
+// Returns  : The number of members or -1 on memory exhaustion.
 //
-static PyObject *
-pybfd_archive_list_filenames(PyObject *self, PyObject *args) {
-    bfd* abfd;
-    bfd* next_one = NULL;
-    bfd* last_arfile = NULL;
+static Py_ssize_t
+read_archive_members(bfd* abfd, char*** names, bfd*** members,
+    bfd_error_type* error) {
+    bfd* next_one;
+    bfd* following;
+    void* grown;
+    Py_ssize_t count = 0, alloc = 0;
+    int failed = 0;
 
-    PyObject* list = NULL;
+    if (names)
+        *names = NULL;
+    else
+        *members = NULL;
 
-    if (PyArg_ParseTuple(args, "n", &abfd)) {
-        // Validate the BFD pointer passes.
-        if (!abfd) {
-            PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
-            return NULL;
+    bfd_lock_acquire();
+
+    // Read all the contents right away, regardless.
+    for (next_one = bfd_openr_next_archived_file (abfd, NULL);
+        next_one;
+        next_one = following) {
+
+        if (count == alloc) {
+            alloc = alloc ? alloc * 2 : 16;
+
+            if (names)
+                grown = realloc(*names, alloc * sizeof(char*));
+            else
+                grown = realloc(*members, alloc * sizeof(bfd*));
+
+            if (!grown) {
+                failed = 1;
+            }
+            else if (names) {
+                *names = (char**)grown;
+            }
+            else {
+                *members = (bfd**)grown;
+            }
         }
 
-        // Create a python list with a preexisting number of archs as its
-        // items.
-        if (!(list = PyList_New(0))) {
-            PyErr_SetString(
-                PyExc_TypeError, 
-                "Unable to create matches list.");
+        if (!failed && names &&
+            !((*names)[count] = strdup(bfd_get_filename(next_one))))
+            failed = 1;
 
-            return NULL;
+        if (failed) {
+            bfd_close(next_one);
+            break;
         }
 
-        // Read all the contents right away, regardless.
-        for (next_one = bfd_openr_next_archived_file (abfd, NULL);
-            next_one;
-            next_one = bfd_openr_next_archived_file (abfd, next_one)) {
-                // We've got a new Bfd pointing inside the archive. That means
-                // that a new file was found in there.
-                if (PyList_Append(
-                    list, Py_BuildValue("s", bfd_get_filename(next_one))) == -1) {
+        if (!names)
+            (*members)[count] = next_one;
 
-                    bfd_close (next_one);
+        count++;
 
-                    PyErr_SetString(PyExc_TypeError,
-                        "Unable to append filename to archive list.");
-                    return NULL;
-                }
+        // We've got a new Bfd pointing inside the archive. That means
+        // that a new file was found in there.
+        following = bfd_openr_next_archived_file (abfd, next_one);
 
-                last_arfile = next_one;
+        // Only the names are needed so the member is closed once the next
+        // one was located.
+        if (names)
+            bfd_close(next_one);
+    }
 
-                bfd_close(last_arfile);
-            }
+    *error = bfd_get_error();
 
-        last_arfile = (bfd *) NULL;
+    PyThread_release_lock(bfd_lock);
 
-        if (bfd_get_error () != bfd_error_no_more_archived_files) {
-            // Something went wrong so we inform of that instead of
-            // returning the list.
-            PyErr_SetString(PyExc_TypeError,
-                            bfd_errmsg(bfd_get_error()));
+    if (failed) {
+        while (names && count > 0)
+            free((*names)[--count]);
 
-            // TODO: Remove the list created so far.
-            list = NULL;
+        if (names) {
+            free(*names);
+            *names = NULL;
+        }
+        else {
+            // Members opened so far are abandoned just like before.
+            free(*members);
+            *members = NULL;
         }
 
+        return -1;
     }
-    else {
+
+    return count;
+}
+
+//
+// Name     : pybfd_archive_list_filenames
+//
+// Purpose  : Return a list of filenames inside an archive.
+//
+// Params   : @abfd : bfd of archive file.
+//
+// Returns  : A list of filenames inside the archive.
+//
+static PyObject *
+pybfd_archive_list_filenames(PyObject *self, PyObject *args) {
+    bfd* abfd;
+    char** names;
+    bfd_error_type error;
+    Py_ssize_t count, i;
+
+    PyObject* list = NULL;
+    PyObject* name;
+
+    if (!PyArg_ParseTuple(args, "n", &abfd)) {
         PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+        return NULL;
+    }
+
+    // Validate the BFD pointer passes.
+    if (!abfd) {
+        PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
+        return NULL;
+    }
+
+    if ((count = read_archive_members(abfd, &names, NULL, &error)) < 0)
+        return PyErr_NoMemory();
+
+    if (error != bfd_error_no_more_archived_files) {
+        // Something went wrong so we inform of that instead of
+        // returning the list.
+        PyErr_SetString(PyExc_TypeError, bfd_errmsg(error));
+    }
+    else if ((list = PyList_New(count))) {
+        for (i = 0; i < count; i++) {
+            if (!(name = PyString_FromString(names[i]))) {
+                Py_CLEAR(list);
+                break;
+            }
+
+            PyList_SET_ITEM(list, i, name);
+        }
     }
 
-    if (last_arfile != NULL)
-        bfd_close(last_arfile);
+    for (i = 0; i < count; i++)
+        free(names[i]);
+
+    free(names);
 
     return list;
 }
@@ -371,47 +900,40 @@ pybfd_archive_list_filenames(PyObject *self, PyObject *args) {
 static PyObject *
 pybfd_archive_list_files(PyObject *self, PyObject *args) {
     bfd* abfd;
-    bfd* next_one = NULL;
+    bfd** members;
+    bfd_error_type error;
+    Py_ssize_t count, i;
 
     PyObject* list = NULL;
+    PyObject* member;
 
-    if (PyArg_ParseTuple(args, "n", &abfd)) {
-        // Validate the BFD pointer passes.
-        if (!abfd) {
-            PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
-            return NULL;
-        }
-
-        // Create a python list with a preexisting number of archs as its
-        // items.
-        if (!(list = PyList_New(0))) {
-            PyErr_SetString(
-                PyExc_TypeError, 
-                "Unable to create matches list.");
+    if (!PyArg_ParseTuple(args, "n", &abfd)) {
+        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+        return NULL;
+    }
 
-            return NULL;
-        }
+    // Validate the BFD pointer passes.
+    if (!abfd) {
+        PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
+        return NULL;
+    }
 
-        // Read all the contents right away, regardless.
-        for (next_one = bfd_openr_next_archived_file (abfd, NULL);
-            next_one;
-            next_one = bfd_openr_next_archived_file (abfd, next_one)) {
-                // We've got a new Bfd pointing inside the archive. That means
-                // that a new file was found in there.
-                if (PyList_Append(
-                    list, Py_BuildValue("n", next_one)) == -1) {
-
-                    PyErr_SetString(PyExc_TypeError,
-                        "Unable to append BFD to archive list.");
-                    return NULL;
-                }
+    if ((count = read_archive_members(abfd, NULL, &members, &error)) < 0)
+        return PyErr_NoMemory();
 
+    if ((list = PyList_New(count))) {
+        for (i = 0; i < count; i++) {
+            if (!(member = Py_BuildValue("n", members[i]))) {
+                Py_CLEAR(list);
+                break;
             }
-    }
-    else {
-        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+
+            PyList_SET_ITEM(list, i, member);
+        }
     }
 
+    free(members);
+
     return list;
 }
 
@@ -433,6 +955,8 @@ pybfd_check_format_matches(PyObject *self, PyObject *args) {
     PyObject* list = NULL;
     // TODO: Remove this fixed value and re-test all this routine.
     char **matching;
+    bfd_boolean matches;
+    bfd_error_type error;
 
     if (PyArg_ParseTuple(args, "ni", &abfd, &format)) {
 
@@ -441,13 +965,21 @@ pybfd_check_format_matches(PyObject *self, PyObject *args) {
             PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
         }
         else {
-            if (bfd_check_format_matches(abfd, (bfd_format)format,
-                &matching)) {
+            bfd_lock_acquire();
+
+            matches = bfd_check_format_matches(abfd, (bfd_format)format,
+                &matching);
 
+            // Grab the error before other thread changes it.
+            error = matches ? bfd_error_no_error : bfd_get_error();
+
+            PyThread_release_lock(bfd_lock);
+
+            if (matches) {
                 Py_RETURN_TRUE;
             }
             else {
-                if (bfd_get_error() == bfd_error_file_ambiguously_recognized) {
+                if (error == bfd_error_file_ambiguously_recognized) {
 
                     // Create a python list with a preexisting number of archs
                     // as it items.
@@ -595,10 +1127,14 @@ pybfd_get_sections_list(PyObject *self, PyObject *args) {
             if (!(list = PyList_New(abfd->section_count)))
                 return NULL;
 
+            bfd_lock_acquire();
+
             for (section = abfd->sections; section; section = section->next) {
                 PyList_SetItem(list, section->index, Py_BuildValue("n", section));
             }
 
+            PyThread_release_lock(bfd_lock);
+
             result = list;
         }
     }
@@ -681,6 +1217,74 @@ pybfd_target_list(PyObject *self, PyObject *args) {
     return list;
 }
 
+//
+// Name     : section_is_mappable
+//
+// Purpose  : Determine if the section content can be read straight from the
+//              underlying file, i.e. it's stored at its file position inside
+//              a regular (non archived) ELF file. It only looks at the
+//              section fields (no file I/O) so compressed sections must
+//              still be ruled out with section_is_compressed before reading
+//              them from the file.
+//
+// Params   :   @section : a bfd section.
+//
+// Returns  : Non-zero when the section content is mappable.
+//
+static int
+section_is_mappable(asection* section) {
+    bfd* abfd = section->owner;
+
+    return abfd
+        && bfd_get_flavour(abfd) == bfd_target_elf_flavour
+        && !bfd_my_archive(abfd)
+        && !(abfd->flags & BFD_IN_MEMORY)
+        && (section->flags & SEC_HAS_CONTENTS)
+        && !(section->flags & SEC_IN_MEMORY)
+        && section->filepos > 0;
+}
+
+//
+// Name     : pybfd_section_is_compressed
+//
+// Purpose  : Determine if the section content is compressed on the file. It
+//              reads the section header from the file so it's only meant to
+//              be called before mapping the section.
+//
+// Params   :   @abfd : a bfd structure.
+//              @section : a bfd section.
+//
+// Returns  : True if the section is compressed, False otherwise.
+//
+static PyObject *
+pybfd_section_is_compressed(PyObject *self, PyObject *args) {
+    bfd* abfd;
+    asection* section;
+    bfd_boolean compressed;
+
+    if (PyArg_ParseTuple(args, "nn", &abfd, &section)) {
+        // Validate the BFD pointer passes.
+        if (!abfd) {
+            PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
+            return NULL;
+        }
+
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(bfd_lock, WAIT_LOCK);
+
+        compressed = bfd_is_section_compressed(abfd, section);
+
+        PyThread_release_lock(bfd_lock);
+        Py_END_ALLOW_THREADS
+
+        return PyBool_FromLong(compressed);
+    }
+
+    PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+
+    return NULL;
+}
+
 //
 // Name     : pybfd_get_section_attribute
 //
@@ -699,7 +1303,8 @@ enum {
     ALIGNMENT,
     FLAGS,
     FILE_POS,
-    ENTSIZE
+    ENTSIZE,
+    MAPPABLE
 } section_attributes;
 
 static PyObject *
@@ -711,6 +1316,9 @@ pybfd_get_section_attribute(PyObject *self, PyObject *args) {
 
     if (PyArg_ParseTuple(args, "ni", &section, &attribute_index)) {
 
+        // Only scalar values are built while holding the lock.
+        bfd_lock_acquire();
+
         switch (attribute_index) {
         case INDEX:
             result = Py_BuildValue("i", section->index);
@@ -748,10 +1356,16 @@ pybfd_get_section_attribute(PyObject *self, PyObject *args) {
             result = Py_BuildValue("i", section->entsize);
             break;
 
+        case MAPPABLE:
+            result = PyBool_FromLong(section_is_mappable(section));
+            break;
+
         default:
             PyErr_SetString(
                 PyExc_TypeError, "Invalid section attribute requested.");
         }
+
+        PyThread_release_lock(bfd_lock);
     }
     else {
         PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
@@ -760,6 +1374,123 @@ pybfd_get_section_attribute(PyObject *self, PyObject *args) {
     return result;
 }
 
+//
+// Name     : pybfd_get_sections_info
+//
+// Purpose  : Return every section attribute of the specified bfd in a single
+//              pass instead of one get_section_attribute() call per value.
+//
+// Params   :   @abfd : a bfd structure.
+//
+// Returns  : A list of tuples (one per section) composed of the section
+//              pointer followed by the attributes in section_attributes
+//              order.
+//
+//
+// Copy of the section attributes taken while holding the libbfd lock.
+//
+typedef struct {
+    asection* section;
+    int index;
+    const char* name;
+    bfd_size_type size;
+    bfd_vma vma;
+    bfd_vma lma;
+    unsigned int alignment_power;
+    flagword flags;
+    file_ptr filepos;
+    unsigned int entsize;
+    int mappable;
+} section_info;
+
+static PyObject *
+pybfd_get_sections_info(PyObject *self, PyObject *args) {
+    bfd* abfd;
+    asection* section;
+    section_info* infos;
+    unsigned int count = 0, i;
+
+    PyObject* list = NULL;
+    PyObject* info;
+
+    if (PyArg_ParseTuple(args, "n", &abfd)) {
+        // Validate the BFD pointer passes.
+        if (!abfd) {
+            PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
+            return NULL;
+        }
+
+        //
+        // Copy the attributes while holding the lock and build the Python
+        // objects (which might run arbitrary code) afterwards.
+        //
+        bfd_lock_acquire();
+
+        infos = (section_info*) malloc (
+            (abfd->section_count + 1) * sizeof(section_info));
+
+        if (infos) {
+            for (section = abfd->sections; section; section = section->next) {
+                infos[count].section = section;
+                infos[count].index = section->index;
+                infos[count].name = section->name;
+                infos[count].size = section->size;
+                infos[count].vma = section->vma;
+                infos[count].lma = section->lma;
+                infos[count].alignment_power = section->alignment_power;
+                infos[count].flags = section->flags;
+                infos[count].filepos = section->filepos;
+                infos[count].entsize = section->entsize;
+                infos[count].mappable = section_is_mappable(section);
+                count++;
+            }
+        }
+
+        PyThread_release_lock(bfd_lock);
+
+        if (!infos)
+            return PyErr_NoMemory();
+
+        // Create a python list with a preexisting number of sections as its
+        // size.
+        if (!(list = PyList_New(count))) {
+            free(infos);
+            return NULL;
+        }
+
+        for (i = 0; i < count; i++) {
+            info = Py_BuildValue(
+                "(nis" PY_VMA_FMT PY_VMA_FMT PY_VMA_FMT "iILIN)",
+                infos[i].section,
+                infos[i].index,
+                infos[i].name,
+                infos[i].size,
+                infos[i].vma,
+                infos[i].lma,
+                infos[i].alignment_power,
+                infos[i].flags,
+                (PY_LONG_LONG)infos[i].filepos,
+                infos[i].entsize,
+                PyBool_FromLong(infos[i].mappable));
+
+            if (!info) {
+                Py_DECREF(list);
+                free(infos);
+                return NULL;
+            }
+
+            PyList_SetItem(list, infos[i].index, info);
+        }
+
+        free(infos);
+    }
+    else {
+        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+    }
+
+    return list;
+}
+
 //
 // Name     : pybfd_bfd_get_attribute
 //
@@ -809,8 +1540,12 @@ pybfd_get_bfd_attribute(PyObject *self, PyObject *args) {
         // Validate the BFD pointer passes.
         if (!abfd) {
             PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
+            return NULL;
         }
 
+        // Only scalar values are built while holding the lock.
+        bfd_lock_acquire();
+
         switch (attribute_index) {
         case FILENAME:
             result = Py_BuildValue("s", bfd_get_filename(abfd));
@@ -919,6 +1654,8 @@ pybfd_get_bfd_attribute(PyObject *self, PyObject *args) {
             PyErr_SetString(
                 PyExc_TypeError, "Invalid BFD attribute requested.");
         }
+
+        PyThread_release_lock(bfd_lock);
     }
     else {
         PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
@@ -942,6 +1679,7 @@ pybfd_set_file_flags(PyObject *self, PyObject *args) {
 
     bfd* abfd;
     int file_flags;
+    bfd_boolean success;
 
     PyObject* result = NULL;
 
@@ -951,7 +1689,11 @@ pybfd_set_file_flags(PyObject *self, PyObject *args) {
             PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
         }
         else {
-            if (bfd_set_file_flags(abfd, file_flags)) {
+            bfd_lock_acquire();
+            success = bfd_set_file_flags(abfd, file_flags);
+            PyThread_release_lock(bfd_lock);
+
+            if (success) {
                 Py_RETURN_NONE;
             }
             PyErr_SetString(PyExc_TypeError, "Unable to set value(s)");
@@ -978,6 +1720,7 @@ static PyObject *
 pybfd_set_start_address(PyObject *self, PyObject *args) {
     bfd* abfd;
     int start_address;
+    bfd_boolean success;
 
     PyObject* result = NULL;
 
@@ -987,7 +1730,11 @@ pybfd_set_start_address(PyObject *self, PyObject *args) {
             PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
         }
         else {
-            if (bfd_set_start_address(abfd, start_address)) {
+            bfd_lock_acquire();
+            success = bfd_set_start_address(abfd, start_address);
+            PyThread_release_lock(bfd_lock);
+
+            if (success) {
                 Py_RETURN_NONE;
             }
             PyErr_SetString(PyExc_TypeError, "Unable to set value(s)");
@@ -1012,6 +1759,7 @@ pybfd_set_start_address(PyObject *self, PyObject *args) {
 static PyObject *
 pybfd_get_gp_size(PyObject *self, PyObject *args) {
     bfd* abfd;
+    unsigned int gp_size;
 
     PyObject* result = NULL;
 
@@ -1021,7 +1769,11 @@ pybfd_get_gp_size(PyObject *self, PyObject *args) {
             PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
         }
         else {
-            return Py_BuildValue("I", bfd_get_gp_size(abfd));
+            bfd_lock_acquire();
+            gp_size = bfd_get_gp_size(abfd);
+            PyThread_release_lock(bfd_lock);
+
+            return Py_BuildValue("I", gp_size);
         }
     }
     PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
@@ -1051,7 +1803,10 @@ pybfd_set_gp_size(PyObject *self, PyObject *args) {
             PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
         }
         else {
+            bfd_lock_acquire();
             bfd_set_gp_size(abfd, gp_size);
+            PyThread_release_lock(bfd_lock);
+
             Py_RETURN_NONE;
         }
     }
@@ -1090,7 +1845,9 @@ pybfd_get_arch_size(PyObject *self, PyObject *args) {
             //
             // TODO: Check if we're working with a ELF BFD.
             // Return the arch_size field of an elf bfd, or -1 if not elf.
+            bfd_lock_acquire();
             arch_size = bfd_get_arch_size(abfd);
+            PyThread_release_lock(bfd_lock);
 
             if (arch_size) {
                 result = Py_BuildValue("i", arch_size);
@@ -1130,7 +1887,9 @@ pybfd_find_target(PyObject *self, PyObject *args) {
             PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
         }
         else {
+            bfd_lock_acquire();
             target_list = bfd_find_target(target, abfd);
+            PyThread_release_lock(bfd_lock);
 
             if (target_list) {
                 // TODO
@@ -1175,17 +1934,51 @@ pybfd_set_default_target(PyObject *self, PyObject *args) {
     return NULL;
 }
 
+//
+// Name     : read_section_contents
+//
+// Purpose  : Read the section contents into native memory without holding
+//              the GIL.
+//
+// Params   :   abfd
+//              section
+//              buffer : Destination memory.
+//              offset
+//              count
+//              error : Returned libbfd error code on failure.
+//
+// Returns  : TRUE on success, FALSE otherwise.
+//
+static bfd_boolean
+read_section_contents(bfd* abfd, asection* section, void* buffer,
+    file_ptr offset, bfd_size_type count, bfd_error_type* error) {
+    bfd_boolean result;
+
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(bfd_lock, WAIT_LOCK);
+
+    result = bfd_get_section_contents(abfd, section, buffer, offset, count);
+
+    // Grab the error before other thread changes it.
+    *error = result ? bfd_error_no_error : bfd_get_error();
+
+    PyThread_release_lock(bfd_lock);
+    Py_END_ALLOW_THREADS
+
+    return result;
+}
+
 //
 // Name     : pybfd_section_get_content
 //
-// Purpose  : -
+// Purpose  : Return the requested section content as a string.
 //
 // Params   :   bfd
 //              section
 //              offset
 //              count
 //
-// Returns  : -
+// Returns  : A string object holding the section content.
 //
 static PyObject *
 pybfd_section_get_content(PyObject *self, PyObject *args) {
@@ -1193,37 +1986,137 @@ pybfd_section_get_content(PyObject *self, PyObject *args) {
     asection* section;
     unsigned int offset;
     unsigned int count;
-    bfd_byte* content;
+    bfd_error_type error;
 
     PyObject* result  = NULL;
 
     if (PyArg_ParseTuple(args, "nnII", &abfd, &section, &offset, &count)) {
+        // Validate the BFD pointer passes.
+        if (!abfd) {
+            PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
+        }
+        // Read the content straight into the storage of the resulting string
+        // so there is no temporary buffer to copy from.
+        else if ((result = PyString_FromStringAndSize(NULL, count))) {
+            if (!read_section_contents(abfd, section,
+                PyString_AS_STRING(result), offset, count, &error)) {
+
+                Py_DECREF(result);
+                result = NULL;
+
+                PyErr_SetString(PyExc_IOError, bfd_errmsg(error));
+            }
+        }
+    }
+    else {
+        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+    }
+
+    return result;
+
+}
+
+//
+// Name     : pybfd_section_get_buffer
+//
+// Purpose  : Return the requested section content as a mutable buffer object
+//              (bytearray) filled in place by libbfd.
+//
+// Params   :   bfd
+//              section
+//              offset
+//              count
+//
+// Returns  : A bytearray object holding the section content.
+//
+static PyObject *
+pybfd_section_get_buffer(PyObject *self, PyObject *args) {
+    bfd* abfd;
+    asection* section;
+    unsigned PY_LONG_LONG offset;
+    Py_ssize_t count;
+    bfd_error_type error;
+
+    PyObject* result  = NULL;
+
+    if (PyArg_ParseTuple(args, "nnKn", &abfd, &section, &offset, &count)) {
+        // Validate the BFD pointer passes.
+        if (!abfd) {
+            PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
+        }
+        else if ((result = PyByteArray_FromStringAndSize(NULL, count))) {
+            if (!read_section_contents(abfd, section,
+                PyByteArray_AS_STRING(result), offset, count, &error)) {
+
+                Py_DECREF(result);
+                result = NULL;
+
+                PyErr_SetString(PyExc_IOError, bfd_errmsg(error));
+            }
+        }
+    }
+    else {
+        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+    }
+
+    return result;
+}
+
+//
+// Name     : pybfd_section_read_into
+//
+// Purpose  : Fill a caller-provided writable buffer (bytearray, memoryview,
+//              etc.) with the section content starting at the given offset.
+//
+// Params   :   bfd
+//              section
+//              buffer : Destination object supporting the buffer protocol.
+//              offset
+//
+// Returns  : The number of bytes read (bounded by the section size).
+//
+static PyObject *
+pybfd_section_read_into(PyObject *self, PyObject *args) {
+    bfd* abfd;
+    asection* section;
+    Py_buffer view;
+    unsigned PY_LONG_LONG offset;
+    bfd_size_type count;
+    bfd_error_type error;
+
+    PyObject* result  = NULL;
+
+    if (PyArg_ParseTuple(args, "nnw*K", &abfd, &section, &view, &offset)) {
         // Validate the BFD pointer passes.
         if (!abfd) {
             PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
         }
         else {
-            content = (bfd_byte*) malloc(count);
+            // Never read past the end of the section.
+            count = view.len;
 
-            if (content) {
-                if (bfd_get_section_contents(
-                    abfd, section, content, offset, count)) {
-                    result = Py_BuildValue("s#", content, count);
-                }
+            if (offset >= section->size)
+                count = 0;
+            else if (count > section->size - offset)
+                count = section->size - offset;
 
-                free(content);
+            if (count == 0 || read_section_contents(
+                abfd, section, view.buf, offset, count, &error)) {
+
+                result = Py_BuildValue("n", (Py_ssize_t)count);
             }
             else {
-                PyErr_SetString(PyExc_TypeError, "Unable to set value(s)");
+                PyErr_SetString(PyExc_IOError, bfd_errmsg(error));
             }
         }
+
+        PyBuffer_Release(&view);
     }
     else {
         PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
     }
 
     return result;
-
 }
 
 //
@@ -1238,6 +2131,7 @@ pybfd_section_get_content(PyObject *self, PyObject *args) {
 static PyObject *
 pybfd_get_architecture(PyObject *self, PyObject *args) {
     bfd* abfd;
+    enum bfd_architecture arch;
 
     if (PyArg_ParseTuple(args, "n", &abfd)) {
         // Validate the BFD pointer passes.
@@ -1245,7 +2139,11 @@ pybfd_get_architecture(PyObject *self, PyObject *args) {
             PyErr_SetString(PyExc_TypeError, "Null BFD pointer specified");
         }
         else {
-            return Py_BuildValue("i", bfd_get_arch(abfd));
+            bfd_lock_acquire();
+            arch = bfd_get_arch(abfd);
+            PyThread_release_lock(bfd_lock);
+
+            return Py_BuildValue("i", arch);
         }
     }
     else {
@@ -1278,6 +2176,7 @@ static struct PyMethodDef _bfd_methods[] = {
 #define declmethod(func,h) { #func , ( PyCFunction )pybfd_##func , METH_VARARGS , h }
     declmethod(openr, "Create a BFD for file reading."),
     declmethod(fdopenr, "Create a BFD for file reading (from file descriptor)."),
+    declmethod(openr_memory, "Create a BFD for reading from an object supporting the buffer protocol."),
     declmethod(check_format, "Initialize the file format of the BFD."),
     declmethod(check_format_matches, "Initialize the file format of the BFD and return list of matches if ambiguous format exists."),
     declmethod(close, "Close current BFD."),
@@ -1292,6 +2191,8 @@ static struct PyMethodDef _bfd_methods[] = {
     declmethod(get_sections_list, "Return a list of bfd section pointers."),
     declmethod(get_arch_size, "Return the target architecture size in bits"),
     declmethod(get_section_attribute, "Return the requested attribute from the specified bfd section."),
+    declmethod(get_sections_info, "Return the attributes of every section in the specified bfd."),
+    declmethod(section_is_compressed, "Determine if the section content is compressed on the file."),
     declmethod(target_list, "Return a list of all the supported targets."),
     declmethod(arch_list, "Return a list of all the supported architectures."),
     declmethod(get_bfd_attribute, "Return the requested attribute from the specified bfd."),
@@ -1300,7 +2201,10 @@ static struct PyMethodDef _bfd_methods[] = {
     declmethod(get_gp_size, "Return the maximum size of objects to be optimized using the GP register under ECOFF or MIPS ELF."),
     declmethod(set_gp_size, "Set the maximum size of objects to be optimized using the GP register under ECOFF or MIPS ELF."),
     declmethod(section_get_content, "Return the section specified content."),
+    declmethod(section_get_buffer, "Return the section specified content in a bytearray."),
+    declmethod(section_read_into, "Read the section content into a writable buffer."),
     declmethod(get_symbols, "Return the complete list of available symbols."),
+    declmethod(get_symbols_columns, "Return every available symbol in columnar form."),
     declmethod(get_architecture, "Return the current architecture Id."),
     {NULL},
 #undef declmethod
@@ -1316,6 +2220,11 @@ static struct PyMethodDef _bfd_methods[] = {
 // Returns  : -
 //
 PyMODINIT_FUNC init_bfd(void) {
+    if (!(bfd_lock = PyThread_allocate_lock())) {
+        PyErr_NoMemory();
+        return;
+    }
+
     if (!Py_InitModule("_bfd", _bfd_methods))
         return;
 
@@ -9,6 +9,7 @@ from sys import argv, exit
 from types import FileType, StringType, IntType
 from os import dup
 from os.path import islink
+from mmap import mmap, ACCESS_READ
 from traceback import print_exc, print_stack
 
 from sys import version_info
@@ -84,22 +85,31 @@ class Bfd(object):
 
     DEFAULT_TARGET = "default"
 
-    def __init__(self, _file=None, target=DEFAULT_TARGET):
+    def __init__(self, _file=None, target=DEFAULT_TARGET, load=False):
         """Initialize underlying libbfd library."""
         # Hold the native bfd object.
         self._ptr = None
 
-        # Hold a dict of every section present in the bfd.
-        self._sections = {}
+        # Hold a dict of every section present in the bfd. It remains None
+        # until the sections are loaded (either on open or on first access).
+        self._sections = None
 
-        # Hold a dict of every symbol present in the bfd.
-        self._symbols = {}
+        # Hold a dict of every symbol present in the bfd (loaded on demand as
+        # well).
+        self._symbols = None
 
         # Initially set the file format to unknown until a file is opened.
         self._format = BfdFormat.UNKNOWN
 
+        # Name of the file (or in-memory content) backing the bfd and its
+        # read-only memory map shared by the sections (created along with
+        # them when possible).
+        self._filename = None
+        self._data = None
+        self._mapping = None
+
         if _file:
-            self.open(_file, target)
+            self.open(_file, target, load)
 
     #def __del__(self):
     #    """Deinitialize BFD and release instance."""
@@ -115,18 +125,24 @@ class Bfd(object):
         """Store the native BFD structure pointer."""
         self.__ptr = ptr
 
-    def open(self, _file, target=DEFAULT_TARGET):
+    def open(self, _file, target=DEFAULT_TARGET, load=False):
         """
         Open the existing file for reading.
 
         @param _file : A filename of file descriptor.
         @param target: A user-specific BFD target name.
+        @param load  : Extract sections and symbols right away instead of
+                        waiting for the first access to them.
 
         @return : None
         """
         # Close any existing BFD structure instance. 
         self.close()
 
+        # Forget any sections and symbols extracted from a previous file.
+        self._sections = None
+        self._symbols = None
+
         #
         # STEP 1. Open the BFD pointer.
         #
@@ -145,6 +161,8 @@ class Bfd(object):
                 raise BfdException(
                     "Unable to open file-descriptor %s : %s" % (filename, err))
 
+            self._filename = filename
+
         elif type(_file) is StringType:
             # The user spcified a filaname so first check if file exists.
             filename = _file
@@ -162,6 +180,8 @@ class Bfd(object):
                 raise BfdException(
                     "Unable to open file %s : %s" % (filename, err))
 
+            self._filename = filename
+
         elif type(_file) is IntType:
             # The user specified an already-open BFD pointer so we avoid any
             # further open operation and move on to file format recognition.
@@ -171,6 +191,52 @@ class Bfd(object):
             raise BfdException(
                 "Invalid file type specified for open operation (%r)" % _file)
 
+        self.__initialize_format(load)
+
+    @classmethod
+    def from_bytes(cls, data, target=DEFAULT_TARGET, filename="<memory>",
+        load=False):
+        """
+        Create a new BFD from an in-memory file content without touching the
+        filesystem.
+
+        @param data : The file content (str, bytearray, memoryview or any
+                        object supporting the buffer protocol).
+        @param target: A user-specific BFD target name.
+        @param filename : The name given to the BFD.
+        @param load  : Extract sections and symbols right away instead of
+                        waiting for the first access to them.
+
+        @return : A new Bfd instance.
+        """
+        abfd = cls()
+
+        #
+        # STEP 1. Open the BFD pointer on top of the given buffer. The native
+        # stream keeps a reference to the data until the BFD is closed.
+        #
+        try:
+            abfd._ptr = _bfd.openr_memory(filename, target, data)
+        except (TypeError, IOError), err:
+            raise BfdException(
+                "Unable to open memory buffer %s : %s" % (filename, err))
+
+        abfd._data = data
+
+        try:
+            abfd.__initialize_format(load)
+        except BfdException:
+            # Nobody else holds the new BFD so release it right away.
+            abfd.close()
+            raise
+
+        return abfd
+
+    def __initialize_format(self, load):
+        """Determine the file format of the newly open bfd and extract its
+        contents if requested.
+
+        """
         #
         # STEP 2. Determine file format of the BFD.
         #
@@ -179,26 +245,28 @@ class Bfd(object):
         # case we were unable to get it right.
         #
         try:
+            # DO NOT USE bfd_check_format_matches() becuase its not tested.
+            # An implementation example if on objdump.c at function
+            # display_bfd().
+            #
+            # Object files are by far the most common input so they're
+            # checked first to make header-only opens a single format check.
+            if _bfd.check_format(self._ptr, BfdFormat.OBJECT):
+                self.file_format = BfdFormat.OBJECT
+
             # Type opening it as an archieve and if it success then check
             # subfiles.
-            if _bfd.check_format(self._ptr, BfdFormat.ARCHIVE):
+            elif _bfd.check_format(self._ptr, BfdFormat.ARCHIVE):
                 # Set current format and store the inner file list.
                 self.file_format = BfdFormat.ARCHIVE
 
                 self.__populate_archive_files()
-            else:
-                # DO NOT USE bfd_check_format_matches() becuase its not tested.
-                # An implementation example if on objdump.c at function
-                # display_bfd().
-                if _bfd.check_format(self._ptr, BfdFormat.OBJECT):
-                    self.file_format = BfdFormat.OBJECT
 
-                elif _bfd.check_format(self._ptr, BfdFormat.CORE):
-                    self.file_format = BfdFormat.CORE
+            elif _bfd.check_format(self._ptr, BfdFormat.CORE):
+                self.file_format = BfdFormat.CORE
 
-                else:
-                    pass
-                    raise BfdException(_bfd.get_last_error_message())
+            else:
+                raise BfdException(_bfd.get_last_error_message())
 
         except TypeError, err:
             raise BfdException(
@@ -207,12 +275,13 @@ class Bfd(object):
         #
         # STEP 3. Extract inner sections and symbolic information.
         #
-        if self._ptr is not None:
-            # If the file is a valid BFD file format but not an archive then
-            # get its sections and symbolic information (if any).
-            if self.file_format in [BfdFormat.OBJECT, BfdFormat.CORE]:
-                self.__populate_sections()
-                self.__populate_symbols()
+        # By default this is deferred until the 'sections' or 'symbols'
+        # properties are accessed so that header-only inspections (entry
+        # point, architecture, etc.) don't pay for it.
+        #
+        if load:
+            self.sections
+            self.symbols
 
     def __populate_archive_files(self):
         """Store the list of files inside an archive file."""
@@ -292,6 +361,16 @@ class Bfd(object):
         """
         _bfd.set_error(error)
 
+    @property
+    def _has_sections(self):
+        """Indicate if the open bfd holds sections and symbolic information.
+        Only for internal use.
+
+        """
+        # Only valid BFD file formats other than archives have them.
+        return self._ptr is not None and \
+            self.file_format in [BfdFormat.OBJECT, BfdFormat.CORE]
+
     def __populate_sections(self):
         """Get a list of the section present in the bfd to populate our
         internal list.
@@ -300,14 +379,44 @@ class Bfd(object):
         if not self._ptr:
             raise BfdException("BFD not initialized")
 
-        for section in _bfd.get_sections_list(self._ptr):
+        self._sections = {}
+
+        # Every section attribute is obtained in a single native call.
+        sections_info = _bfd.get_sections_info(self._ptr)
+
+        # Map the file only if at least one section can be read from it.
+        mapping = None
+        if [info for info in sections_info if info[-1]]:
+            mapping = self.__map_file()
+
+        for section_info in sections_info:
             try:
-                bfd_section = BfdSection(self._ptr, section)
+                bfd_section = BfdSection(
+                    self._ptr, section_info[0], section_info[1:], mapping)
                 self._sections[bfd_section.name] = bfd_section
             except BfdSectionException, err:
                 #print "Exception during section pasing : %s" % err
                 pass
 
+    def __map_file(self):
+        """Return a read-only memory map of the file backing the bfd (or None
+        if it can't be mapped).
+
+        """
+        if self._mapping is None and type(self._data) is StringType:
+            # In-memory strings can be sliced just like a memory map.
+            self._mapping = self._data
+
+        elif self._mapping is None and self._filename:
+            try:
+                with open(self._filename, "rb") as fd:
+                    self._mapping = mmap(fd.fileno(), 0, access=ACCESS_READ)
+            except (EnvironmentError, ValueError), err:
+                # Sections will fall back to libbfd to read their content.
+                pass
+
+        return self._mapping
+
     def __populate_symbols(self):
         """Get a list of the symbols present in the bfd to populate our
         internal list.
@@ -316,49 +425,16 @@ class Bfd(object):
         if not self._ptr:
             raise BfdException("BFD not initialized")
 
+        # Dictionary of sections keyed by section index. This is necessary
+        # because the symbolic information return the section index it
+        # belongs to.
+        sections = dict(
+            [(section.index, section) for section in self.sections.values()])
+
         try:
-            symbols = _bfd.get_symbols(self._ptr)
-
-            # Temporary dictionary ordered by section index. This is necessary
-            # because the symbolic information return the section index it belongs
-            # to.
-            sections = {}
-            for section in self.sections:
-                sections[self.sections[section].index] = self.sections[section]
-
-            for symbol in symbols:
-                # Extract each field for further processing.
-                symbol_section_index = symbol[0]
-                symbol_name = symbol[1]
-                symbol_value = symbol[2]
-                symbol_flags = symbol[3]
-
-                # Get the effective address of the current symbol.
-                symbol_flags = tuple(
-                    [f for f in SYMBOL_FLAGS_LIST if symbol_flags & f == f] )
-
-                # Create a new symbol instance to hold symbolic information.
-                new_symbol = Symbol(
-                    sections.get(symbol_section_index, None),
-                    symbol_name,
-                    symbol_value,
-                    symbol_flags)
-
-                if new_symbol.section is None:
-                    continue
-                symbol_address = new_symbol.section.vma + new_symbol.value
-                #if new_symbol.flags in \
-                #    [SymbolFlags.LOCAL , SymbolFlags.GLOBAL , SymbolFlags.EXPORT]:
-                #    symbol_address = new_symbol.section.vma + new_symbol.value
-                #else:
-                #    # TODO: Enhance this!
-                #    # Discard any other symbol information.
-                #    continue
-
-                self._symbols[symbol_address] = new_symbol
-
-            del sections
-        except BfdSectionException, err:
+            self._symbols = SymbolTable(
+                sections, *_bfd.get_symbols_columns(self._ptr))
+        except TypeError, err:
             raise BfdException("Exception on symbolic ifnormation parsing.")
 
     def close(self):
@@ -378,14 +454,105 @@ class Bfd(object):
             finally:
                 self._ptr = None
 
+        # Sections still referenced elsewhere must not touch the closed bfd
+        # or memory map anymore.
+        if self._sections:
+            for section in self._sections.itervalues():
+                section._detach()
+
+        self._sections = None
+        self._symbols = None
+
+        # Release the file memory map (if any).
+        if isinstance(self._mapping, mmap):
+            self._mapping.close()
+
+        self._mapping = None
+        self._filename = None
+        self._data = None
+
     @property
     def sections(self):
+        """Return the sections of the open bfd (extracted on first access)."""
+        if self._sections is None:
+            if not self._has_sections:
+                return {}
+            self.__populate_sections()
         return self._sections
 
     @property
     def symbols(self):
+        """Return the symbols of the open bfd (extracted on first access)."""
+        if self._symbols is None:
+            if not self._has_sections:
+                return {}
+            self.__populate_symbols()
         return self._symbols
 
+    @property
+    def has_symbols(self):
+        """Tell whether any symbol is present without building any of the
+        symbol table indexes (the table length counts distinct addresses).
+
+        """
+        symbols = self.symbols
+        return isinstance(symbols, SymbolTable) and symbols.count > 0
+
+    def symbol_at(self, address):
+        """Return a list of every symbol located at the given address."""
+        if not self.symbols:
+            return []
+
+        return self.symbols.symbol_at(address)
+
+    def nearest_symbol(self, address, flags=SymbolFlags.NO_FLAGS):
+        """
+        Return the closest symbol located at or before the given address
+        having every flag in the given bitmask set.
+
+        @return : A (symbol, offset) tuple or None.
+
+        """
+        if not self.symbols:
+            return None
+
+        return self.symbols.nearest_symbol(address, flags)
+
+    def symbols_in_range(self, low, high):
+        """
+        Return a list of (address, symbol) tuples for every symbol located
+        between the low (inclusive) and high (exclusive) addresses.
+
+        """
+        if not self.symbols:
+            return []
+
+        return self.symbols.symbols_in_range(low, high)
+
+    def symbols_by_name(self, name):
+        """Return a list of (address, symbol) tuples for every symbol with the
+        given name."""
+        if not self.has_symbols:
+            return []
+
+        return self.symbols.symbols_by_name(name)
+
+    def symbols_with_prefix(self, prefix):
+        """Return a list of (address, symbol) tuples for every symbol whose
+        name starts with the given prefix."""
+        if not self.has_symbols:
+            return []
+
+        return self.symbols.symbols_with_prefix(prefix)
+
+    def symbols_matching(self, pattern):
+        """Return a list of (address, symbol) tuples for every symbol whose
+        name matches the given glob pattern."""
+        if not self.has_symbols:
+            return []
+
+        return self.symbols.symbols_matching(pattern)
+
     @property
     def filename(self):
         """Return the filename of the BFD file being processed."""
@@ -0,0 +1,387 @@
+# 
+# Copyright (c) 2013 Groundworks Technologies
+# 
+# This code is part PyBFD module (libbfd & libopcodes extension module)
+#
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+from opcodes import InstructionType
+from symbol import SymbolFlags
+
+__author__      = "Groundworks Technologies OSS Team"
+__contact__     = "oss@groundworkstech.com"
+__company__     = "Groundworks Technologies"
+__year__        = "2013"
+__versaion__    = "0.1"
+
+__all__ = ["EdgeKind", "FunctionGraph", "CfgBuilder", "iter_section_functions"]
+
+
+class EdgeKind:
+    FALLTHROUGH = 0 # Flow continues with the following block.
+    JUMP = 1        # Unconditional branch.
+    CONDITIONAL = 2 # Conditional branch taken.
+
+
+class FunctionGraph(object):
+    """
+    Control flow graph of a single function. Blocks are sorted by address
+    and identified by their index. Edges are stored in compressed adjacency
+    arrays: the successors of block i are edge_targets[edge_offsets[i] :
+    edge_offsets[i + 1]] (with their kinds in edge_kinds).
+
+    """
+
+    def __init__(self, entry, starts, ends, edge_offsets, edge_targets,
+        edge_kinds, calls):
+        # Address of the function entry point (start of block 0 or not).
+        self.entry = entry
+
+        # Start and end (exclusive) addresses of every block.
+        self.starts = starts
+        self.ends = ends
+
+        self.edge_offsets = edge_offsets
+        self.edge_targets = edge_targets
+        self.edge_kinds = edge_kinds
+
+        # Sorted addresses of the functions called.
+        self.calls = calls
+
+        # Reverse adjacency arrays (built on demand).
+        self._predecessor_offsets = None
+        self._predecessor_sources = None
+
+    @property
+    def block_count(self):
+        """Return the number of basic blocks."""
+        return len(self.starts)
+
+    @property
+    def edge_count(self):
+        """Return the number of edges."""
+        return len(self.edge_targets)
+
+    @property
+    def entry_block(self):
+        """Return the index of the block starting at the entry point."""
+        return self.block_index(self.entry)
+
+    def block_index(self, address):
+        """Return the index of the block containing the given address or None
+        if it's outside the function."""
+        i = bisect_right(self.starts, address) - 1
+
+        if i >= 0 and address < self.ends[i]:
+            return i
+
+        return None
+
+    def successors(self, block):
+        """Return a list of (block, kind) tuples for the given block
+        successors."""
+        begin = self.edge_offsets[block]
+        end = self.edge_offsets[block + 1]
+
+        return zip(self.edge_targets[begin:end], self.edge_kinds[begin:end])
+
+    def predecessors(self, block):
+        """Return a list of the blocks preceding the given one."""
+        if self._predecessor_offsets is None:
+            self._build_predecessors()
+
+        return self._predecessor_sources[
+            self._predecessor_offsets[block] :
+            self._predecessor_offsets[block + 1]].tolist()
+
+    def _build_predecessors(self):
+        """Build the reverse adjacency arrays. Only for internal use."""
+        count = self.block_count
+        offsets = array("L", [0]) * (count + 1)
+
+        for target in self.edge_targets:
+            offsets[target + 1] += 1
+
+        for i in xrange(count):
+            offsets[i + 1] += offsets[i]
+
+        sources = array("L", [0]) * len(self.edge_targets)
+        position = offsets[:-1]
+
+        for block in xrange(count):
+            for i in xrange(self.edge_offsets[block],
+                self.edge_offsets[block + 1]):
+
+                target = self.edge_targets[i]
+                sources[position[target]] = block
+                position[target] += 1
+
+        self._predecessor_offsets = offsets
+        self._predecessor_sources = sources
+
+    def __len__(self):
+        return self.block_count
+
+    def __iter__(self):
+        """Iterate through (start, end) tuples of every block."""
+        return iter(zip(self.starts, self.ends))
+
+    def __repr__(self):
+        return "<FunctionGraph 0x%X blocks=%d edges=%d>" % (
+            self.entry, self.block_count, self.edge_count)
+
+
+class CfgBuilder(object):
+    """
+    Build the control flow graph of functions from their disassembly. The
+    instructions are kept in columnar arrays and graphs are built one at a
+    time so only the ones in use are alive.
+
+    """
+
+    def __init__(self, instructions):
+        """
+        instructions is an iterable of (address, size, branch_delay_insns,
+        insn_type, target, target2[, disassembly]) tuples sorted by address
+        like the ones returned by Opcodes.recursive_disassemble (the
+        disassembly is ignored so metadata_only results are enough).
+
+        """
+        self._addresses = array("L")
+        self._sizes = array("I")
+        self._delays = array("B")
+        self._types = array("B")
+        self._targets = array("L")
+
+        for instruction in instructions:
+            address, size, delay, insn_type, target = instruction[:5]
+
+            self._addresses.append(address)
+            self._sizes.append(size)
+            self._delays.append(max(delay, 0))
+            self._types.append(insn_type)
+            self._targets.append(target)
+
+    def _instruction_index(self, address):
+        """Return the index of the instruction at the given address or None.
+        Only for internal use.
+
+        """
+        i = bisect_left(self._addresses, address)
+
+        if i < len(self._addresses) and self._addresses[i] == address:
+            return i
+
+        return None
+
+    def _follows(self, index):
+        """Return True if the instruction at index + 1 is right after the one
+        at index. Only for internal use.
+
+        """
+        return index + 1 < len(self._addresses) and \
+            self._addresses[index + 1] == \
+                self._addresses[index] + self._sizes[index]
+
+    def _explore(self, entry_index):
+        """
+        Walk the function flow (without following calls) from the given
+        instruction.
+
+        @return : A (instructions, leaders, calls) tuple with the indexes of
+                    the instructions reached, those starting a block and the
+                    called addresses. Only for internal use.
+
+        """
+        types = self._types
+
+        visited = set()
+        leaders = set([entry_index])
+        calls = set()
+
+        pending = [entry_index]
+
+        while pending:
+            index = pending.pop()
+
+            while index not in visited:
+                visited.add(index)
+
+                insn_type = types[index]
+
+                if insn_type == InstructionType.NON_INSN:
+                    break
+
+                if insn_type in (InstructionType.JSR,
+                    InstructionType.COND_JSR):
+                    # Zero stands for an unknown (indirect) target.
+                    if self._targets[index]:
+                        calls.add(self._targets[index])
+
+                elif insn_type in (InstructionType.BRANCH,
+                    InstructionType.COND_BRANCH):
+
+                    target = self._instruction_index(self._targets[index])
+
+                    if target is not None:
+                        leaders.add(target)
+                        pending.append(target)
+
+                    # The branch takes effect after its delay slots.
+                    last = index
+                    for i in xrange(self._delays[index]):
+                        if not self._follows(last):
+                            break
+                        last += 1
+                        visited.add(last)
+
+                    if insn_type == InstructionType.BRANCH or \
+                        not self._follows(last):
+                        break
+
+                    leaders.add(last + 1)
+                    index = last + 1
+                    continue
+
+                if not self._follows(index):
+                    break
+
+                index += 1
+
+        return visited, leaders, calls
+
+    def build(self, entry):
+        """Return the FunctionGraph of the function at the given address or
+        None if there is no instruction there."""
+        entry_index = self._instruction_index(entry)
+
+        if entry_index is None:
+            return None
+
+        visited, leaders, calls = self._explore(entry_index)
+
+        addresses = self._addresses
+        sizes = self._sizes
+        types = self._types
+
+        #
+        # Split the instructions reached in blocks. A block ends before a
+        # leader, a gap or after a branch (and its delay slots).
+        #
+        blocks = []
+        first = previous = control = end_at = None
+
+        for index in sorted(visited):
+            if first is not None and (index in leaders or \
+                index != previous + 1 or not self._follows(previous) or \
+                (end_at is not None and previous >= end_at)):
+
+                blocks.append((first, previous, control))
+                first = None
+
+            if first is None:
+                first = index
+                control = end_at = None
+
+            if control is None and types[index] in (
+                InstructionType.BRANCH, InstructionType.COND_BRANCH):
+
+                control = index
+                end_at = index + self._delays[index]
+
+            previous = index
+
+        if first is not None:
+            blocks.append((first, previous, control))
+
+        block_of = dict((block[0], i) for i, block in enumerate(blocks))
+
+        #
+        # Create the adjacency arrays.
+        #
+        starts = array("L")
+        ends = array("L")
+        edge_offsets = array("L", [0])
+        edge_targets = array("L")
+        edge_kinds = array("B")
+
+        for i, (first, last, control) in enumerate(blocks):
+            starts.append(addresses[first])
+            ends.append(addresses[last] + sizes[last])
+
+            falls_through = types[last] != InstructionType.NON_INSN
+
+            if control is not None:
+                target = block_of.get(
+                    self._instruction_index(self._targets[control]))
+
+                if types[control] == InstructionType.BRANCH:
+                    falls_through = False
+
+                    if target is not None:
+                        edge_targets.append(target)
+                        edge_kinds.append(EdgeKind.JUMP)
+
+                elif target is not None:
+                    edge_targets.append(target)
+                    edge_kinds.append(EdgeKind.CONDITIONAL)
+
+            if falls_through and i + 1 < len(blocks) and \
+                blocks[i + 1][0] == last + 1 and self._follows(last):
+
+                edge_targets.append(i + 1)
+                edge_kinds.append(EdgeKind.FALLTHROUGH)
+
+            edge_offsets.append(len(edge_targets))
+
+        return FunctionGraph(entry, starts, ends, edge_offsets, edge_targets,
+            edge_kinds, array("L", sorted(calls)))
+
+    def iter_functions(self, entries):
+        """Iterate through the FunctionGraph of every function at the given
+        addresses (sorted and without duplicates)."""
+        for entry in sorted(set(entries)):
+            graph = self.build(entry)
+
+            if graph is not None:
+                yield graph
+
+def iter_section_functions(abfd, section, opcodes):
+    """
+    Iterate through the FunctionGraph of every function in the given BFD
+    section. Functions start at FUNCTION symbols, the BFD start address and
+    every call target found inside the section.
+
+    """
+    # Skip symbols of other sections mapped at the same addresses (every
+    # section of a relocatable object starts at zero).
+    entries = set([address for address, symbol in \
+        abfd.symbols_in_range(section.vma, section.vma + section.size) \
+        if symbol.flags & SymbolFlags.FUNCTION and symbol.section is section])
+
+    if section.vma <= abfd.start_address < section.vma + section.size:
+        entries.add(abfd.start_address)
+
+    builder = CfgBuilder(opcodes.recursive_disassemble(
+        section.content, section.vma, list(entries), metadata_only=True))
+
+    # Calls to addresses without symbols discover new functions.
+    seen = set(entries)
+    pending = entries
+
+    while pending:
+        found = set()
+
+        for graph in builder.iter_functions(pending):
+            yield graph
+
+            for address in graph.calls:
+                if section.vma <= address < section.vma + section.size and \
+                    address not in seen:
+
+                    seen.add(address)
+                    found.add(address)
+
+        pending = found
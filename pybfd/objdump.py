@@ -13,8 +13,9 @@ import bfd
 from bfd_archs import *
 from bfd_base import *
 from opcodes import *
+from parallel import disassemble_bfd, get_code_sections
 from section import *
-from symbol import SYMBOL_FLAGS_NAMES_SHORT
+from symbol import get_symbol_flags_names
 
 __author__      = "Groundworks Technologies OSS Team"
 __contact__     = "oss@groundworkstech.com"
@@ -157,27 +158,25 @@ class DisassembleSectionAction(BfdActionWithFileParam):
     """Disassemble section content on the user-specified bfd(s)."""
 
     def do_action(self, parser, namespace, values, option_string):
-        #
-        # Iterate through every section present.
-        #
-        opcodes = Opcodes(self.bfd)
+        # Parsed in advance by main wherever it appears.
+        jobs = namespace.jobs
 
-        for section_name in self.bfd.sections:
-
-            section = self.bfd.sections[section_name]
+        if jobs > 1:
+            # Disassemble every code section in parallel.
+            results = disassemble_bfd(self.bfd, workers=jobs)
+        else:
+            opcodes = Opcodes(self.bfd)
 
-            # Skip non-code sections.
-            if (section.flags & (SectionFlags.CODE | \
-                SectionFlags.HAS_CONTENTS)) != \
-                (SectionFlags.CODE | SectionFlags.HAS_CONTENTS):
-                continue
+            results = ((section, opcodes.disassemble(
+                section.content, section.vma)) \
+                for section in get_code_sections(self.bfd))
 
-            #
-            # Obtain the section content and request its disassembly.
-            #
+        #
+        # Iterate through every code section present.
+        #
+        for section, instructions in results:
             print "\nDisassembly of section %s\n" % section.name
-            for vma, size, disasm in opcodes.disassemble(
-                section.content, section.vma):
+            for vma, size, disasm in instructions:
                 print "%8x (%d)\t%s" % (vma, size, disasm)
 
 
@@ -246,10 +245,7 @@ class DumpFileSymbols(BfdActionWithFileParam):
                 symbol.section.name,
                 symbol.name,
                 symbol.value,
-                ", ".join(
-                    [name for flag, name in \
-                        SYMBOL_FLAGS_NAMES_SHORT.iteritems() \
-                        if flag in symbol.flags] ))
+                ", ".join(get_symbol_flags_names(symbol.flags)))
 
 def init_parser():
     """Initialize option parser."""
@@ -294,6 +290,9 @@ def init_parser():
         type=FileType("r"), nargs="+",
         help="Display assembler contents of executable sections")
 
+    parser.add_argument("--jobs", type=int, default=1,
+        help="Disassemble executable sections using JOBS worker processes")
+
 
     group.add_argument("-D", "--disassemble-all",
         action=DisassembleSectionsAction,
@@ -345,6 +344,15 @@ def main():
     # Initialize the command line parser and process the requested file(s).
     parser = init_parser()
 
+    #
+    # Actions run while the command line is parsed so --jobs is parsed
+    # first to be known by -d even if it follows it.
+    #
+    jobs_parser = ArgumentParser(add_help=False)
+    jobs_parser.add_argument("--jobs", type=int, default=1)
+
+    parser.set_defaults(jobs=jobs_parser.parse_known_args()[0].jobs)
+
     args = parser.parse_args()
 
     # Display help and leave if nothing was specified.
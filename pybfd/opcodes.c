@@ -5,6 +5,7 @@
 //
 
 #include <Python.h>
+#include <pythread.h>
 
 #include <stdio.h>
 #include <stdarg.h>
@@ -32,9 +33,40 @@ typedef struct
 
 } SFILE;
 
+// Size of the scratch buffer holding the text classified in metadata only
+// mode.
+#define METADATA_TEXT_SIZE  128
+
+// Pseudo FILE object keeping just the text needed to classify an
+// instruction.
+typedef struct
+{
+  char buffer[METADATA_TEXT_SIZE];
+  size_t pos;
+
+  // Set once the rest of the text can be discarded.
+  int complete;
+
+  // Non zero to stop after the mnemonic and its first operand.
+  int first_operand_only;
+
+} MFILE;
+
 int ATTRIBUTE_PRINTF_2
 __disassemle_printf (SFILE *f, const char *format, ...);
 
+int ATTRIBUTE_PRINTF_2
+__disassemble_null_printf (SFILE *f, const char *format, ...);
+
+int ATTRIBUTE_PRINTF_2
+__disassemble_metadata_printf (MFILE *f, const char *format, ...);
+
+// Whether the backend fills the instruction information (insn_info_valid)
+// itself, learnt from the first instruction decoded for the target.
+#define BACKEND_INSN_INFO_UNKNOWN   0
+#define BACKEND_INSN_INFO_FILLED    1
+#define BACKEND_INSN_INFO_PARTIAL   2
+
 typedef struct
 {
     disassemble_info dinfo;
@@ -43,6 +75,28 @@ typedef struct
 
     SFILE sfile;
 
+    // Text classified in metadata only mode (see set_text_output).
+    MFILE mfile;
+    int backend_insn_info;
+
+    // Architecture, machine and endian disassemble_init_for_target was
+    // last called with (if target_initialized is set).
+    int target_initialized;
+    enum bfd_architecture target_arch;
+    unsigned long target_mach;
+    enum bfd_endian target_endian;
+
+    // View of the buffer of the smart disassembly session (if any) and the
+    // address of its first byte.
+    Py_buffer smart_view;
+    int has_smart_view;
+    bfd_vma smart_vma;
+
+    // Number of iterators using the structure and whether it was already
+    // deinitialized (it's freed once both conditions hold).
+    unsigned int users;
+    int released;
+
 } disassembler_pointer, *p_disassembler_pointer;
 
 
@@ -55,17 +109,167 @@ get_disassemble_function(   unsigned long long ull_arch,
 
 //int
 PyObject*
-disassemble(disassembler_pointer*   pdisasm_ptr);
+disassemble(disassembler_pointer*   pdisasm_ptr, int metadata_only);
 
 // Name     : initialize_opcodes
 disassembler_pointer* initialize_opcodes(void);
 
+//
+// Most libopcodes backends aren't reentrant (i386-dis keeps the instruction
+// being decoded in static variables, arm, aarch64, mips, sparc and xtensa
+// keep static state too) so the calls to their disassembler function are
+// serialized through a lock per architecture. Only the backends known to
+// keep their state in the disassemble_info structure run concurrently.
+// Locks are never held while calling Python so they can be waited for with
+// or without holding the GIL.
+//
+static PyThread_type_lock decode_locks[bfd_arch_last];
+
+// Backends decoding without static state (terminated by bfd_arch_unknown).
+static const enum bfd_architecture reentrant_archs[] = {
+    bfd_arch_powerpc, bfd_arch_rs6000, bfd_arch_unknown
+};
+
+// disassemble_init_for_target fills tables shared by every instance of an
+// architecture so it's always serialized.
+static PyThread_type_lock init_lock = NULL;
+
+//
+// Name     : init_decode_locks
+//
+// Purpose  : Allocate the lock of every non-reentrant architecture. Called
+//              once when the module is loaded.
+//
+// Params   : -
+//
+// Returns  : 0 on success, -1 on memory exhaustion.
+//
+static int
+init_decode_locks(void)
+{
+    const enum bfd_architecture* arch;
+    unsigned int i;
+
+    if (!(init_lock = PyThread_allocate_lock()))
+        return -1;
+
+    for (i = 0; i < bfd_arch_last; i++) {
+        for (arch = reentrant_archs; *arch != bfd_arch_unknown; arch++) {
+            if (*arch == i)
+                break;
+        }
+
+        if (*arch == bfd_arch_unknown &&
+            !(decode_locks[i] = PyThread_allocate_lock()))
+            return -1;
+    }
+
+    return 0;
+}
+
+//
+// Name     : get_decode_lock
+//
+// Purpose  : Return the lock serializing the decoding of an architecture.
+//
+// Params   :   arch : The architecture.
+//
+// Returns  : The lock or NULL if its backend is reentrant.
+//
+static PyThread_type_lock
+get_decode_lock(enum bfd_architecture arch)
+{
+    if ((unsigned int)arch >= bfd_arch_last)
+        return decode_locks[bfd_arch_unknown];
+
+    return decode_locks[arch];
+}
+
+//
+// Name     : lock_acquire
+//
+// Purpose  : Acquire a libopcodes lock while holding the GIL. The GIL is
+//              released while waiting so the current owner can finish.
+//
+// Params   :   lock : The lock (nothing is done if NULL).
+//
+// Returns  : -
+//
+static void
+lock_acquire(PyThread_type_lock lock) {
+    if (lock && !PyThread_acquire_lock(lock, NOWAIT_LOCK)) {
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(lock, WAIT_LOCK);
+        Py_END_ALLOW_THREADS
+    }
+}
+
+//
+// Name     : call_disassembler
+//
+// Purpose  : Decode a single instruction with the disassembler function
+//              holding the lock of its architecture (if any). Must be called
+//              without holding the GIL.
+//
+// Params   :   pdisasm_ptr : Internal control structure.
+//              vma : Address of the instruction.
+//
+// Returns  : The instruction size (zero or negative on error).
+//
+static int
+call_disassembler(disassembler_pointer* pdisasm_ptr, bfd_vma vma)
+{
+    PyThread_type_lock lock = get_decode_lock(pdisasm_ptr->dinfo.arch);
+    int n;
+
+    if (lock)
+        PyThread_acquire_lock(lock, WAIT_LOCK);
+
+    n = pdisasm_ptr->pfn_disassemble(vma, &pdisasm_ptr->dinfo);
+
+    if (lock)
+        PyThread_release_lock(lock);
+
+    return n;
+}
+
+//
+// Supported architectures indexed by their value (NULL if unsupported).
+//
+static supported_disasm* disasm_dispatch[bfd_arch_last];
+
+//
+// Name     : init_disassemble_dispatch
+//
+// Purpose  : Build the architecture dispatch table from our list of
+//              supported architectures. Called once when the module is
+//              loaded.
+//
+// Params   : -
+//
+// Returns  : -
+//
+void
+init_disassemble_dispatch(void)
+{
+    unsigned int i;
+    enum bfd_architecture arch;
+
+    for (i = 0; p_supported_disasm_list[i].bfd_arch != bfd_arch_last; i++)
+    {
+        arch = p_supported_disasm_list[i].bfd_arch;
+
+        // The first entry of an architecture wins (if listed twice).
+        if (arch < bfd_arch_last && !disasm_dispatch[arch])
+            disasm_dispatch[arch] = &p_supported_disasm_list[i];
+    }
+}
+
 //
 // Name     : get_disassemble_function
 //
-// Purpose  : Iterate through our list of supported architectures looking for
-//              the correct disassembly function set according to the
-//              user-specified endianess.
+// Purpose  : Look up the disassembly function of the given architecture in
+//              the dispatch table according to the user-specified endianess.
 //
 // Params   : -
 //
@@ -73,26 +277,17 @@ disassembler_ftype
 get_disassemble_function(   unsigned long long ull_arch,
                             unsigned long ul_endian)
 {
-    unsigned int i;
+    supported_disasm* entry;
 
-    //
-    //
-    for (i = 0; p_supported_disasm_list[i].bfd_arch != bfd_arch_last; i++)
-    {
-        if (p_supported_disasm_list[i].bfd_arch == ull_arch) {
-            if (ul_endian == BFD_ENDIAN_BIG) {
-                return p_supported_disasm_list[i].bfd_print_insn_endian_big;
-            }
-            else
-            {
-                // Fallback on unknown endian or architectures with just
-                //  one endianess.
-                return p_supported_disasm_list[i].bfd_print_insn_endian_little;
-            }
-        }
+    if (ull_arch >= bfd_arch_last || !(entry = disasm_dispatch[ull_arch]))
+        return (disassembler_ftype)NULL;
+
+    if (ul_endian == BFD_ENDIAN_BIG) {
+        return entry->bfd_print_insn_endian_big;
     }
 
-    return (disassembler_ftype)NULL;
+    // Fallback on unknown endian or architectures with just one endianess.
+    return entry->bfd_print_insn_endian_little;
 }
 
 //
@@ -146,7 +341,8 @@ initialize_opcodes()
     //pdisasm_ptr->sfile.alloc = 0;
     //pdisasm_ptr->sfile.pos = 0;
     //pdisasm_ptr->sfile.buffer = NULL;
-    pdisasm_ptr->sfile.alloc = 100 * 1024;
+    // A single disassembled line is short and the buffer grows on demand.
+    pdisasm_ptr->sfile.alloc = 1024;
     pdisasm_ptr->sfile.pos = 0;
     pdisasm_ptr->sfile.buffer = (char *) malloc (pdisasm_ptr->sfile.alloc);
 
@@ -156,6 +352,131 @@ initialize_opcodes()
     return pdisasm_ptr;
 }
 
+//
+// Name     : ensure_disassemble_function
+//
+// Purpose  : Assign the disassembler function based on user-specified
+//              parameters like architecture, specific machine and endianess
+//              if it is not currently assigned. This might happend becase
+//              the architure or the endian fields in the disassembly_info
+//              structure have changed.
+//
+// Params   :   pdisasm_ptr : Internal control structure.
+//
+// Returns  : 0 on success, -1 (with a Python exception set) otherwise.
+//
+int
+ensure_disassemble_function(disassembler_pointer* pdisasm_ptr)
+{
+    if (!pdisasm_ptr->pfn_disassemble) {
+        pdisasm_ptr->pfn_disassemble = get_disassemble_function(
+            pdisasm_ptr->dinfo.arch,
+            pdisasm_ptr->dinfo.endian);
+
+        if (!pdisasm_ptr->pfn_disassemble) {
+            PyErr_SetString(
+                PyExc_TypeError,
+                "Disassembler unavailable for current architecture.");
+            return -1;
+        }
+    }
+
+    return 0;
+}
+
+//
+// Name     : release_smart_buffer
+//
+// Purpose  : Release the buffer of the smart disassembly session (if any).
+//
+// Params   :   pdisasm_ptr : Internal control structure.
+//
+// Returns  : -
+//
+void
+release_smart_buffer(disassembler_pointer* pdisasm_ptr)
+{
+    if (pdisasm_ptr->has_smart_view) {
+        PyBuffer_Release(&pdisasm_ptr->smart_view);
+        pdisasm_ptr->has_smart_view = 0;
+    }
+
+    pdisasm_ptr->dinfo.buffer = NULL;
+    pdisasm_ptr->dinfo.buffer_length = 0;
+}
+
+//
+// Name     : release_disassembler
+//
+// Purpose  : Mark the structure as deinitialized by its owner and free it
+//              along with its resources unless an iterator still uses it.
+//
+// Params   :   pdisasm_ptr : Internal control structure.
+//
+// Returns  : -
+//
+void
+release_disassembler(disassembler_pointer* pdisasm_ptr)
+{
+    pdisasm_ptr->released = 1;
+
+    if (pdisasm_ptr->users)
+        return;
+
+    if (pdisasm_ptr->sfile.buffer) {
+        free (pdisasm_ptr->sfile.buffer);
+    }
+    // The session buffer belongs to Python.
+    release_smart_buffer(pdisasm_ptr);
+
+    free (pdisasm_ptr);
+}
+
+//
+// Name     : ensure_target_initialized
+//
+// Purpose  : Call disassemble_init_for_target unless it was already called
+//              for the current architecture, machine and endian so short
+//              disassemblies don't pay its cost every time.
+//
+// Params   :   pdisasm_ptr : Internal control structure.
+//
+// Returns  : -
+//
+void
+ensure_target_initialized(disassembler_pointer* pdisasm_ptr)
+{
+    disassemble_info* dinfo = &(pdisasm_ptr->dinfo);
+    PyThread_type_lock decode_lock;
+
+    if (pdisasm_ptr->target_initialized &&
+        pdisasm_ptr->target_arch == dinfo->arch &&
+        pdisasm_ptr->target_mach == dinfo->mach &&
+        pdisasm_ptr->target_endian == dinfo->endian)
+        return;
+
+    // The decoding lock (if any) keeps the backend from using the tables
+    // being initialized.
+    decode_lock = get_decode_lock(dinfo->arch);
+
+    lock_acquire(init_lock);
+    lock_acquire(decode_lock);
+
+    disassemble_init_for_target(dinfo);
+
+    if (decode_lock)
+        PyThread_release_lock(decode_lock);
+
+    PyThread_release_lock(init_lock);
+
+    pdisasm_ptr->target_initialized = 1;
+    pdisasm_ptr->target_arch = dinfo->arch;
+    pdisasm_ptr->target_mach = dinfo->mach;
+    pdisasm_ptr->target_endian = dinfo->endian;
+
+    pdisasm_ptr->backend_insn_info = BACKEND_INSN_INFO_UNKNOWN;
+}
+
 //
 // Name     : __disassemle_printf
 //
@@ -203,6 +524,74 @@ __disassemle_printf (SFILE *f, const char *format, ...)
     return n;
 }
 
+//
+// Name     : __disassemble_null_printf
+//
+// Purpose  : Discard the disassembly text. Used when only the instruction
+//              metadata is needed.
+//
+// Params   :   f : Pseudo FILE object (unused).
+//              format : Format string (unused).
+//
+// Returns  : Zero.
+//
+int ATTRIBUTE_PRINTF_2
+__disassemble_null_printf (SFILE *f, const char *format, ...)
+{
+    return 0;
+}
+
+//
+// Name     : __disassemble_metadata_printf
+//
+// Purpose  : Keep the beginning of the disassembly text in a scratch buffer
+//              (up to the end of the first operand if requested) and
+//              discard the rest. Used when the instructions metadata comes
+//              from the classification of their text.
+//
+// Params   :   f : Pseudo FILE object with the scratch buffer.
+//              format : Format string.
+//
+// Returns  : Number of characters formatted (zero once discarding).
+//
+int ATTRIBUTE_PRINTF_2
+__disassemble_metadata_printf (MFILE *f, const char *format, ...)
+{
+    size_t space = sizeof(f->buffer) - f->pos;
+    va_list args;
+    char* comma;
+    int n;
+
+    if (f->complete)
+        return 0;
+
+    va_start (args, format);
+    n = vsnprintf (f->buffer + f->pos, space, format, args);
+    va_end (args);
+
+    if (n < 0)
+        return 0;
+
+    // A truncated text keeps what fits (NUL terminated).
+    if ((size_t)n >= space) {
+        f->pos = sizeof(f->buffer) - 1;
+        f->complete = 1;
+    }
+    // Neither the prefixes nor the mnemonic have commas so the first one
+    // ends the first operand.
+    else if (f->first_operand_only &&
+        (comma = strchr(f->buffer + f->pos, ','))) {
+        *comma = 0;
+        f->pos = comma - f->buffer;
+        f->complete = 1;
+    }
+    else {
+        f->pos += n;
+    }
+
+    return n;
+}
+
 //
 // Name     : fix_bfd_pre_metadata
 //
@@ -237,490 +626,2559 @@ void fix_bfd_pre_metadata(disassemble_info *dinfo, bfd_vma address)
 }
 
 //
-// Name     : fix_bfd_metadata
+// Instruction classification rules. Backends that don't fill the
+// instruction information themselves are classified by looking up the
+// mnemonic of the disassembled text in a per-architecture rule table.
+//
+
+// The mnemonic starts with the rule text (otherwise it must be equal).
+#define RULE_PREFIX         0x01
+// The mnemonic may end with an ARM condition code making it conditional.
+#define RULE_CONDITION      0x02
+// The target address is extracted from the operands.
+#define RULE_TARGET         0x04
+// Only a branch when the first operand (destination) is the pc.
+#define RULE_PC_DEST        0x08
+// Only a branch when the pc is in the register list.
+#define RULE_PC_LIST        0x10
+// The mnemonic may end with ARM suffixes (condition code, flags update or
+// load multiple addressing mode), the condition making it conditional.
+#define RULE_SUFFIXES       0x20
+
+#define RULE(mnemonic, insn_type, flags) \
+    { mnemonic, sizeof(mnemonic) - 1, insn_type, flags }
+
+typedef struct
+{
+    const char* mnemonic;
+    size_t length;
+    enum dis_insn_type insn_type;
+    unsigned char flags;
+
+} classification_rule;
+
+//
+// Rules of every architecture. They must be sorted by their first letter
+// and, inside a letter, the first matching rule wins.
+//
+static const classification_rule arm_rules[] = {
+    RULE("add",     dis_branch,     RULE_SUFFIXES | RULE_PC_DEST),
+    RULE("b",       dis_branch,     RULE_CONDITION | RULE_TARGET),
+    RULE("bl",      dis_jsr,        RULE_CONDITION | RULE_TARGET),
+    RULE("blx",     dis_jsr,        RULE_CONDITION | RULE_TARGET),
+    RULE("bx",      dis_branch,     RULE_CONDITION),
+    RULE("cbnz",    dis_condbranch, RULE_TARGET),
+    RULE("cbz",     dis_condbranch, RULE_TARGET),
+    RULE("ldm",     dis_branch,     RULE_SUFFIXES | RULE_PC_LIST),
+    RULE("ldr",     dis_branch,     RULE_SUFFIXES | RULE_PC_DEST),
+    RULE("mov",     dis_branch,     RULE_SUFFIXES | RULE_PC_DEST),
+    RULE("pop",     dis_branch,     RULE_SUFFIXES | RULE_PC_LIST),
+    RULE("sub",     dis_branch,     RULE_SUFFIXES | RULE_PC_DEST),
+};
+
+static const classification_rule powerpc_rules[] = {
+    RULE("b",       dis_branch,     RULE_TARGET),
+    RULE("ba",      dis_branch,     RULE_TARGET),
+    RULE("bctr",    dis_branch,     0),
+    RULE("bctrl",   dis_jsr,        0),
+    RULE("bl",      dis_jsr,        RULE_TARGET),
+    RULE("bla",     dis_jsr,        RULE_TARGET),
+    RULE("blr",     dis_branch,     0),
+    RULE("blrl",    dis_jsr,        0),
+    // BNE, BEQ, BDNZ, etc.
+    RULE("b",       dis_condbranch, RULE_PREFIX | RULE_TARGET),
+};
+
+static const classification_rule i386_rules[] = {
+    RULE("call",    dis_jsr,        RULE_PREFIX | RULE_TARGET),
+    RULE("iret",    dis_branch,     RULE_PREFIX),
+    RULE("jmp",     dis_branch,     RULE_PREFIX | RULE_TARGET),
+    // JA, JAE, JB, JBE, JC, JCXZ, JE, JG, JGE, JL, JLE, JNA, JNAE, JNB,
+    // JNBE, JNC, JNE, JNG, JNGE, JNL, JNLE, JNO, JNP, JNS, JNZ, JO, JP,
+    // JPE, JPO, JS, JZ.
+    RULE("j",       dis_condbranch, RULE_PREFIX | RULE_TARGET),
+    RULE("lcall",   dis_jsr,        RULE_PREFIX | RULE_TARGET),
+    RULE("ljmp",    dis_branch,     RULE_PREFIX | RULE_TARGET),
+    RULE("loop",    dis_condbranch, RULE_PREFIX | RULE_TARGET),
+    RULE("lret",    dis_branch,     RULE_PREFIX),
+    RULE("ret",     dis_branch,     RULE_PREFIX),
+};
+
+static const classification_rule xtensa_rules[] = {
+    RULE("break",   dis_branch,     RULE_PREFIX),
+    RULE("b",       dis_condbranch, RULE_PREFIX | RULE_TARGET),
+    RULE("call",    dis_jsr,        RULE_PREFIX | RULE_TARGET),
+    RULE("j",       dis_branch,     RULE_PREFIX | RULE_TARGET),
+    RULE("ret",     dis_branch,     RULE_PREFIX),
+};
+
+// x86 instruction prefixes printed before the mnemonic.
+static const char* i386_prefixes[] = {
+    "addr16", "addr32", "bnd", "cs", "data16", "data32", "ds", "es", "fs",
+    "gs", "lock", "notrack", "rep", "repe", "repne", "repnz", "repz", "ss",
+    NULL
+};
+
+#define LETTER_COUNT    26
+
+typedef struct
+{
+    const classification_rule* rules;
+    unsigned int count;
+
+    // Prefixes skipped before the mnemonic (NULL terminated) or NULL.
+    const char** prefixes;
+
+    // Non zero when the rules only look at the mnemonic and the first
+    // operand (the rest of the text isn't formatted in metadata only mode).
+    int first_operand_only;
+
+    // Rules starting with letter i are buckets[i] to buckets[i + 1] - 1.
+    unsigned int buckets[LETTER_COUNT + 1];
+
+} classification_table;
+
+#define TABLE(rules, prefixes, first_operand_only) \
+    { rules, sizeof(rules) / sizeof(rules[0]), prefixes, \
+        first_operand_only, { 0 } }
+
+// The ARM register lists, the PowerPC condition registers and the Xtensa
+// compared registers precede the operands the rules look at.
+static classification_table arm_table = TABLE(arm_rules, NULL, 0);
+static classification_table powerpc_table = TABLE(powerpc_rules, NULL, 0);
+static classification_table i386_table =
+    TABLE(i386_rules, i386_prefixes, 1);
+static classification_table xtensa_table = TABLE(xtensa_rules, NULL, 0);
+
+// ARM condition codes (AL is handled as unconditional).
+static const char* arm_conditions[] = {
+    "eq", "ne", "cs", "hs", "cc", "lo", "mi", "pl", "vs", "vc", "hi", "ls",
+    "ge", "lt", "gt", "le", NULL
+};
+
+static const char* arm_ldm_modes[] = {
+    "ia", "ib", "da", "db", "fd", "fa", "ed", "ea", NULL
+};
+
+#define LOWER(c)    (((c) >= 'A' && (c) <= 'Z') ? (c) - 'A' + 'a' : (c))
+#define IS_SPACE(c) ((c) == ' ' || (c) == '\t')
+
 //
-// Purpose  : -
+// Name     : init_classification_table
 //
-// Params   :   dinfo : BFD structure with disassembly information.
-//              opcode : Disassembled instruction.
+// Purpose  : Compute the letter buckets of a classification table.
+//
+// Params   :   table : The table to initialize.
 //
 // Returns  : -
 //
 void
-fix_bfd_metadata(disassemble_info *dinfo, const char *opcode)
+init_classification_table(classification_table* table)
 {
-    //printf("-> %s\n", opcode);
-    dinfo->insn_type = dis_nonbranch;
-
-    switch(dinfo->arch)
-    {
-    case bfd_arch_arm: // ARM
-        dinfo->insn_info_valid = 1;
-
-        if ((!strncasecmp(opcode,"bx", 2)) || (strcasestr(opcode,"lr"))) {
-            dinfo->insn_type = dis_branch;
-        }
-        else if (!strncasecmp(opcode,"bl", 2) || !strncasecmp(opcode,"blx", 3)) {
-            dinfo->insn_type = dis_jsr;
-        }
-        else if (!strncasecmp(opcode,"b ", 2)) { // has a space !!!
-            dinfo->insn_type = dis_branch;
+    unsigned int i, letter;
 
-            const char *p = strstr(opcode,"0x");
+    memset(table->buckets, 0, sizeof(table->buckets));
 
-            if (p)
-                sscanf(p,"0x%" BFD_VMA_FMT "x", &dinfo->target);
-        }
-        else if (!strncasecmp(opcode,"b", 1)) { // BNE,BA,BE,etc.
-            dinfo->insn_type = dis_condbranch;
+    // Count the rules of every letter and accumulate them.
+    for (i = 0; i < table->count; i++) {
+        letter = table->rules[i].mnemonic[0] - 'a';
+        table->buckets[letter + 1]++;
+    }
 
-            const char *p = strstr(opcode,"0x");
+    for (i = 0; i < LETTER_COUNT; i++)
+        table->buckets[i + 1] += table->buckets[i];
+}
 
-            if (p)
-                sscanf(p,"0x%" BFD_VMA_FMT "x", &dinfo->target);
-        }
-        break;
+//
+// Name     : init_classification_tables
+//
+// Purpose  : Initialize every classification table. Called once when the
+//              module is loaded.
+//
+// Params   : -
+//
+// Returns  : -
+//
+void
+init_classification_tables(void)
+{
+    init_classification_table(&arm_table);
+    init_classification_table(&powerpc_table);
+    init_classification_table(&i386_table);
+    init_classification_table(&xtensa_table);
+}
+
+//
+// Name     : get_classification_table
+//
+// Purpose  : Get the classification table of an architecture.
+//
+// Params   :   arch : The architecture.
+//
+// Returns  : The table or NULL if the architecture isn't classified.
+//
+const classification_table*
+get_classification_table(enum bfd_architecture arch)
+{
+    switch(arch)
+    {
+    case bfd_arch_arm: // ARM
+        return &arm_table;
 
     case bfd_arch_powerpc: // PowerPC
+        return &powerpc_table;
+
+    case bfd_arch_ia64: // x86_64 info
+    case bfd_arch_i386: // 386 info
+        return &i386_table;
+
+    case bfd_arch_xtensa: // Tensilica Xtensa info
+        return &xtensa_table;
+
+    // TODO: Add SPARC rules and test cases.
+    default:
+        return NULL;
+    }
+}
+
+//
+// Name     : set_text_output
+//
+// Purpose  : Enable or disable the formatting of the disassembly text. When
+//              disabled, the text the architecture classification rules
+//              need (if any) is still kept in a scratch buffer unless the
+//              backend fills the instruction information itself.
+//
+// Params   :   pdisasm_ptr : Internal control structure.
+//              enabled : Zero to discard the text if possible.
+//
+// Returns  : -
+//
+void
+set_text_output(disassembler_pointer* pdisasm_ptr, int enabled)
+{
+    disassemble_info* dinfo = &(pdisasm_ptr->dinfo);
+    const classification_table* table = get_classification_table(dinfo->arch);
+
+    if (enabled) {
+        dinfo->fprintf_func = (fprintf_ftype)__disassemle_printf;
+        dinfo->stream = &pdisasm_ptr->sfile;
+    }
+    else if (!table ||
+        pdisasm_ptr->backend_insn_info == BACKEND_INSN_INFO_FILLED) {
+        dinfo->fprintf_func = (fprintf_ftype)__disassemble_null_printf;
+        dinfo->stream = &pdisasm_ptr->sfile;
+    }
+    else {
+        dinfo->fprintf_func = (fprintf_ftype)__disassemble_metadata_printf;
+        dinfo->stream = &pdisasm_ptr->mfile;
+        pdisasm_ptr->mfile.first_operand_only = table->first_operand_only;
+    }
+}
+
+//
+// Name     : parse_hex_address
+//
+// Purpose  : Parse the first hexadecimal number (0x prefixed) in a text.
+//
+// Params   :   text : Text to look into.
+//              address : Destination of the number (untouched if none).
+//
+// Returns  : 1 if a number was found, 0 otherwise.
+//
+int
+parse_hex_address(const char* text, bfd_vma* address)
+{
+    bfd_vma value;
+    const char* p;
+    char c;
+
+    for (; *text; text++) {
+        if (text[0] != '0' || LOWER(text[1]) != 'x')
+            continue;
+
+        value = 0;
+
+        for (p = text + 2; ; p++) {
+            c = LOWER(*p);
+
+            if (c >= '0' && c <= '9')
+                value = (value << 4) | (c - '0');
+            else if (c >= 'a' && c <= 'f')
+                value = (value << 4) | (c - 'a' + 10);
+            else
+                break;
+        }
+
+        if (p > text + 2) {
+            *address = value;
+            return 1;
+        }
+    }
+
+    return 0;
+}
+
+//
+// Name     : match_word
+//
+// Purpose  : Compare (case insensitive) the beginning of a text with a
+//              lowercase word.
+//
+// Returns  : 1 if the text starts with the word, 0 otherwise.
+//
+int
+match_word(const char* text, const char* word, size_t length)
+{
+    size_t i;
+
+    for (i = 0; i < length; i++) {
+        if (LOWER(text[i]) != word[i])
+            return 0;
+    }
+
+    return 1;
+}
+
+//
+// Name     : skip_instruction_prefixes
+//
+// Purpose  : Skip the leading blanks and instruction prefixes of a text.
+//
+// Params   :   table : Classification table with the prefixes.
+//              opcode : Disassembled instruction.
+//
+// Returns  : Pointer to the mnemonic.
+//
+const char*
+skip_instruction_prefixes(const classification_table* table,
+    const char* opcode)
+{
+    const char** prefix;
+    size_t length;
+    int skipped = 1;
+
+    while (IS_SPACE(*opcode))
+        opcode++;
+
+    while (table->prefixes && skipped) {
+        skipped = 0;
+
+        for (prefix = table->prefixes; *prefix; prefix++) {
+            length = strlen(*prefix);
+
+            // A prefix is always followed by the prefixed instruction.
+            if (IS_SPACE(opcode[length]) &&
+                match_word(opcode, *prefix, length)) {
+
+                for (opcode += length; IS_SPACE(*opcode); opcode++);
+
+                skipped = 1;
+                break;
+            }
+        }
+    }
+
+    return opcode;
+}
+
+//
+// Name     : match_arm_condition
+//
+// Purpose  : Check if a text starts with an ARM condition code.
+//
+// Params   :   text : The text (at least two characters long).
+//
+// Returns  : -1 if it doesn't, 1 for a real condition and 0 for "al".
+//
+int
+match_arm_condition(const char* text)
+{
+    const char** condition;
+
+    if (match_word(text, "al", 2))
+        return 0;
+
+    for (condition = arm_conditions; *condition; condition++) {
+        if (match_word(text, *condition, 2))
+            return 1;
+    }
+
+    return -1;
+}
+
+//
+// Name     : match_arm_suffixes
+//
+// Purpose  : Check if a text is made of ARM mnemonic suffixes: a condition
+//              code, the flags update ("s") and a load multiple addressing
+//              mode, each one at most once and in any order (the divided
+//              and unified syntaxes place them differently).
+//
+// Params   :   suffix : The text (not NUL terminated).
+//              length : Length of the text.
+//
+// Returns  : -1 if it isn't, 1 if it includes a condition code and 0
+//              otherwise.
+//
+int
+match_arm_suffixes(const char* suffix, size_t length)
+{
+    const char** mode;
+    int condition = -1, has_flags = 0, has_mode = 0, found;
+
+    while (length) {
+        found = 0;
+
+        if (condition < 0 && length >= 2 &&
+            (condition = match_arm_condition(suffix)) >= 0) {
+            found = 2;
+        }
+        else if (!has_mode && length >= 2) {
+            for (mode = arm_ldm_modes; *mode && !found; mode++) {
+                if (match_word(suffix, *mode, 2))
+                    has_mode = found = 2;
+            }
+        }
+
+        if (!found && !has_flags && LOWER(suffix[0]) == 's')
+            has_flags = found = 1;
+
+        if (!found)
+            return -1;
+
+        suffix += found;
+        length -= found;
+    }
+
+    return condition > 0;
+}
+
+//
+// Name     : match_rule
+//
+// Purpose  : Check if a mnemonic matches a classification rule.
+//
+// Params   :   rule : The rule.
+//              mnemonic : The mnemonic (not NUL terminated).
+//              length : Length of the mnemonic.
+//
+// Returns  : -1 if it doesn't match, 1 if it matches with a condition code
+//              and 0 otherwise.
+//
+int
+match_rule(const classification_rule* rule, const char* mnemonic,
+    size_t length)
+{
+    if (length < rule->length ||
+        !match_word(mnemonic, rule->mnemonic, rule->length))
+        return -1;
+
+    if ((rule->flags & RULE_PREFIX) || length == rule->length)
+        return 0;
+
+    if (rule->flags & RULE_SUFFIXES)
+        return match_arm_suffixes(
+            mnemonic + rule->length, length - rule->length);
+
+    if ((rule->flags & RULE_CONDITION) && length == rule->length + 2)
+        return match_arm_condition(mnemonic + rule->length);
+
+    return -1;
+}
+
+//
+// Name     : is_pc_register
+//
+// Purpose  : Check if a text starts with the pc register name.
+//
+int
+is_pc_register(const char* text)
+{
+    return match_word(text, "pc", 2) && (text[2] == ',' || text[2] == '}' ||
+        text[2] == 0 || IS_SPACE(text[2]));
+}
+
+//
+// Name     : writes_pc
+//
+// Purpose  : Check if an ARM instruction writes the pc according to the
+//              given rule.
+//
+// Params   :   rule : The matching rule.
+//              operands : The instruction operands.
+//
+// Returns  : 1 if the pc is written, 0 otherwise.
+//
+int
+writes_pc(const classification_rule* rule, const char* operands)
+{
+    if (rule->flags & RULE_PC_DEST)
+        return is_pc_register(operands);
+
+    // Look for the pc in the register list.
+    if (!(operands = strchr(operands, '{')))
+        return 0;
+
+    for (operands++; *operands && *operands != '}'; operands++) {
+        if ((operands[-1] == '{' || operands[-1] == ',' ||
+            IS_SPACE(operands[-1])) && is_pc_register(operands))
+            return 1;
+    }
+
+    return 0;
+}
+
+//
+// Name     : fix_bfd_metadata
+//
+// Purpose  : Classify the instruction just disassembled (and extract its
+//              target) when the backend doesn't provide that information.
+//
+// Params   :   dinfo : BFD structure with disassembly information.
+//              opcode : Disassembled instruction.
+//
+// Returns  : -
+//
+void
+fix_bfd_metadata(disassemble_info *dinfo, const char *opcode)
+{
+    const classification_table* table;
+    const classification_rule* rule;
+    const char *mnemonic, *operands;
+    size_t length;
+    unsigned int i, letter;
+    int conditional;
+
+    // Trust the backend when it fills the instruction information.
+    if (dinfo->insn_info_valid)
+        return;
+
+    dinfo->insn_type = dis_nonbranch;
+
+    if (!(table = get_classification_table(dinfo->arch)))
+        return;
+
+    dinfo->insn_info_valid = 1;
+
+    mnemonic = skip_instruction_prefixes(table, opcode);
+
+    // The mnemonic ends before its width suffix (i.e. "b.n") if any.
+    for (length = 0; mnemonic[length] && !IS_SPACE(mnemonic[length]) &&
+        mnemonic[length] != '.'; length++);
+
+    for (operands = mnemonic + length;
+        *operands && !IS_SPACE(*operands); operands++);
+
+    while (IS_SPACE(*operands))
+        operands++;
+
+    letter = LOWER(mnemonic[0]) - 'a';
+
+    if (!length || letter >= LETTER_COUNT)
+        return;
+
+    for (i = table->buckets[letter]; i < table->buckets[letter + 1]; i++) {
+        rule = &table->rules[i];
+
+        if ((conditional = match_rule(rule, mnemonic, length)) < 0)
+            continue;
+
+        if ((rule->flags & (RULE_PC_DEST | RULE_PC_LIST)) &&
+            !writes_pc(rule, operands))
+            continue;
+
+        dinfo->insn_type = rule->insn_type;
+
+        if (conditional) {
+            if (rule->insn_type == dis_branch)
+                dinfo->insn_type = dis_condbranch;
+            else if (rule->insn_type == dis_jsr)
+                dinfo->insn_type = dis_condjsr;
+        }
+
+        if (rule->flags & RULE_TARGET)
+            parse_hex_address(operands, &dinfo->target);
+
+        break;
+    }
+}
+
+//
+// Instructions decoded without holding the GIL. Python objects are created
+// from them once it's reacquired.
+//
+typedef struct
+{
+    bfd_vma vma;
+    unsigned int size;
+    char branch_delay_insns;
+    enum dis_insn_type insn_type;
+    bfd_vma target;
+    bfd_vma target2;
+
+    // Offset of the disassembly text (NUL terminated) in the chunk text.
+    size_t text_offset;
+
+} decoded_instruction;
+
+typedef struct
+{
+    decoded_instruction* instructions;
+    unsigned int count;
+    unsigned int alloc;
+
+    char* text;
+    size_t text_used;
+    size_t text_alloc;
+
+    // Zero to keep only the metadata of the instructions.
+    int keep_text;
+
+    // Zero to skip the classification of the instructions when only their
+    // text is needed.
+    int keep_metadata;
+
+} decoded_chunk;
+
+// Number of instructions decoded natively at once by disassemble().
+#define DISASSEMBLE_CHUNK_SIZE      4096
+
+// Smart sessions usually stop after a few instructions (i.e. at the end of a
+// function) so they decode ahead less.
+#define SMART_DISASSEMBLE_CHUNK_SIZE  64
+
+//
+// Name     : decoded_chunk_init
+//
+// Purpose  : Allocate the storage of a chunk of decoded instructions.
+//
+// Params   :   chunk : The chunk to initialize.
+//              count : Maximum number of instructions in the chunk.
+//
+// Returns  : 0 on success, -1 on memory exhaustion.
+//
+int
+decoded_chunk_init(decoded_chunk* chunk, unsigned int count)
+{
+    memset(chunk, 0, sizeof(decoded_chunk));
+
+    chunk->alloc = count;
+    chunk->instructions = (decoded_instruction*) malloc (
+        count * sizeof(decoded_instruction));
+
+    chunk->keep_text = 1;
+    chunk->keep_metadata = 1;
+    chunk->text_alloc = count * 32;
+    chunk->text = (char *) malloc (chunk->text_alloc);
+
+    if (!chunk->instructions || !chunk->text) {
+        free(chunk->instructions);
+        free(chunk->text);
+        return -1;
+    }
+
+    return 0;
+}
+
+//
+// Name     : decoded_chunk_release
+//
+// Purpose  : Release the storage of a chunk of decoded instructions.
+//
+// Params   :   chunk : The chunk to release.
+//
+// Returns  : -
+//
+void
+decoded_chunk_release(decoded_chunk* chunk)
+{
+    free(chunk->instructions);
+    free(chunk->text);
+}
+
+//
+// Name     : decode_instruction
+//
+// Purpose  : Disassemble a single instruction of the buffer set in the
+//              disassembler structure leaving its text in the formatting
+//              buffer and its metadata in the disassemble_info structure.
+//
+// Params   :   pdisasm_ptr : Internal control structure.
+//              vma : Address of the instruction.
+//              classify : Zero to skip the instruction classification when
+//                  the metadata isn't needed.
+//
+// Returns  : The instruction size (zero or negative on error).
+//
+int
+decode_instruction(disassembler_pointer* pdisasm_ptr, bfd_vma vma,
+    int classify)
+{
+    disassemble_info* dinfo = &(pdisasm_ptr->dinfo);
+    int n;
+
+    pdisasm_ptr->sfile.pos = 0;
+
+    if (pdisasm_ptr->sfile.buffer)
+        pdisasm_ptr->sfile.buffer[0] = 0;
+
+    pdisasm_ptr->mfile.pos = 0;
+    pdisasm_ptr->mfile.buffer[0] = 0;
+    pdisasm_ptr->mfile.complete = 0;
+
+    // Fix target address references for further usage.
+    fix_bfd_pre_metadata(dinfo, vma);
+
+    // Call the appropriate disassembler function.
+    n = call_disassembler(pdisasm_ptr, vma);
+
+    if (n <= 0 || !classify)
+        return n;
+
+    if (dinfo->fprintf_func == (fprintf_ftype)__disassemble_metadata_printf &&
+        pdisasm_ptr->backend_insn_info == BACKEND_INSN_INFO_UNKNOWN) {
+        //
+        // Stop formatting the text when the backend classifies the first
+        // instruction itself.
+        //
+        if (dinfo->insn_info_valid) {
+            pdisasm_ptr->backend_insn_info = BACKEND_INSN_INFO_FILLED;
+            set_text_output(pdisasm_ptr, 0);
+        }
+        else {
+            pdisasm_ptr->backend_insn_info = BACKEND_INSN_INFO_PARTIAL;
+        }
+    }
+    else if (dinfo->fprintf_func == (fprintf_ftype)__disassemble_null_printf &&
+        !dinfo->insn_info_valid && get_classification_table(dinfo->arch)) {
+        //
+        // The backend only classifies some instructions (or the target
+        // changed): keep the text from now on and decode this one again
+        // to get it.
+        //
+        pdisasm_ptr->backend_insn_info = BACKEND_INSN_INFO_PARTIAL;
+        set_text_output(pdisasm_ptr, 0);
 
-        dinfo->insn_info_valid = 1;
+        return decode_instruction(pdisasm_ptr, vma, classify);
+    }
+
+    fix_bfd_metadata(dinfo,
+        dinfo->stream == &pdisasm_ptr->mfile ?
+            pdisasm_ptr->mfile.buffer : pdisasm_ptr->sfile.buffer);
+
+    return n;
+}
+
+//
+// Name     : decoded_chunk_append
+//
+// Purpose  : Store the instruction just decoded (see decode_instruction)
+//              in the chunk growing it as needed.
+//
+// Params   :   chunk : Destination of the instruction.
+//              pdisasm_ptr : Internal control structure.
+//              vma : Address of the instruction.
+//              n : Size of the instruction.
+//
+// Returns  : 0 on success, -1 on memory exhaustion.
+//
+int
+decoded_chunk_append(decoded_chunk* chunk, disassembler_pointer* pdisasm_ptr,
+    bfd_vma vma, int n)
+{
+    disassemble_info* dinfo = &(pdisasm_ptr->dinfo);
+    decoded_instruction* instruction;
+    size_t text_length;
+    char* temp_buffer;
+
+    if (chunk->count == chunk->alloc) {
+        instruction = (decoded_instruction*) realloc (chunk->instructions,
+            chunk->alloc * 2 * sizeof(decoded_instruction));
+
+        if (!instruction)
+            return -1;
+
+        chunk->instructions = instruction;
+        chunk->alloc *= 2;
+    }
+
+    // Keep the disassembly text (and its terminator) in the chunk.
+    text_length = chunk->keep_text ? pdisasm_ptr->sfile.pos + 1 : 1;
+
+    if (chunk->text_used + text_length > chunk->text_alloc) {
+        chunk->text_alloc = (chunk->text_used + text_length) * 2;
+
+        temp_buffer = (char *) realloc (chunk->text, chunk->text_alloc);
+
+        if (!temp_buffer)
+            return -1;
+
+        chunk->text = temp_buffer;
+    }
+
+    if (chunk->keep_text && pdisasm_ptr->sfile.buffer)
+        memcpy(chunk->text + chunk->text_used, pdisasm_ptr->sfile.buffer,
+            text_length);
+    else
+        chunk->text[chunk->text_used] = 0;
+
+    instruction = &chunk->instructions[chunk->count++];
+
+    instruction->vma = vma;
+    instruction->size = n;
+    instruction->branch_delay_insns = dinfo->branch_delay_insns;
+    instruction->insn_type = dinfo->insn_type;
+    instruction->target = dinfo->target;
+    instruction->target2 = dinfo->target2;
+    instruction->text_offset = chunk->text_used;
+
+    chunk->text_used += text_length;
+
+    return 0;
+}
+
+//
+// Name     : decode_chunk
+//
+// Purpose  : Disassemble up to max_count instructions of the buffer set in
+//              the disassembler structure into a chunk. It doesn't touch any
+//              Python object so it's meant to run without holding the GIL.
+//
+// Params   :   pdisasm_ptr : Internal control structure.
+//              offset : Offset in the buffer to start disassembling at.
+//              max_count : Maximum number of instructions to decode.
+//              chunk : Destination of the decoded instructions.
+//
+// Returns  : The offset of the next instruction to decode or -1 on memory
+//              exhaustion.
+//
+long
+decode_chunk(disassembler_pointer* pdisasm_ptr, unsigned long offset,
+    unsigned int max_count, decoded_chunk* chunk)
+{
+    disassemble_info* dinfo = &(pdisasm_ptr->dinfo);
+    int n;
+
+    chunk->count = 0;
+    chunk->text_used = 0;
+
+    while (chunk->count < max_count && offset < dinfo->buffer_length)
+    {
+        n = decode_instruction(pdisasm_ptr, dinfo->buffer_vma + offset,
+            chunk->keep_metadata);
+
+        // Stop on undecodable data instead of looping on the same address.
+        if (n <= 0) {
+            offset = dinfo->buffer_length;
+            break;
+        }
+
+        if (decoded_chunk_append(
+            chunk, pdisasm_ptr, dinfo->buffer_vma + offset, n) < 0)
+            return -1;
+
+        offset += n;
+    }
+
+    pdisasm_ptr->sfile.pos = 0;
+
+    return offset;
+}
+
+//
+// Name     : build_instruction_tuple
+//
+// Purpose  : Create the Python representation of a decoded instruction.
+//
+// Params   :   instruction : Decoded instruction.
+//              text : Text blob of the chunk holding the instruction.
+//
+// Returns  : A tuple of address, size, number of delay slots, instruction
+//              type, targets and disassembled instruction.
+//
+PyObject*
+build_instruction_tuple(decoded_instruction* instruction, const char* text)
+{
+    return Py_BuildValue(
+        "(" PY_VMA_FMT ",I,b,I," PY_VMA_FMT "," PY_VMA_FMT ",s)",
+        instruction->vma,
+        instruction->size,
+        instruction->branch_delay_insns,
+        instruction->insn_type,
+        instruction->target,
+        instruction->target2,
+        text + instruction->text_offset);
+}
+
+//
+// Name     : build_metadata_tuple
+//
+// Purpose  : Create the Python representation of a decoded instruction
+//              without its disassembly text.
+//
+// Params   :   instruction : Decoded instruction.
+//
+// Returns  : A tuple of address, size, number of delay slots, instruction
+//              type and targets.
+//
+PyObject*
+build_metadata_tuple(decoded_instruction* instruction)
+{
+    return Py_BuildValue(
+        "(" PY_VMA_FMT ",I,b,I," PY_VMA_FMT "," PY_VMA_FMT ")",
+        instruction->vma,
+        instruction->size,
+        instruction->branch_delay_insns,
+        instruction->insn_type,
+        instruction->target,
+        instruction->target2);
+}
+
+//
+// Name     : get_callback_result
+//
+// Purpose  : Convert the value returned by a smart disassembly callback.
+//              Callbacks returning nothing (None) keep the session going and
+//              any integral value (int, long, bool) is accepted.
+//
+// Params   :   py_result : Value returned by the callback.
+//
+// Returns  : PYBFD_DISASM_CONTINUE, PYBFD_DISASM_STOP (or any other value
+//              stopping the session) or -1 with a Python exception set.
+//
+long
+get_callback_result(PyObject* py_result)
+{
+    if (py_result == Py_None)
+        return PYBFD_DISASM_CONTINUE;
+
+    return (long)PyNumber_AsSsize_t(py_result, NULL);
+}
+
+//
+// Name     : start_smart_disassemble
+//
+// Purpose  : Iterate through all the user-specified bytes requested libopcodes
+//              to disassemble them into a buffer for further usage.
+//              Instructions are decoded in chunks without holding the GIL and
+//              the callback is invoked afterwards for each one (or once per
+//              chunk with a list of them in batch mode). Instructions whose
+//              type isn't in the mask never reach the callback.
+//
+// Params   :   pdisasm_ptr : Internal control structure.
+//              offset : Offset in the buffer to start disassembling at.
+//              callback : Python callable invoked for the instructions.
+//              batch_size : Number of instructions per callback invocation
+//                  (zero to invoke it once per instruction).
+//              type_mask : Bitmask of the instruction types (1 << type) to
+//                  report.
+//              metadata_only : Non zero to report the instructions without
+//                  their disassembly text.
+//
+// Returns  : Number of bytes disassembled or -1 on error (with a Python
+//              exception set).
+//
+long
+start_smart_disassemble(disassembler_pointer* pdisasm_ptr, unsigned long offset,
+    PyObject *callback, unsigned int batch_size, unsigned int type_mask,
+    int metadata_only)
+{
+    disassemble_info* dinfo = &(pdisasm_ptr->dinfo);
+    unsigned long disassembled_bytes = 0;
+    unsigned int chunk_size;
+    long next_offset;
+    long callback_result = PYBFD_DISASM_CONTINUE;
+    unsigned int i;
+
+    decoded_chunk chunk;
+    decoded_instruction* instruction;
+
+    PyObject* py_batch = NULL;
+    PyObject* py_instruction;
+    PyObject* py_result;
+
+    chunk_size = batch_size ? batch_size : SMART_DISASSEMBLE_CHUNK_SIZE;
+
+    if (decoded_chunk_init(&chunk, chunk_size) < 0) {
+        PyErr_NoMemory();
+        return -1;
+    }
+
+    chunk.keep_text = !metadata_only;
+
+    set_text_output(pdisasm_ptr, !metadata_only);
+
+    while (offset < dinfo->buffer_length &&
+        callback_result == PYBFD_DISASM_CONTINUE)
+    {
+        Py_BEGIN_ALLOW_THREADS
+        next_offset = decode_chunk(pdisasm_ptr, offset, chunk_size, &chunk);
+        Py_END_ALLOW_THREADS
+
+        if (next_offset < 0) {
+            PyErr_NoMemory();
+            break;
+        }
+
+        if (!chunk.count)
+            break;
+
+        if (batch_size && !(py_batch = PyList_New(0)))
+            break;
+
+        for (i = 0; i < chunk.count; i++)
+        {
+            instruction = &chunk.instructions[i];
+
+            // keep track of the number of bytes processed.
+            disassembled_bytes += instruction->size;
+
+            if (!(type_mask & (1 << instruction->insn_type)))
+                continue;
+
+            //
+            // Report the instruction as a tuple of:
+            // - Address
+            // - Length
+            // - Number of delayed branch instructions
+            // - Instruction type
+            // - Target address number 1
+            // - Target address number 2
+            // - Disassembled instruction (unless metadata only).
+            //
+            if (batch_size) {
+                py_instruction = metadata_only ?
+                    build_metadata_tuple(instruction) :
+                    build_instruction_tuple(instruction, chunk.text);
+
+                if (!py_instruction)
+                    break;
+
+                if (PyList_Append(py_batch, py_instruction) < 0) {
+                    Py_DECREF(py_instruction);
+                    break;
+                }
+
+                Py_DECREF(py_instruction);
+                continue;
+            }
+
+            if (metadata_only)
+                py_result = PyObject_CallFunction(callback,
+                    "(" PY_VMA_FMT ",I,b,I," PY_VMA_FMT "," PY_VMA_FMT ")",
+                    instruction->vma,
+                    instruction->size,
+                    instruction->branch_delay_insns,
+                    instruction->insn_type,
+                    instruction->target,
+                    instruction->target2);
+            else
+                py_result = PyObject_CallFunction(callback,
+                    "(" PY_VMA_FMT ",I,b,I," PY_VMA_FMT "," PY_VMA_FMT ",s)",
+                    instruction->vma,
+                    instruction->size,
+                    instruction->branch_delay_insns,
+                    instruction->insn_type,
+                    instruction->target,
+                    instruction->target2,
+                    chunk.text + instruction->text_offset);
+
+            if (!py_result)
+                break;
+
+            callback_result = get_callback_result(py_result);
+            Py_DECREF(py_result);
+
+            if (callback_result != PYBFD_DISASM_CONTINUE)
+                break;
+        }
+
+        //
+        // Hand the whole batch (if not empty) to the callback at once.
+        //
+        if (py_batch) {
+            if (!PyErr_Occurred() && PyList_GET_SIZE(py_batch)) {
+                py_result = PyObject_CallFunctionObjArgs(
+                    callback, py_batch, NULL);
+
+                if (py_result) {
+                    callback_result = get_callback_result(py_result);
+                    Py_DECREF(py_result);
+                }
+            }
+
+            Py_CLEAR(py_batch);
+        }
+
+        if (PyErr_Occurred())
+            break;
+
+        offset = next_offset;
+    }
+
+    set_text_output(pdisasm_ptr, 1);
+
+    decoded_chunk_release(&chunk);
+
+    if (PyErr_Occurred())
+        return -1;
+
+    return disassembled_bytes;
+}
+
+//
+// Name     : disassemble
+//
+// Purpose  : Iterate through all the user-specified bytes requested libopcodes
+//              to disassemble them into a buffer for further usage.
+//              Instructions are decoded in chunks without holding the GIL.
+//
+// Params   :   pdisasm_ptr : Internal control structure.
+//              metadata_only : Non zero to skip the disassembly text.
+//
+// Returns  : A list object containing every disassembled instruction.
+//
+PyObject*
+disassemble(disassembler_pointer* pdisasm_ptr, int metadata_only)
+{
+    disassemble_info* dinfo = &(pdisasm_ptr->dinfo);
+
+    unsigned long offset = 0;
+    long next_offset;
+    unsigned int i;
+    int result;
+
+    decoded_chunk chunk;
+    decoded_instruction* instruction;
+
+    PyObject* py_instruction_list = NULL;
+    PyObject* py_instruction;
+
+    // Create a python list to hold all the instructions representations.
+    if (!(py_instruction_list = PyList_New(0)))
+        return NULL;
+
+    if (decoded_chunk_init(&chunk, DISASSEMBLE_CHUNK_SIZE) < 0) {
+        Py_DECREF(py_instruction_list);
+        return PyErr_NoMemory();
+    }
+
+    // Either the text or the metadata is returned, never both.
+    chunk.keep_text = !metadata_only;
+    chunk.keep_metadata = metadata_only;
+
+    set_text_output(pdisasm_ptr, !metadata_only);
+
+    while (offset < dinfo->buffer_length)
+    {
+        Py_BEGIN_ALLOW_THREADS
+        next_offset = decode_chunk(pdisasm_ptr, offset,
+            DISASSEMBLE_CHUNK_SIZE, &chunk);
+        Py_END_ALLOW_THREADS
+
+        if (next_offset < 0) {
+            PyErr_NoMemory();
+            break;
+        }
+
+        for (i = 0; i < chunk.count; i++)
+        {
+            instruction = &chunk.instructions[i];
+
+            //
+            // Add the current instruction to a list composed of:
+            // - Instruction address.
+            // - Instruction length.
+            // - Instruction disassembly.
+            // Or its address, length, delay slots, type and targets when
+            // only the metadata is requested.
+            //
+            if (metadata_only)
+                py_instruction = build_metadata_tuple(instruction);
+            else
+                py_instruction = Py_BuildValue(
+                    "(" PY_VMA_FMT ",I,s)",
+                    instruction->vma,
+                    instruction->size,
+                    chunk.text + instruction->text_offset);
+
+            if (!py_instruction)
+                break;
+
+            result = PyList_Append(py_instruction_list, py_instruction);
+            Py_DECREF(py_instruction);
+
+            if (result < 0)
+                break;
+        }
+
+        // Let signal handlers (i.e. Ctrl-C or timeouts) interrupt long runs.
+        if (PyErr_Occurred() || !chunk.count || PyErr_CheckSignals() < 0)
+            break;
+
+        offset = next_offset;
+    }
+
+    set_text_output(pdisasm_ptr, 1);
+
+    decoded_chunk_release(&chunk);
+
+    if (PyErr_Occurred()) {
+        Py_DECREF(py_instruction_list);
+        return NULL;
+    }
+
+    return py_instruction_list;
+}
+
+//
+// Growable list of addresses pending to be disassembled.
+//
+typedef struct
+{
+    bfd_vma* addresses;
+    size_t count;
+    size_t alloc;
+
+} address_worklist;
+
+//
+// Name     : worklist_push
+//
+// Purpose  : Add an address to the worklist growing it as needed.
+//
+// Params   :   worklist : Destination worklist.
+//              address : Address pending to be disassembled.
+//
+// Returns  : 0 on success, -1 on memory exhaustion.
+//
+int
+worklist_push(address_worklist* worklist, bfd_vma address)
+{
+    bfd_vma* temp_addresses;
+
+    if (worklist->count == worklist->alloc) {
+        worklist->alloc = worklist->alloc ? worklist->alloc * 2 : 256;
+
+        temp_addresses = (bfd_vma*) realloc (worklist->addresses,
+            worklist->alloc * sizeof(bfd_vma));
+
+        if (!temp_addresses)
+            return -1;
+
+        worklist->addresses = temp_addresses;
+    }
+
+    worklist->addresses[worklist->count++] = address;
+
+    return 0;
+}
+
+//
+// Name     : compare_decoded_instructions
+//
+// Purpose  : qsort callback sorting decoded instructions by address.
+//
+int
+compare_decoded_instructions(const void* a, const void* b)
+{
+    bfd_vma vma_a = ((const decoded_instruction*)a)->vma;
+    bfd_vma vma_b = ((const decoded_instruction*)b)->vma;
+
+    return (vma_a > vma_b) - (vma_a < vma_b);
+}
+
+//
+// Name     : recursive_disassemble
+//
+// Purpose  : Disassemble the buffer set in the disassembler structure
+//              following the control flow from the addresses in the
+//              worklist instead of sweeping it linearly. Branch, conditional
+//              branch and call targets inside the buffer are queued and
+//              every instruction is decoded once (tracked with a bitmap).
+//              It doesn't touch any Python object so it's meant to run
+//              without holding the GIL.
+//
+// Params   :   pdisasm_ptr : Internal control structure.
+//              worklist : Entry points inside the buffer (consumed).
+//              chunk : Destination of the decoded instructions (sorted by
+//                  address on return).
+//
+// Returns  : 0 on success, -1 on memory exhaustion.
+//
+int
+recursive_disassemble(disassembler_pointer* pdisasm_ptr,
+    address_worklist* worklist, decoded_chunk* chunk)
+{
+    disassemble_info* dinfo = &(pdisasm_ptr->dinfo);
+    bfd_vma base = dinfo->buffer_vma;
+    size_t length = dinfo->buffer_length;
+    size_t offset;
+    unsigned char* visited;
+    enum dis_insn_type insn_type;
+    int n, delay_slots;
+
+    // One bit per byte telling if an instruction starts there.
+    if (!(visited = (unsigned char*) calloc ((length + 7) / 8, 1)))
+        return -1;
+
+    while (worklist->count)
+    {
+        offset = worklist->addresses[--worklist->count] - base;
+
+        // Number of delay slot instructions left before the flow ends (-1
+        // while no unconditional branch was found).
+        delay_slots = -1;
+
+        while (offset < length && !(visited[offset >> 3] & (1 << (offset & 7))))
+        {
+            visited[offset >> 3] |= 1 << (offset & 7);
+
+            n = decode_instruction(pdisasm_ptr, base + offset, 1);
+
+            if (n <= 0)
+                break;
+
+            if (decoded_chunk_append(chunk, pdisasm_ptr, base + offset, n) < 0) {
+                free(visited);
+                return -1;
+            }
+
+            insn_type = dinfo->insn_type;
+
+            if (insn_type == dis_noninsn)
+                break;
+
+            // Queue the targets found inside the buffer.
+            if ((insn_type == dis_branch || insn_type == dis_condbranch ||
+                insn_type == dis_jsr || insn_type == dis_condjsr) &&
+                dinfo->target >= base && dinfo->target - base < length) {
+
+                if (worklist_push(worklist, dinfo->target) < 0) {
+                    free(visited);
+                    return -1;
+                }
+            }
+
+            offset += n;
+
+            if (delay_slots > 0) {
+                if (!--delay_slots)
+                    break;
+            }
+            // The flow doesn't fall through unconditional branches (once
+            // their delay slots are done).
+            else if (insn_type == dis_branch) {
+                if (dinfo->branch_delay_insns <= 0)
+                    break;
+
+                delay_slots = dinfo->branch_delay_insns;
+            }
+        }
+    }
+
+    free(visited);
+
+    pdisasm_ptr->sfile.pos = 0;
+
+    qsort(chunk->instructions, chunk->count, sizeof(decoded_instruction),
+        compare_decoded_instructions);
+
+    return 0;
+}
+
+//
+// Cross reference found during disassembly.
+//
+typedef struct
+{
+    bfd_vma from;
+    bfd_vma to;
+    unsigned char kind;
+
+} xref_entry;
+
+//
+// Growable list of cross references.
+//
+typedef struct
+{
+    xref_entry* entries;
+    size_t count;
+    size_t alloc;
+
+} xref_list;
+
+//
+// Name     : xref_list_push
+//
+// Purpose  : Add a cross reference to the list growing it as needed.
+//
+// Params   :   xrefs : Destination list.
+//              from : Address of the referencing instruction.
+//              to : Referenced address.
+//              kind : Instruction type of the reference.
+//
+// Returns  : 0 on success, -1 on memory exhaustion.
+//
+int
+xref_list_push(xref_list* xrefs, bfd_vma from, bfd_vma to, unsigned char kind)
+{
+    xref_entry* temp_entries;
+
+    if (xrefs->count == xrefs->alloc) {
+        xrefs->alloc = xrefs->alloc ? xrefs->alloc * 2 : 1024;
+
+        temp_entries = (xref_entry*) realloc (xrefs->entries,
+            xrefs->alloc * sizeof(xref_entry));
+
+        if (!temp_entries)
+            return -1;
+
+        xrefs->entries = temp_entries;
+    }
+
+    xrefs->entries[xrefs->count].from = from;
+    xrefs->entries[xrefs->count].to = to;
+    xrefs->entries[xrefs->count].kind = kind;
+    xrefs->count++;
+
+    return 0;
+}
+
+//
+// Name     : compare_xrefs_from
+//
+// Purpose  : qsort callback sorting cross references by source address.
+//
+int
+compare_xrefs_from(const void* a, const void* b)
+{
+    const xref_entry* xref_a = (const xref_entry*)a;
+    const xref_entry* xref_b = (const xref_entry*)b;
+
+    if (xref_a->from != xref_b->from)
+        return (xref_a->from > xref_b->from) - (xref_a->from < xref_b->from);
+
+    return (xref_a->to > xref_b->to) - (xref_a->to < xref_b->to);
+}
+
+//
+// Name     : collect_xrefs
+//
+// Purpose  : Sweep the buffer set in the disassembler structure collecting
+//              the cross references of calls, branches and data references
+//              with a known target. It doesn't touch any Python object so
+//              it's meant to run without holding the GIL.
+//
+// Params   :   pdisasm_ptr : Internal control structure.
+//              xrefs : Destination of the cross references.
+//
+// Returns  : 0 on success, -1 on memory exhaustion.
+//
+int
+collect_xrefs(disassembler_pointer* pdisasm_ptr, xref_list* xrefs)
+{
+    disassemble_info* dinfo = &(pdisasm_ptr->dinfo);
+    size_t offset = 0;
+    bfd_vma address;
+    int n;
+
+    while (offset < dinfo->buffer_length)
+    {
+        address = dinfo->buffer_vma + offset;
+
+        n = decode_instruction(pdisasm_ptr, address, 1);
+
+        // Stop on undecodable data instead of looping on the same address.
+        if (n <= 0)
+            break;
+
+        offset += n;
+
+        // Zero stands for an unknown target.
+        if (!dinfo->target)
+            continue;
+
+        switch (dinfo->insn_type)
+        {
+        case dis_branch:
+        case dis_condbranch:
+        case dis_jsr:
+        case dis_condjsr:
+        case dis_dref:
+            if (xref_list_push(xrefs, address, dinfo->target,
+                dinfo->insn_type) < 0)
+                return -1;
+            break;
+
+        case dis_dref2:
+            if (xref_list_push(xrefs, address, dinfo->target,
+                dinfo->insn_type) < 0)
+                return -1;
+
+            if (dinfo->target2 && xref_list_push(xrefs, address,
+                dinfo->target2, dinfo->insn_type) < 0)
+                return -1;
+            break;
+
+        default:
+            break;
+        }
+    }
+
+    pdisasm_ptr->sfile.pos = 0;
+
+    return 0;
+}
+
+// ---------------------- Begin of Python Layer -------------------
+
+//
+// Name     : pyopcodes_start_smart_disassemble
+//
+// Purpose  : Call the internal disassembler function to obtain a
+//              human-readable string with the disassembled code and the
+//              spcified offset.
+//
+// Params   :   
+//
+// Returns  : A list of tuples of address and size and disassembled
+//              instructions.
+//
+static PyObject * pyopcodes_start_smart_disassemble(PyObject *self, PyObject *args)
+{
+    long disassembled_bytes;
+
+    disassembler_pointer* pdisasm_ptr;
+    bfd_vma vma;
+    PyObject *callback;
+    unsigned int batch_size = 0;
+    unsigned int type_mask = ~0U;
+    int metadata_only = 0;
+
+    PyObject* pPyResult   = NULL;
+
+    if (PyArg_ParseTuple(args, "n" PY_VMA_FMT "O|IIi:set_callback", 
+        &pdisasm_ptr, &vma, &callback, &batch_size, &type_mask,
+        &metadata_only)) {
+        // We only do this if a disassembler is not currently assigned.
+        if (ensure_disassemble_function(pdisasm_ptr) < 0)
+            return NULL;
+
+        // If we've got a valid disassembly function from libopcodes then
+        // proceed to disassemble the given buffer.
+        Py_XINCREF(callback);
+
+        disassembled_bytes = start_smart_disassemble(pdisasm_ptr, vma,
+            callback, batch_size, type_mask, metadata_only);
+
+        Py_XDECREF(callback);
+
+        if (disassembled_bytes >= 0) {
+            Py_RETURN_NONE;
+        }
+        // Keep the exception raised by the callback (if any).
+        else if (!PyErr_Occurred()) {
+            PyErr_SetString(
+                PyExc_TypeError, 
+                "Unable to disassemble current architecture.");
+        }
+    }
+
+    return pPyResult;
+}
+
+//
+// Name     : pyopcodes_initialize_smart_disassemble
+//
+// Purpose  : Call the internal disassembler function to obtain a
+//              human-readable string with the disassembled code and the
+//              spcified offset.
+//
+// Params   :   
+//
+// Returns  : A list of tuples of address and size and disassembled
+//              instructions.
+//
+static PyObject * pyopcodes_initialize_smart_disassemble(PyObject *self, PyObject *args)
+{
+    disassembler_pointer* pdisasm_ptr;
+    Py_buffer view;
+    bfd_vma vma;
+
+    PyObject* pPyResult   = NULL;
+
+    if (PyArg_ParseTuple(args, "ns*" PY_VMA_FMT,
+        &pdisasm_ptr, &view, &vma)) {
+
+        // Release the buffer of the previous session (if any).
+        release_smart_buffer(pdisasm_ptr);
+
+        //
+        // What to disassemble. The view keeps the buffer alive (and its
+        // size fixed) until the session is replaced or deinitialized so
+        // it's used in place.
+        //
+        pdisasm_ptr->smart_view = view;
+        pdisasm_ptr->has_smart_view = 1;
+        pdisasm_ptr->smart_vma = vma;
+
+        pdisasm_ptr->dinfo.buffer = (bfd_byte*)view.buf;
+        pdisasm_ptr->dinfo.buffer_length = view.len;
+        pdisasm_ptr->dinfo.buffer_vma = vma;
+
+        ensure_target_initialized(pdisasm_ptr);
+
+        Py_RETURN_NONE;
+    }
+
+    return pPyResult;
+}
+
+//
+// Name     : pyopcodes_set_smart_disassemble_range
+//
+// Purpose  : Restrict the smart disassembly session to a window of its
+//              buffer without copying it.
+//
+// Params   :   @pdisasm_ptr : Current disassembler structure.
+//              @offset : Offset of the window in the session buffer.
+//              @length : Length of the window (negative up to the end).
+//
+// Returns  : None.
+//
+static PyObject * pyopcodes_set_smart_disassemble_range(PyObject *self, PyObject *args)
+{
+    disassembler_pointer* pdisasm_ptr;
+    Py_ssize_t offset, length;
+
+    if (!PyArg_ParseTuple(args, "nnn", &pdisasm_ptr, &offset, &length)) {
+        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+        return NULL;
+    }
+
+    if (!pdisasm_ptr->has_smart_view) {
+        PyErr_SetString(PyExc_ValueError,
+            "Smart disassemble session not initialized");
+        return NULL;
+    }
+
+    if (offset >= 0 && offset <= pdisasm_ptr->smart_view.len && length < 0)
+        length = pdisasm_ptr->smart_view.len - offset;
+
+    if (offset < 0 || length < 0 ||
+        offset > pdisasm_ptr->smart_view.len ||
+        length > pdisasm_ptr->smart_view.len - offset) {
+        PyErr_SetString(PyExc_ValueError, "Range outside of the buffer");
+        return NULL;
+    }
+
+    pdisasm_ptr->dinfo.buffer = (bfd_byte*)pdisasm_ptr->smart_view.buf + offset;
+    pdisasm_ptr->dinfo.buffer_length = length;
+    pdisasm_ptr->dinfo.buffer_vma = pdisasm_ptr->smart_vma + offset;
+
+    Py_RETURN_NONE;
+}
+
+//
+// Name     : pyopcodes_disassemble
+//
+// Purpose  : Call the internal disassembler function to obtain a
+//              human-readable string with the disassembled code and the
+//              spcified offset.
+//
+// Params   :   
+//
+// Returns  : A list of tuples of address and size and disassembled
+//              instructions.
+//
+static PyObject * pyopcodes_disassemble(PyObject *self, PyObject *args)
+{
+    disassembler_pointer* pdisasm_ptr;
+    bfd_vma /*unsigned int*/ vma = 0;
+    Py_buffer view;
+    int metadata_only = 0;
+
+    bfd_byte* saved_buffer;
+    size_t saved_length;
+    bfd_vma saved_vma;
+
+    PyObject* pPyResult   = NULL;
+
+    //
+    // The view keeps the buffer (i.e. a bytearray) from being resized by
+    // other threads while it's disassembled without the GIL.
+    //
+    if (PyArg_ParseTuple(args, "ns*" PY_VMA_FMT "|i",
+        &pdisasm_ptr, &view, &vma, &metadata_only)) {
+        // We only do this if a disassembler is not currently assigned.
+        if (ensure_disassemble_function(pdisasm_ptr) < 0) {
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+
+        ensure_target_initialized(pdisasm_ptr);
+
+        //
+        // What to disassemble. The buffer belongs to Python so the one of a
+        // smart disassembly session (if any) is restored afterwards.
+        //
+        saved_buffer = pdisasm_ptr->dinfo.buffer;
+        saved_length = pdisasm_ptr->dinfo.buffer_length;
+        saved_vma = pdisasm_ptr->dinfo.buffer_vma;
+
+        pdisasm_ptr->dinfo.buffer = (bfd_byte*)view.buf;
+        pdisasm_ptr->dinfo.buffer_length = view.len;
+        pdisasm_ptr->dinfo.buffer_vma = vma;
+
+        // If we've got a valid disassembly function from libopcodes then
+        // proceed to disassemble the given buffer.
+        pPyResult = disassemble(pdisasm_ptr, metadata_only);
+
+        pdisasm_ptr->dinfo.buffer = saved_buffer;
+        pdisasm_ptr->dinfo.buffer_length = saved_length;
+        pdisasm_ptr->dinfo.buffer_vma = saved_vma;
+
+        PyBuffer_Release(&view);
+    }
+    else {
+        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+    }
+
+    return pPyResult;
+}
+
+//
+// Disassembly iterator object. It holds a view of the user buffer and decodes
+// a single instruction on every step. The disassembler structure stays
+// allocated while the iterator lives, even if its owner deinitializes it.
+//
+typedef struct
+{
+    PyObject_HEAD
+
+    disassembler_pointer* pdisasm_ptr;
+
+    Py_buffer view;
+
+    bfd_vma vma;
+
+    Py_ssize_t offset;
+
+} disassemble_iterator;
+
+//
+// Name     : disassemble_iterator_dealloc
+//
+// Purpose  : Release the buffer view and the disassembler structure held by
+//              the iterator.
+//
+// Params   :   self : Iterator object.
+//
+// Returns  : -
+//
+static void
+disassemble_iterator_dealloc(disassemble_iterator* self)
+{
+    disassembler_pointer* pdisasm_ptr = self->pdisasm_ptr;
+
+    PyBuffer_Release(&self->view);
+
+    pdisasm_ptr->users--;
+
+    if (pdisasm_ptr->released)
+        release_disassembler(pdisasm_ptr);
+
+    PyObject_Del(self);
+}
+
+//
+// Name     : disassemble_iterator_next
+//
+// Purpose  : Disassemble the next instruction of the buffer.
+//
+// Params   :   self : Iterator object.
+//
+// Returns  : A tuple of address, size and disassembled instruction or NULL
+//              once the buffer is exhausted.
+//
+static PyObject*
+disassemble_iterator_next(disassemble_iterator* self)
+{
+    disassembler_pointer* pdisasm_ptr = self->pdisasm_ptr;
+    disassemble_info* dinfo = &(pdisasm_ptr->dinfo);
+    PyThread_type_lock decode_lock;
+
+    bfd_byte* saved_buffer;
+    size_t saved_length;
+    bfd_vma saved_vma;
+    int n;
+
+    if (self->offset >= self->view.len)
+        return NULL;
+
+    //
+    // The architecture, machine or endian might have changed since the last
+    // step so make sure the disassembler function and the target are
+    // consistent with them.
+    //
+    if (ensure_disassemble_function(pdisasm_ptr) < 0)
+        return NULL;
+
+    ensure_target_initialized(pdisasm_ptr);
+
+    //
+    // Other disassembly operations might have used the same structure since
+    // the last step so point it to our buffer only while decoding.
+    //
+    saved_buffer = dinfo->buffer;
+    saved_length = dinfo->buffer_length;
+    saved_vma = dinfo->buffer_vma;
+
+    dinfo->buffer = (bfd_byte*)self->view.buf;
+    dinfo->buffer_length = self->view.len;
+    dinfo->buffer_vma = self->vma;
+
+    pdisasm_ptr->sfile.pos = 0;
+
+    if (pdisasm_ptr->sfile.buffer)
+        pdisasm_ptr->sfile.buffer[0] = 0;
+
+    fix_bfd_pre_metadata(dinfo, self->vma + self->offset);
+
+    decode_lock = get_decode_lock(dinfo->arch);
+
+    lock_acquire(decode_lock);
+    n = pdisasm_ptr->pfn_disassemble(self->vma + self->offset, dinfo);
+
+    if (decode_lock)
+        PyThread_release_lock(decode_lock);
+
+    dinfo->buffer = saved_buffer;
+    dinfo->buffer_length = saved_length;
+    dinfo->buffer_vma = saved_vma;
+
+    // Stop on undecodable data instead of looping on the same address.
+    if (n <= 0) {
+        self->offset = self->view.len;
+        return NULL;
+    }
+
+    self->offset += n;
+
+    return Py_BuildValue("(" PY_VMA_FMT ",I,s)",
+        self->vma + self->offset - n,
+        n,
+        pdisasm_ptr->sfile.buffer);
+}
+
+static PyTypeObject disassemble_iterator_type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_opcodes.DisassembleIterator",             // tp_name
+    sizeof(disassemble_iterator),               // tp_basicsize
+    0,                                          // tp_itemsize
+    (destructor)disassemble_iterator_dealloc,   // tp_dealloc
+    0,                                          // tp_print
+    0,                                          // tp_getattr
+    0,                                          // tp_setattr
+    0,                                          // tp_compare
+    0,                                          // tp_repr
+    0,                                          // tp_as_number
+    0,                                          // tp_as_sequence
+    0,                                          // tp_as_mapping
+    0,                                          // tp_hash
+    0,                                          // tp_call
+    0,                                          // tp_str
+    0,                                          // tp_getattro
+    0,                                          // tp_setattro
+    0,                                          // tp_as_buffer
+    Py_TPFLAGS_DEFAULT,                         // tp_flags
+    "Disassemble a buffer one instruction at a time.", // tp_doc
+    0,                                          // tp_traverse
+    0,                                          // tp_clear
+    0,                                          // tp_richcompare
+    0,                                          // tp_weaklistoffset
+    PyObject_SelfIter,                          // tp_iter
+    (iternextfunc)disassemble_iterator_next,    // tp_iternext
+};
+
+//
+// Name     : pyopcodes_iter_disassemble
+//
+// Purpose  : Create an iterator disassembling the given buffer one
+//              instruction at a time.
+//
+// Params   :   @pdisasm_ptr : Current disassembler structure.
+//              @data : Buffer to disassemble.
+//              @vma : Start address of the disassembly.
+//
+// Returns  : An iterator of tuples of address, size and disassembled
+//              instruction.
+//
+static PyObject * pyopcodes_iter_disassemble(PyObject *self, PyObject *args)
+{
+    disassembler_pointer* pdisasm_ptr;
+    bfd_vma vma = 0;
+    Py_buffer view;
+
+    disassemble_iterator* iterator;
+
+    if (!PyArg_ParseTuple(args, "ns*" PY_VMA_FMT,
+        &pdisasm_ptr, &view, &vma)) {
+        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+        return NULL;
+    }
+
+    if (ensure_disassemble_function(pdisasm_ptr) < 0) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    iterator = PyObject_New(disassemble_iterator, &disassemble_iterator_type);
+
+    if (!iterator) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    ensure_target_initialized(pdisasm_ptr);
+
+    pdisasm_ptr->users++;
+
+    iterator->pdisasm_ptr = pdisasm_ptr;
+    iterator->view = view;
+    iterator->vma = vma;
+    iterator->offset = 0;
+
+    return (PyObject*)iterator;
+}
+
+//
+// Name     : get_write_buffer
+//
+// Purpose  : Obtain a writable view of a preallocated Python buffer
+//              (ctypes array, bytearray, NumPy array...). The object can't
+//              be resized or freed until the view is released.
+//
+// Params   :   obj : Python buffer object.
+//              view : Returned buffer view (see PyBuffer_Release).
+//              item_size : Size of every element stored in the buffer.
+//              count : Returned number of elements available.
+//
+// Returns  : 0 on success, -1 (with a Python exception set) otherwise.
+//
+static int
+get_write_buffer(PyObject* obj, Py_buffer* view, size_t item_size,
+    Py_ssize_t* count)
+{
+    if (PyObject_GetBuffer(obj, view, PyBUF_WRITABLE) < 0)
+        return -1;
+
+    *count = view->len / item_size;
+
+    return 0;
+}
+
+//
+// Name     : release_write_buffers
+//
+// Purpose  : Release the views obtained through get_write_buffer.
+//
+// Params   :   views : Buffer views.
+//              count : Number of views to release.
+//
+// Returns  : -
+//
+static void
+release_write_buffers(Py_buffer* views, int count)
+{
+    while (count-- > 0)
+        PyBuffer_Release(&views[count]);
+}
+
+//
+// Name     : pyopcodes_disassemble_into
+//
+// Purpose  : Disassemble the given buffer filling preallocated columnar
+//              buffers instead of creating an object for every instruction.
+//              Instructions are decoded until any of the buffers is full.
+//
+// Params   :   @pdisasm_ptr : Current disassembler structure.
+//              @data : Buffer to disassemble.
+//              @vma : Start address of the buffer.
+//              @offset : Offset in the buffer to start disassembling at.
+//              @addresses : Instruction addresses (unsigned long).
+//                  Every column must export a writable buffer (ctypes
+//                  arrays, bytearray, NumPy arrays...).
+//              @lengths : Instruction lengths (unsigned int).
+//              @types : Instruction types (unsigned char).
+//              @targets : First target addresses (unsigned long).
+//              @targets2 : Second target addresses (unsigned long).
+//              @text : Disassembled instructions concatenated (char).
+//              @text_offsets : Start of every instruction text plus the end
+//                  of the last one (unsigned long).
+//
+// Returns  : A tuple with the number of instructions stored, the offset of
+//              the next instruction to disassemble and the bytes of text
+//              used.
+//
+static PyObject * pyopcodes_disassemble_into(PyObject *self, PyObject *args)
+{
+    disassembler_pointer* pdisasm_ptr;
+    disassemble_info* dinfo;
+    bfd_vma vma = 0;
+    Py_ssize_t offset = 0;
+    Py_buffer view;
+
+    PyObject* columns[7];
+    Py_buffer views[7];
+    int pinned = 0;
+
+    unsigned long *addresses, *targets, *targets2, *text_offsets;
+    unsigned int* lengths;
+    unsigned char* types;
+    char* text;
+
+    // Element size of every column (the text is the last one).
+    static const size_t item_sizes[7] = {
+        sizeof(unsigned long), sizeof(unsigned int), sizeof(unsigned char),
+        sizeof(unsigned long), sizeof(unsigned long), sizeof(unsigned long),
+        sizeof(char) };
+
+    Py_ssize_t counts[7], capacity, text_size, text_used = 0, i;
+
+    bfd_byte* saved_buffer;
+    size_t saved_length;
+    bfd_vma saved_vma;
+    size_t text_length;
+    int n;
+
+    if (!PyArg_ParseTuple(args, "ns*" PY_VMA_FMT "nOOOOOOO",
+        &pdisasm_ptr, &view, &vma, &offset, &columns[0], &columns[1],
+        &columns[2], &columns[3], &columns[4], &columns[6], &columns[5])) {
+        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+        return NULL;
+    }
 
-        if (!strncasecmp(opcode,"blr", 3)) {
-            dinfo->insn_type = dis_branch;
+    //
+    // Pin every column through its buffer view because they are written
+    // without holding the GIL.
+    //
+    for (; pinned < 7; pinned++) {
+        if (get_write_buffer(columns[pinned], &views[pinned],
+                item_sizes[pinned], &counts[pinned]) < 0) {
+            release_write_buffers(views, pinned);
+            PyBuffer_Release(&view);
+            return NULL;
         }
+    }
 
-        else if (!strncasecmp(opcode,"bl ", 3)) {
-            dinfo->insn_type = dis_jsr;
-            const char *p = strstr(opcode,"0x");
+    addresses = (unsigned long*)views[0].buf;
+    lengths = (unsigned int*)views[1].buf;
+    types = (unsigned char*)views[2].buf;
+    targets = (unsigned long*)views[3].buf;
+    targets2 = (unsigned long*)views[4].buf;
+    text_offsets = (unsigned long*)views[5].buf;
+    text = (char*)views[6].buf;
+    text_size = counts[6];
 
-            if (p)
-                sscanf(p,"0x%" BFD_VMA_FMT "x", &dinfo->target);
-        }
-        else if (!strncasecmp(opcode,"b ", 2)) {
-            dinfo->insn_type = dis_branch;
-            const char *p = strstr(opcode,"0x");
+    //
+    // The number of instructions to store is bounded by the smallest column
+    // (one more offset than instructions is needed to mark the end).
+    //
+    counts[5]--;
 
-            if (p)
-                sscanf(p,"0x%" BFD_VMA_FMT "x", &dinfo->target);
-        }
-        else if (!strncasecmp(opcode,"b", 1)) { //  // BNE,BA,BE,etc.
-            dinfo->insn_type = dis_condbranch;
-            const char *p = strstr(opcode,"0x");
+    capacity = counts[0];
 
-            if (p)
-                sscanf(p,"0x%" BFD_VMA_FMT "x", &dinfo->target);
-        }
-        break;
+    for (i = 1; i < 6; i++) {
+        if (counts[i] < capacity)
+            capacity = counts[i];
+    }
 
-    // TODO: Add target extraction and test cases.
-    //case bfd_arch_sparc: // SPARC
-
-    //    dinfo->insn_info_valid = 1;
-    //    
-    //    if (strcasestr(opcode,"b")) //  // BNE,BA,BE,etc.
-    //       dinfo->insn_type = dis_condbranch;
-
-    //    if (strcasestr(opcode,"call")) {
-    //        dinfo->insn_type = dis_jsr;
-    //        break;
-    //    }
-    //    if (strcasestr(opcode,"ret") || strcasestr(opcode,"restore")) {
-    //        dinfo->insn_type = dis_branch;
-    //        break;
-    //    }
-    //    break;
+    i = 0;
 
-    case bfd_arch_ia64: // x86_64 info
-    case bfd_arch_i386: // 386 info
+    if (capacity <= 0 || offset < 0) {
+        release_write_buffers(views, 7);
+        PyBuffer_Release(&view);
+        PyErr_SetString(PyExc_ValueError, "Invalid buffer size or offset");
+        return NULL;
+    }
+
+    if (ensure_disassemble_function(pdisasm_ptr) < 0) {
+        release_write_buffers(views, 7);
+        PyBuffer_Release(&view);
+        return NULL;
+    }
 
-        dinfo->insn_info_valid = 1;
+    dinfo = &(pdisasm_ptr->dinfo);
 
-        if (!strncasecmp(opcode,"ret", 3)){
-            dinfo->insn_type = dis_branch;
-            break;
-        }
+    ensure_target_initialized(pdisasm_ptr);
 
-        else if (!strncasecmp(opcode,"jmp", 3)) {
-            dinfo->insn_type = dis_branch;
+    // The buffer belongs to Python so the one of a smart disassembly session
+    // (if any) is restored afterwards.
+    saved_buffer = dinfo->buffer;
+    saved_length = dinfo->buffer_length;
+    saved_vma = dinfo->buffer_vma;
 
-            const char *p = strstr(opcode,"0x");
-            if (p)
-                sscanf(p,"0x%" BFD_VMA_FMT "x", &dinfo->target);
-        }
+    dinfo->buffer = (bfd_byte*)view.buf;
+    dinfo->buffer_length = view.len;
+    dinfo->buffer_vma = vma;
 
-        else if (!strncasecmp(opcode,"call", 4)) {
-            dinfo->insn_type = dis_jsr;
+    text_offsets[0] = 0;
 
-            const char *p = strstr(opcode,"0x");
-            if (p)
-                sscanf(p,"0x%" BFD_VMA_FMT "x", &dinfo->target);
-        }
+    //
+    // The decoding loop only touches native memory so it runs without the
+    // GIL. The views keep the columns from being resized meanwhile.
+    //
+    Py_BEGIN_ALLOW_THREADS
 
-        else if (!strncasecmp(opcode,"j", 1)) {
-            // JA, JAE, JB, JBE, JC, JCXZ, JE, JG, JGE, JL, JLE, JNA, JNAE,
-            // JNB, JNBE, JNC, JNE, JNG, JNGE, JNL, JNLE, JNO, JNP, JNS, JNZ,
-            // JO, JP, JPE, JPO, JS, JZ.
-            dinfo->insn_type = dis_condbranch;
+    while (i < capacity && offset < view.len)
+    {
+        pdisasm_ptr->sfile.pos = 0;
 
-            const char *p = strstr(opcode,"0x");
-            if (p)
-                sscanf(p,"0x%" BFD_VMA_FMT "x", &dinfo->target);
-        }
-        break;
+        if (pdisasm_ptr->sfile.buffer)
+            pdisasm_ptr->sfile.buffer[0] = 0;
 
-    case bfd_arch_xtensa: // Tensilica Xtensa info
+        // Fix target address references for further usage.
+        fix_bfd_pre_metadata(dinfo, vma + offset);
 
-        dinfo->insn_info_valid = 1;
+        n = call_disassembler(pdisasm_ptr, vma + offset);
 
-        if ((!strncasecmp(opcode,"ret", 3)) ||
-            (!strncasecmp(opcode,"break", 4))) {
-            dinfo->insn_type = dis_branch;
+        // Stop on undecodable data instead of looping on the same address.
+        if (n <= 0) {
+            offset = view.len;
+            break;
         }
 
-        else if (opcode[0] == 'j') {
-            dinfo->insn_type = dis_branch;
+        fix_bfd_metadata(dinfo, pdisasm_ptr->sfile.buffer);
+
+        text_length = pdisasm_ptr->sfile.pos;
 
-            const char *p = strstr(opcode,"0x");
-            if (p)
-                sscanf(p,"0x%" BFD_VMA_FMT "x", &dinfo->target);
+        //
+        // Leave the instruction for the next batch if its text doesn't fit.
+        //
+        if (text_used + text_length > text_size)
+            break;
 
-        }
+        memcpy(text + text_used, pdisasm_ptr->sfile.buffer, text_length);
+        text_used += text_length;
 
-        else if (!strncasecmp(opcode,"call", 4)) {
-            dinfo->insn_type = dis_jsr;
+        addresses[i] = vma + offset;
+        lengths[i] = n;
+        types[i] = dinfo->insn_type;
+        targets[i] = dinfo->target;
+        targets2[i] = dinfo->target2;
+        text_offsets[i + 1] = text_used;
 
-            const char *p = strstr(opcode,"0x");
-            if (p)
-                sscanf(p,"0x%" BFD_VMA_FMT "x", &dinfo->target);
+        offset += n;
+        i++;
+    }
 
-        }
+    pdisasm_ptr->sfile.pos = 0;
 
-        else if (opcode[0] == 'b') {
-            dinfo->insn_type = dis_condbranch;
+    Py_END_ALLOW_THREADS
 
-            const char *p = strstr(opcode,"0x");
-            if (p)
-                sscanf(p,"0x%" BFD_VMA_FMT "x", &dinfo->target);
+    dinfo->buffer = saved_buffer;
+    dinfo->buffer_length = saved_length;
+    dinfo->buffer_vma = saved_vma;
 
-        }
-        break;
+    // Not even a single instruction text fits in the buffer.
+    release_write_buffers(views, 7);
 
-    default:
-        break;
+    if (!i && offset < view.len) {
+        PyBuffer_Release(&view);
+        PyErr_SetString(PyExc_ValueError, "Text buffer too small");
+        return NULL;
     }
 
-};
+    PyBuffer_Release(&view);
+
+    return Py_BuildValue("(nnn)", i, offset, text_used);
+}
 
 //
-// Name     : start_smart_disassemble
+// Name     : pyopcodes_recursive_disassemble
 //
-// Purpose  : Iterate through all the user-specified bytes requested libopcodes
-//              to disassemble them into a buffer for further usage.
+// Purpose  : Disassemble the given buffer following the control flow from
+//              the given entry points (see recursive_disassemble).
 //
-// Params   :   pdisasm_ptr : Internal control structure.
-//              bin_buffer : Binary chunk with data to disassemble.
-//              buffer_length : Size of the above buffer.
-//              vma : Start address of the disassembly.
+// Params   :   @pdisasm_ptr : Current disassembler structure.
+//              @data : Buffer to disassemble.
+//              @vma : Start address of the buffer.
+//              @entry_points : Sequence of addresses to start at (those
+//                  outside the buffer are ignored).
+//              @metadata_only : Non-zero to skip the disassembly text.
 //
-// Returns  : Number of bytes disassembled.
+// Returns  : A list of tuples of address, size, number of delay slots,
+//              instruction type, targets and disassembled instruction
+//              (unless only the metadata is requested) sorted by address.
 //
-int
-start_smart_disassemble(disassembler_pointer* pdisasm_ptr, unsigned long offset,
-    PyObject *callback)
+static PyObject * pyopcodes_recursive_disassemble(PyObject *self, PyObject *args)
 {
-    disassemble_info* dinfo = &(pdisasm_ptr->dinfo);
-    unsigned int n = 0;
-    unsigned long disassembled_bytes = 0;
-    long callback_result;
+    disassembler_pointer* pdisasm_ptr;
+    disassemble_info* dinfo;
+    bfd_vma vma = 0, address;
+    Py_buffer view;
+    PyObject *py_entry_points, *py_sequence;
+
+    bfd_byte* saved_buffer;
+    size_t saved_length;
+    bfd_vma saved_vma;
+
+    address_worklist worklist;
+    decoded_chunk chunk;
+    decoded_instruction* instruction;
+    Py_ssize_t i;
+    int result;
+    int metadata_only = 0;
+
+    PyObject* py_instruction_list = NULL;
+    PyObject* py_instruction;
+
+    if (!PyArg_ParseTuple(args, "ns*" PY_VMA_FMT "O|i",
+        &pdisasm_ptr, &view, &vma, &py_entry_points, &metadata_only)) {
+        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+        return NULL;
+    }
 
-    PyObject* py_args;
-    PyObject* py_result;
+    if (ensure_disassemble_function(pdisasm_ptr) < 0) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
 
-    while (offset < dinfo->buffer_length)
-    {
-        // Fix target address references for further usage.
-        fix_bfd_pre_metadata(dinfo, dinfo->buffer_vma + offset);
+    if (!(py_sequence = PySequence_Fast(
+        py_entry_points, "Entry points must be a sequence"))) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
 
-        // Call the appropriate disassembler function.
-        n = pdisasm_ptr->pfn_disassemble(dinfo->buffer_vma + offset, dinfo);
+    memset(&worklist, 0, sizeof(address_worklist));
 
-        fix_bfd_metadata(dinfo, pdisasm_ptr->sfile.buffer);
-        //
-        // Add the current instruction to a list composed of:
-        // - Address
-        // - Length
-        // - Number of delayed branch instructions
-        // - Instruction type
-        // - Target address number 1
-        // - Target address number 2
-        // - Disassembled instruction.
-        //
-        py_args = Py_BuildValue(
-                "(" PY_VMA_FMT" ,I,b,I," PY_VMA_FMT "," PY_VMA_FMT ",s)",
-                dinfo->buffer_vma + offset,
-                n, //dinfo->buffer + offset,
-                dinfo->branch_delay_insns,
-                dinfo->insn_type,
-                dinfo->target,
-                dinfo->target2,
-                pdisasm_ptr->sfile.buffer);
-
-        pdisasm_ptr->sfile.pos = 0; // Set buffer pointer to the beginning
-                                    // because now contains the entire
-                                    // disassembled line just processed.
-        offset += n; // update the offset for the next disassemble operation.
-        disassembled_bytes += n;    // keep track of the number of bytes
-                                    // processed.
-
-        py_result = PyEval_CallObject(callback, py_args);
-        Py_XDECREF(py_args);
-
-        if (!py_result) {
-            return -1;
-        }
+    //
+    // Queue the entry points found inside the buffer.
+    //
+    for (i = 0; i < PySequence_Fast_GET_SIZE(py_sequence); i++) {
+        address = PyInt_AsUnsignedLongLongMask(
+            PySequence_Fast_GET_ITEM(py_sequence, i));
 
-        callback_result = PyInt_AS_LONG(py_result);
+        if (PyErr_Occurred())
+            break;
 
-        if (callback_result != PYBFD_DISASM_CONTINUE)
+        if (address >= vma && address - vma < (bfd_vma)view.len &&
+            worklist_push(&worklist, address) < 0) {
+            PyErr_NoMemory();
             break;
+        }
     }
 
-    return disassembled_bytes;
-}
-
-//
-// Name     : disassemble
-//
-// Purpose  : Iterate through all the user-specified bytes requested libopcodes
-//              to disassemble them into a buffer for further usage.
-//
-// Params   :   pdisasm_ptr : Internal control structure.
-//              bin_buffer : Binary chunk with data to disassemble.
-//              buffer_length : Size of the above buffer.
-//              vma : Start address of the disassembly.
-//
-// Returns  : A list object containing every disassembled instruction.
-//
-PyObject*
-disassemble(disassembler_pointer* pdisasm_ptr)
-{
-    disassemble_info* dinfo = &(pdisasm_ptr->dinfo);
-
-    unsigned int pos = 0,
-                n = 0;
+    Py_DECREF(py_sequence);
 
-    PyObject* py_instruction_list = NULL; 
+    if (PyErr_Occurred() || decoded_chunk_init(&chunk, 1024) < 0) {
+        if (!PyErr_Occurred())
+            PyErr_NoMemory();
 
-    // Create a python list to hold all the instructions representations.
-    if (!(py_instruction_list = PyList_New(0)))
+        free(worklist.addresses);
+        PyBuffer_Release(&view);
         return NULL;
+    }
 
-    while (pos < dinfo->buffer_length)
-    {
-        // Call the appropriate disassembler function.
-        n = pdisasm_ptr->pfn_disassemble(dinfo->buffer_vma + pos, dinfo);
+    dinfo = &(pdisasm_ptr->dinfo);
 
-        //
-        // Add the current instruction to a list composed of:
-        // - Instruction address.
-        // - Instruction length.
-        // - Instruction disassembly.
-        //
-        PyList_Append(py_instruction_list,
-            Py_BuildValue(
-                "(" PY_VMA_FMT" ,I,s)",
-                dinfo->buffer_vma + pos,
-                n,
-                pdisasm_ptr->sfile.buffer)
-            );
+    ensure_target_initialized(pdisasm_ptr);
 
-        pdisasm_ptr->sfile.pos = 0;
-        pos += n;
+    // The buffer belongs to Python so the one of a smart disassembly session
+    // (if any) is restored afterwards.
+    saved_buffer = dinfo->buffer;
+    saved_length = dinfo->buffer_length;
+    saved_vma = dinfo->buffer_vma;
 
-    }
+    dinfo->buffer = (bfd_byte*)view.buf;
+    dinfo->buffer_length = view.len;
+    dinfo->buffer_vma = vma;
 
-    return py_instruction_list;
-}
+    chunk.keep_text = !metadata_only;
 
-// ---------------------- Begin of Python Layer -------------------
+    set_text_output(pdisasm_ptr, !metadata_only);
 
-//
-// Name     : pyopcodes_start_smart_disassemble
-//
-// Purpose  : Call the internal disassembler function to obtain a
-//              human-readable string with the disassembled code and the
-//              spcified offset.
-//
-// Params   :   
-//
-// Returns  : A list of tuples of address and size and disassembled
-//              instructions.
-//
-static PyObject * pyopcodes_start_smart_disassemble(PyObject *self, PyObject *args)
-{
-    int disassembled_bytes;
+    Py_BEGIN_ALLOW_THREADS
+    result = recursive_disassemble(pdisasm_ptr, &worklist, &chunk);
+    Py_END_ALLOW_THREADS
 
-    disassembler_pointer* pdisasm_ptr;
-    bfd_vma vma;
-    PyObject *callback;
+    set_text_output(pdisasm_ptr, 1);
 
-    PyObject* pPyResult   = NULL;
+    dinfo->buffer = saved_buffer;
+    dinfo->buffer_length = saved_length;
+    dinfo->buffer_vma = saved_vma;
 
-    if (PyArg_ParseTuple(args, "n" PY_VMA_FMT "O:set_callback", 
-        &pdisasm_ptr, &vma, &callback)) {
-        // We only do this if a disassembler is not currently assigned. This
-        // might happend becase the architure or the endian fields in the
-        // disassembly_info structure have changed.
-        //
-        if (!pdisasm_ptr->pfn_disassemble) {
-            //
-            // Assign the disassembler function based on user-specified
-            // parameters like architecture, specific machine and endianess.
-            //
-            pdisasm_ptr->pfn_disassemble = get_disassemble_function(
-                pdisasm_ptr->dinfo.arch,
-                pdisasm_ptr->dinfo.endian);
+    free(worklist.addresses);
+    PyBuffer_Release(&view);
 
-            if (!pdisasm_ptr->pfn_disassemble) {
-                PyErr_SetString(
-                    PyExc_TypeError, 
-                    "Disassembler unavailable for current architecture.");
-                return NULL;
-            }
-        }
+    if (result < 0) {
+        decoded_chunk_release(&chunk);
+        return PyErr_NoMemory();
+    }
 
-        // If we've got a valid disassembly function from libopcodes then
-        // proceed to disassemble the given buffer.
-        Py_XINCREF(callback);
+    //
+    // Create the resulting list now that the GIL is held again.
+    //
+    if ((py_instruction_list = PyList_New(chunk.count))) {
+        for (i = 0; i < chunk.count; i++)
+        {
+            instruction = &chunk.instructions[i];
 
-        disassembled_bytes = start_smart_disassemble(pdisasm_ptr, vma, callback);
+            if (metadata_only)
+                py_instruction = build_metadata_tuple(instruction);
+            else
+                py_instruction = build_instruction_tuple(
+                    instruction, chunk.text);
 
-        Py_XDECREF(callback);
+            if (!py_instruction) {
+                Py_CLEAR(py_instruction_list);
+                break;
+            }
 
-        if (disassembled_bytes >= 0) {
-            Py_RETURN_NONE;
-        }
-        else {
-            PyErr_SetString(
-                PyExc_TypeError, 
-                "Unable to disassemble current architecture.");
+            PyList_SET_ITEM(py_instruction_list, i, py_instruction);
         }
     }
 
-    return pPyResult;
+    decoded_chunk_release(&chunk);
+
+    return py_instruction_list;
 }
 
 //
-// Name     : pyopcodes_initialize_smart_disassemble
+// Name     : new_native_array
 //
-// Purpose  : Call the internal disassembler function to obtain a
-//              human-readable string with the disassembled code and the
-//              spcified offset.
+// Purpose  : Create an array.array object of the given type and length to be
+//              filled in place (its storage is suitably aligned).
 //
-// Params   :   
+// Params   :   typecode : Array type code.
+//              count : Number of items.
+//              buffer : Returned pointer to the array storage.
 //
-// Returns  : A list of tuples of address and size and disassembled
-//              instructions.
+// Returns  : A new array object (zero filled) or NULL on error.
 //
-static PyObject * pyopcodes_initialize_smart_disassemble(PyObject *self, PyObject *args)
+static PyObject *
+new_native_array(const char* typecode, Py_ssize_t count, void** buffer)
 {
-    disassembler_pointer* pdisasm_ptr;
-    unsigned int buffer_length;
-    bfd_vma vma;
-    
-    unsigned char* bin_buffer  = NULL;    
-    unsigned char* disasm_buffer;
+    PyObject* array_module;
+    PyObject* item;
+    PyObject* array;
+    Py_ssize_t length;
 
-    PyObject* pPyResult   = NULL;
+    if (!(array_module = PyImport_ImportModule("array")))
+        return NULL;
 
-    if (PyArg_ParseTuple(args, "ns#" PY_VMA_FMT,
-        &pdisasm_ptr, &bin_buffer, &buffer_length, &vma)) {
+    item = PyObject_CallMethod(array_module, "array", "s[i]", typecode, 0);
+    Py_DECREF(array_module);
 
-        // free previous buffer
-        if(pdisasm_ptr->dinfo.buffer != 0)
-        {
-            free(pdisasm_ptr->dinfo.buffer);
-            pdisasm_ptr->dinfo.buffer_length = 0;
-        }        
-        disasm_buffer = (unsigned char*)malloc(buffer_length);
-        memcpy(disasm_buffer, bin_buffer, buffer_length);
-        //
-        // What to disassemble.
-        //
-        pdisasm_ptr->dinfo.buffer = disasm_buffer;
-        pdisasm_ptr->dinfo.buffer_length = buffer_length;
-        pdisasm_ptr->dinfo.buffer_vma = vma;
+    if (!item)
+        return NULL;
 
-        disassemble_init_for_target(&pdisasm_ptr->dinfo);
+    array = PySequence_Repeat(item, count);
+    Py_DECREF(item);
 
-        Py_RETURN_NONE;
+    if (!array)
+        return NULL;
+
+    // Nobody else references the array yet so it can't be resized.
+    if (PyObject_AsWriteBuffer(array, buffer, &length) < 0) {
+        Py_DECREF(array);
+        return NULL;
     }
 
-    return pPyResult;
+    return array;
 }
 
 //
-// Name     : pyopcodes_disassemble
+// Name     : pyopcodes_build_xrefs
 //
-// Purpose  : Call the internal disassembler function to obtain a
-//              human-readable string with the disassembled code and the
-//              spcified offset.
+// Purpose  : Disassemble the given buffers collecting their cross
+//              references in columnar form.
 //
-// Params   :   
+// Params   :   @pdisasm_ptr : Current disassembler structure.
+//              @ranges : Sequence of (buffer, start address) tuples.
 //
-// Returns  : A list of tuples of address and size and disassembled
-//              instructions.
+// Returns  : A tuple of arrays (array.array) with one entry per cross
+//              reference sorted by source address:
+//              - Source address ('L').
+//              - Target address ('L').
+//              - Kind ('B'): instruction type of the reference.
+//              - Indexes of the references sorted by target address ('L').
+//              - Target addresses sorted ('L').
 //
-static PyObject * pyopcodes_disassemble(PyObject *self, PyObject *args)
+static PyObject * pyopcodes_build_xrefs(PyObject *self, PyObject *args)
 {
     disassembler_pointer* pdisasm_ptr;
-    unsigned int buffer_length = 0;
-    bfd_vma /*unsigned int*/ vma = 0;
-    unsigned char* bin_buffer  = NULL;
+    disassemble_info* dinfo;
+    PyObject *py_ranges, *py_sequence;
+    Py_buffer* views;
+    bfd_vma* vmas;
+    Py_ssize_t count, parsed = 0, i;
+    int result = 0;
 
-    PyObject* pPyResult   = NULL;
+    bfd_byte* saved_buffer;
+    size_t saved_length;
+    bfd_vma saved_vma;
+
+    xref_list xrefs;
+    xref_entry* by_to = NULL;
+
+    unsigned long *from, *to, *order, *sorted_to;
+    unsigned char* kinds;
+
+    PyObject *py_from = NULL, *py_to = NULL, *py_kinds = NULL,
+        *py_order = NULL, *py_sorted_to = NULL;
+
+    if (!PyArg_ParseTuple(args, "nO", &pdisasm_ptr, &py_ranges)) {
+        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+        return NULL;
+    }
+
+    if (ensure_disassemble_function(pdisasm_ptr) < 0)
+        return NULL;
+
+    if (!(py_sequence = PySequence_Fast(
+        py_ranges, "Ranges must be a sequence")))
+        return NULL;
+
+    count = PySequence_Fast_GET_SIZE(py_sequence);
+
+    views = (Py_buffer*) malloc ((count + 1) * sizeof(Py_buffer));
+    vmas = (bfd_vma*) malloc ((count + 1) * sizeof(bfd_vma));
+
+    if (!views || !vmas) {
+        free(views);
+        free(vmas);
+        Py_DECREF(py_sequence);
+        return PyErr_NoMemory();
+    }
+
+    //
+    // Hold a view of every buffer so they can be read without the GIL.
+    //
+    for (parsed = 0; parsed < count; parsed++) {
+        if (!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(py_sequence, parsed),
+            "s*" PY_VMA_FMT, &views[parsed], &vmas[parsed]))
+            break;
+    }
+
+    Py_DECREF(py_sequence);
+
+    memset(&xrefs, 0, sizeof(xref_list));
+
+    if (parsed == count) {
+        dinfo = &(pdisasm_ptr->dinfo);
+
+        ensure_target_initialized(pdisasm_ptr);
+
+        // The buffers belong to Python so the one of a smart disassembly
+        // session (if any) is restored afterwards.
+        saved_buffer = dinfo->buffer;
+        saved_length = dinfo->buffer_length;
+        saved_vma = dinfo->buffer_vma;
+
+        // Cross references only need the instructions metadata.
+        set_text_output(pdisasm_ptr, 0);
+
+        Py_BEGIN_ALLOW_THREADS
+
+        for (i = 0; i < count && result == 0; i++) {
+            dinfo->buffer = (bfd_byte*)views[i].buf;
+            dinfo->buffer_length = views[i].len;
+            dinfo->buffer_vma = vmas[i];
+
+            result = collect_xrefs(pdisasm_ptr, &xrefs);
+        }
+
+        if (result == 0) {
+            qsort(xrefs.entries, xrefs.count, sizeof(xref_entry),
+                compare_xrefs_from);
 
-    if (PyArg_ParseTuple(args, "ns#" PY_VMA_FMT,
-        &pdisasm_ptr, &bin_buffer, &buffer_length, &vma)) {
-        // We only do this if a disassembler is not currently assigned. This
-        // might happend becase the architure or the endian fields in the
-        // disassembly_info structure have changed.
-        //
-        if (!pdisasm_ptr->pfn_disassemble) {
             //
-            // Assign the disassembler function based on user-specified
-            // parameters like architecture, specific machine and endianess.
+            // Sort (target, index) pairs to build the permutation by
+            // target. The pairs reuse the entry structure.
             //
-            pdisasm_ptr->pfn_disassemble = get_disassemble_function(
-                pdisasm_ptr->dinfo.arch,
-                pdisasm_ptr->dinfo.endian);
+            if ((by_to = (xref_entry*) malloc (
+                (xrefs.count + 1) * sizeof(xref_entry)))) {
 
-            if (!pdisasm_ptr->pfn_disassemble) {
-                PyErr_SetString(
-                    PyExc_TypeError, 
-                    "Disassembler unavailable for current architecture.");
-                return NULL;
+                for (i = 0; i < (Py_ssize_t)xrefs.count; i++) {
+                    by_to[i].from = xrefs.entries[i].to;
+                    by_to[i].to = i;
+                    by_to[i].kind = 0;
+                }
+
+                qsort(by_to, xrefs.count, sizeof(xref_entry),
+                    compare_xrefs_from);
+            }
+            else {
+                result = -1;
             }
         }
 
-        disassemble_init_for_target(&pdisasm_ptr->dinfo);
+        Py_END_ALLOW_THREADS
 
-        //
-        // What to disassemble.
-        //
-        pdisasm_ptr->dinfo.buffer = bin_buffer;
-        pdisasm_ptr->dinfo.buffer_length = buffer_length;
-        pdisasm_ptr->dinfo.buffer_vma = vma;
+        set_text_output(pdisasm_ptr, 1);
 
-        // If we've got a valid disassembly function from libopcodes then
-        // proceed to disassemble the given buffer.
-        pPyResult = disassemble(pdisasm_ptr);
+        dinfo->buffer = saved_buffer;
+        dinfo->buffer_length = saved_length;
+        dinfo->buffer_vma = saved_vma;
     }
-    else {
-        PyErr_SetString(PyExc_TypeError, "Invalid parameter(s)");
+
+    for (i = 0; i < parsed; i++)
+        PyBuffer_Release(&views[i]);
+
+    free(views);
+    free(vmas);
+
+    if (parsed != count || result < 0) {
+        free(xrefs.entries);
+        free(by_to);
+
+        if (!PyErr_Occurred())
+            PyErr_NoMemory();
+
+        return NULL;
     }
 
-    return pPyResult;
+    //
+    // Create the resulting arrays and fill their storage in place.
+    //
+    if ((py_from = new_native_array("L", xrefs.count, (void**)&from)) &&
+        (py_to = new_native_array("L", xrefs.count, (void**)&to)) &&
+        (py_kinds = new_native_array("B", xrefs.count, (void**)&kinds)) &&
+        (py_order = new_native_array("L", xrefs.count, (void**)&order)))
+        py_sorted_to = new_native_array(
+            "L", xrefs.count, (void**)&sorted_to);
+
+    if (!py_from || !py_to || !py_kinds || !py_order || !py_sorted_to) {
+        free(xrefs.entries);
+        free(by_to);
+
+        Py_XDECREF(py_from);
+        Py_XDECREF(py_to);
+        Py_XDECREF(py_kinds);
+        Py_XDECREF(py_order);
+        Py_XDECREF(py_sorted_to);
+
+        return NULL;
+    }
+
+    for (i = 0; i < (Py_ssize_t)xrefs.count; i++) {
+        from[i] = xrefs.entries[i].from;
+        to[i] = xrefs.entries[i].to;
+        kinds[i] = xrefs.entries[i].kind;
+        order[i] = by_to[i].to;
+        sorted_to[i] = by_to[i].from;
+    }
+
+    free(xrefs.entries);
+    free(by_to);
+
+    return Py_BuildValue("(NNNNN)",
+        py_from, py_to, py_kinds, py_order, py_sorted_to);
 }
 
 //
@@ -925,15 +3383,9 @@ static PyObject * pyopcodes_deinitialize(PyObject *self, PyObject *args)
     p_disassembler_pointer pdisasm_ptr;
 
     if (PyArg_ParseTuple(args, "n", &pdisasm_ptr)) {
-        // Release all the resources and set them null.
+        // Release all the resources (deferred while iterators use them).
         if (pdisasm_ptr) {
-            if (pdisasm_ptr->sfile.buffer) {
-                free (pdisasm_ptr->sfile.buffer);
-            }
-            if (pdisasm_ptr->dinfo.buffer) {
-                free (pdisasm_ptr->dinfo.buffer);
-            }
-            free (pdisasm_ptr);
+            release_disassembler(pdisasm_ptr);
             pdisasm_ptr = 0;
         }
 
@@ -1010,7 +3462,12 @@ static struct PyMethodDef _opcodes_methods[] =
     declmethod(get_endian, "Return the endian value in the disassembly_info structure."),
     declmethod(initialize_bfd, "Module initialization (using BFD)."),
     declmethod(disassemble, "Disassemble given code."),
+    declmethod(iter_disassemble, "Disassemble given code one instruction at a time."),
+    declmethod(disassemble_into, "Disassemble given code into preallocated columns."),
+    declmethod(recursive_disassemble, "Disassemble given code following its control flow."),
+    declmethod(build_xrefs, "Collect the cross references of given code in columnar form."),
     declmethod(initialize_smart_disassemble, "Initialize a smart disassemble session."),
+    declmethod(set_smart_disassemble_range, "Restrict the smart disassemble session to a window of its buffer."),
     declmethod(start_smart_disassemble, "Disassemble given code until function end."),
     declmethod(deinitialize, "Delete current structure and release resources."),
     {NULL}
@@ -1028,8 +3485,25 @@ static struct PyMethodDef _opcodes_methods[] =
 //
 PyMODINIT_FUNC init_opcodes(void)
 {
-    if (!Py_InitModule("_opcodes", _opcodes_methods))
+    PyObject* module;
+
+    if (init_decode_locks() < 0) {
+        PyErr_NoMemory();
+        return;
+    }
+
+    init_classification_tables();
+    init_disassemble_dispatch();
+
+    if (PyType_Ready(&disassemble_iterator_type) < 0)
+        return;
+
+    if (!(module = Py_InitModule("_opcodes", _opcodes_methods)))
         return;
 
+    Py_INCREF(&disassemble_iterator_type);
+    PyModule_AddObject(module, "DisassembleIterator",
+        (PyObject*)&disassemble_iterator_type);
+
     // Add additional initialization here.
 }
@@ -6,7 +6,11 @@
 #
 
 import string
-from collections import namedtuple
+import ctypes
+from bisect import bisect_left, bisect_right
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+from threading import Lock
 
 from sys import version_info
 if version_info >= (2,6,0):
@@ -33,6 +37,7 @@ del version_info
 
 from bfd_archs import *
 from bfd_base import *
+from symbol import SymbolFlags
 
 __author__      = "Groundworks Technologies OSS Team"
 __contact__     = "oss@groundworkstech.com"
@@ -54,20 +59,165 @@ class InstructionType:
 PYBFD_DISASM_CONTINUE = 0
 PYBFD_DISASM_STOP = 1
 
+# Every instruction type (see get_insn_type_mask).
+ALL_INSN_TYPES_MASK = 0xFFFFFFFF
+
+# Number of inactive native disassembler states kept by every Opcodes
+# instance for quick architecture switching.
+DEFAULT_MAX_STATES = 4
+
+# Machine and endian of a native state created for an architecture alone.
+DEFAULT_MACHINE = 0
+DEFAULT_ENDIAN = ENDIAN_UNKNOWN
+
+
+def get_insn_type_mask(insn_types=None):
+    """Return the bitmask selecting the given instruction types (or every
+    type if None)."""
+    if insn_types is None:
+        return ALL_INSN_TYPES_MASK
+
+    mask = 0
+    for insn_type in insn_types:
+        mask |= 1 << insn_type
+
+    return mask
+
 
 class OpcodesException(Exception):
     """Generic opcodes module exception."""
     pass
 
 
+class InstructionBatch(object):
+    """
+    Preallocated columnar buffers holding a batch of disassembled
+    instructions. Columns are ctypes arrays (usable through numpy.frombuffer)
+    because they are filled without the GIL held and, unlike array.array,
+    their buffer can be pinned. The disassembly text of every instruction is
+    stored in a single bytearray delimited by the text_offsets column.
+
+    """
+
+    def __init__(self, capacity=65536, text_capacity=None):
+        if capacity <= 0:
+            raise OpcodesException("Invalid batch capacity.")
+
+        if text_capacity is None:
+            text_capacity = capacity * 64
+
+        self.addresses = (ctypes.c_ulong * capacity)()
+        self.lengths = (ctypes.c_uint * capacity)()
+        self.types = (ctypes.c_ubyte * capacity)()
+        self.targets = (ctypes.c_ulong * capacity)()
+        self.targets2 = (ctypes.c_ulong * capacity)()
+        self.text = bytearray(text_capacity)
+        self.text_offsets = (ctypes.c_ulong * (capacity + 1))()
+
+        # Number of instructions and text bytes currently stored.
+        self.count = 0
+        self.text_used = 0
+
+    @property
+    def capacity(self):
+        """Return the maximum number of instructions the batch can hold."""
+        return len(self.addresses)
+
+    def disassembly(self, index):
+        """Return the disassembly text of the instruction at the given
+        index."""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+
+        return str(self.text[
+            self.text_offsets[index] : self.text_offsets[index + 1]])
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Iterate through (address, size, disassembly) tuples of the stored
+        instructions."""
+        for index in xrange(self.count):
+            yield self.addresses[index], self.lengths[index], \
+                self.disassembly(index)
+
+
+class XrefIndex(object):
+    """
+    Cross references (calls, branches and data references with a known
+    target) found while disassembling. They're kept in native arrays sorted
+    by source address plus a permutation sorting them by target so both
+    directions are looked up by bisection.
+
+    """
+
+    # Instruction types producing cross references.
+    KINDS = (InstructionType.BRANCH, InstructionType.COND_BRANCH,
+        InstructionType.JSR, InstructionType.COND_JSR,
+        InstructionType.DREF, InstructionType.DREF2)
+
+    def __init__(self, columns):
+        """columns is the tuple of arrays returned by _opcodes.build_xrefs."""
+        self.sources, self.targets, self.kinds, self._to_order, \
+            self._sorted_targets = columns
+
+    def xrefs_from(self, address):
+        """Return a list of (target, kind) tuples referenced by the
+        instruction at the given address."""
+        begin = bisect_left(self.sources, address)
+        end = bisect_right(self.sources, address, begin)
+
+        return zip(self.targets[begin:end], self.kinds[begin:end])
+
+    def xrefs_to(self, address):
+        """Return a list of (source, kind) tuples referencing the given
+        address sorted by source."""
+        begin = bisect_left(self._sorted_targets, address)
+        end = bisect_right(self._sorted_targets, address, begin)
+
+        return sorted((self.sources[i], self.kinds[i]) \
+            for i in self._to_order[begin:end])
+
+    def __len__(self):
+        return len(self.sources)
+
+    def __iter__(self):
+        """Iterate through (source, target, kind) tuples sorted by source."""
+        return iter(zip(self.sources, self.targets, self.kinds))
+
+    def __repr__(self):
+        return "<XrefIndex xrefs=%d>" % len(self)
+
+
 class Opcodes(object):
-    """Class for libOpcodes abstraction."""
+    """
+    Class for libOpcodes abstraction.
+
+    The disassembly runs without holding the GIL so instances may be used
+    from several threads at once, as long as every thread has its own.
+    Threads decoding different architectures (or powerpc, whose libopcodes
+    backend is reentrant) run fully in parallel. The other backends keep
+    static state so the decoding of each instruction of a given architecture
+    is serialized; use processes (see parallel.disassemble_bfd) to scale
+    them across cores.
+
+    Recently used (architecture, machine, endian) configurations keep their
+    native state so switching back to them (see configure) is cheap. Smart
+    disassembly sessions belong to the state they were initialized in.
+
+    """
 
     def __init__(self, *args, **kwargs):
         """..."""
         # Hold the native internal structure.
         self._ptr = None
 
+        # Inactive native structures by (architecture, machine, endian) from
+        # the least to the most recently used.
+        self._states = OrderedDict()
+        self._max_states = kwargs.get("max_states", DEFAULT_MAX_STATES)
+
         # Determine if the specified paramter is a BFD or a tuple specifying
         # arch/machine/endian.
         try:            
@@ -83,6 +233,8 @@ class Opcodes(object):
 
     def initialize_bfd(self, abfd):
         """Initialize underlying libOpcodes library using BFD."""
+        self._park_state()
+
         self._ptr = _opcodes.initialize_bfd(abfd._ptr)              
 
         # Already done inside opcodes.c
@@ -106,27 +258,109 @@ class Opcodes(object):
         if None in [architecture, machine, endian]:
             return
 
-        self.architecture = architecture
-        self.machine = machine
-        self.endian = endian
+        self.configure(architecture, machine, endian)
+
+    def configure(self, architecture, machine, endian):
+        """
+        Switch to the given architecture, machine and endian reusing the
+        native state of a recently used configuration if possible.
+
+        """
+        key = (architecture, machine, endian)
+
+        if self._ptr is not None and \
+            (self.architecture, self.machine, self.endian) == key:
+            return
+
+        self._park_state()
+
+        self._ptr = self._states.pop(key, None)
+
+        if self._ptr is None:
+            self._ptr = _opcodes.set_architecture(architecture)
+            _opcodes.set_machine(self._ptr, machine)
+            _opcodes.set_endian(self._ptr, endian)
+
+        self._architecture, self._machine, self._endian = key
+
+    def _park_state(self):
+        """
+        Move the current native state (if any) to the recently used ones
+        releasing the least recently used beyond the limit. Only for
+        internal use.
+
+        """
+        if self._ptr is None:
+            return
+
+        key = (self.architecture, self.machine, self.endian)
+
+        # Keep a single state per configuration.
+        previous = self._states.pop(key, None)
+        if previous is not None:
+            _opcodes.deinitialize(previous)
+
+        self._states[key] = self._ptr
+        self._ptr = None
+
+        while len(self._states) > self._max_states:
+            key, ptr = self._states.popitem(last=False)
+            _opcodes.deinitialize(ptr)
 
     def initialize_smart_disassemble(self, data, start_address=0):
         """
         Set the binary buffer to disassemble with other related information
         ready for an instruction by instruction disassembly session.
+
+        The buffer (any object supporting the buffer protocol) isn't copied
+        but referenced until the session is replaced or closed.
         
         """
         _opcodes.initialize_smart_disassemble(
             self._ptr, data, start_address)
 
-    def start_smart_disassemble(self, start_address, callback):
+    def set_smart_disassemble_range(self, offset, length=None):
+        """
+        Restrict the current smart session to length bytes (up to the end if
+        None) at the given offset of its buffer. The start address of the
+        window is the session start address plus offset.
+
+        """
+        if length is None:
+            length = -1
+
+        _opcodes.set_smart_disassemble_range(self._ptr, offset, length)
+
+    def start_smart_disassemble(self, start_address, callback,
+        insn_types=None, metadata_only=False):
         """
         Invok the callback function for every instruction disassembled at the
         previously initialized smart session with the given offset from the
-        start address supplied (also in the initialization).
+        start address supplied (also in the initialization). If insn_types is
+        given only instructions of those types are reported.
+
+        With metadata_only the disassembly text isn't built (when the
+        architecture allows it) and the callback doesn't receive it.
+
+        """
+        _opcodes.start_smart_disassemble(self._ptr, start_address, callback,
+            0, get_insn_type_mask(insn_types), metadata_only)
 
+    def start_smart_disassemble_batch(self, start_address, callback,
+        batch_size=1024, insn_types=None, metadata_only=False):
         """
-        _opcodes.start_smart_disassemble(self._ptr, start_address, callback)
+        Just like start_smart_disassemble but invoking the callback with a
+        list of (address, size, branch_delay_insn, insn_type, target,
+        target2, disassembly) tuples (without disassembly if metadata_only)
+        for every batch_size instructions disassembled. Returning
+        PYBFD_DISASM_STOP stops the session after the current batch.
+
+        """
+        if batch_size <= 0:
+            raise OpcodesException("Invalid batch size.")
+
+        _opcodes.start_smart_disassemble(self._ptr, start_address, callback,
+            batch_size, get_insn_type_mask(insn_types), metadata_only)
 
     def print_single_instruction_callback(self, address, size, branch_delay_insn,
         insn_type, target, target2, disassembly):
@@ -139,13 +373,131 @@ class Opcodes(object):
 
         return PYBFD_DISASM_CONTINUE  # keep moving
 
-    def disassemble(self, data, start_address=0):
+    def disassemble(self, data, start_address=0, metadata_only=False):
         """
         Return a list containing the virtual memory address, instruction length
         and disassembly code for the given binary buffer.
+
+        With metadata_only the disassembly text isn't built (when the
+        architecture allows it) and the list holds (address, size,
+        branch_delay_insn, insn_type, target, target2) tuples instead.
         
         """
-        return _opcodes.disassemble(self._ptr, data, start_address)
+        return _opcodes.disassemble(
+            self._ptr, data, start_address, metadata_only)
+
+    def iter_disassemble(self, data, start_address=0):
+        """
+        Return an iterator yielding the virtual memory address, instruction
+        length and disassembly code for the given binary buffer decoding one
+        instruction at a time. The iterator keeps the current native state
+        alive so it outlives close() and the state eviction.
+
+        """
+        return _opcodes.iter_disassemble(self._ptr, data, start_address)
+
+    def disassemble_into(self, batch, data, start_address=0, offset=0):
+        """
+        Fill the given InstructionBatch with the instructions found at the
+        given offset of the binary buffer (mapped at start_address).
+
+        @return : The offset of the next instruction to disassemble.
+
+        """
+        batch.count, offset, batch.text_used = _opcodes.disassemble_into(
+            self._ptr, data, start_address, offset, batch.addresses,
+            batch.lengths, batch.types, batch.targets, batch.targets2,
+            batch.text, batch.text_offsets)
+
+        return offset
+
+    def disassemble_batches(self, data, start_address=0, batch=None):
+        """
+        Disassemble the given binary buffer in batches of instructions stored
+        in columnar buffers. The same InstructionBatch is refilled and
+        yielded for every batch so its contents must be consumed (or copied)
+        before moving on.
+
+        """
+        if batch is None:
+            batch = InstructionBatch()
+
+        offset = 0
+
+        while offset < len(data):
+            offset = self.disassemble_into(batch, data, start_address, offset)
+
+            if not batch.count:
+                break
+
+            yield batch
+
+    def recursive_disassemble(self, data, start_address=0, entry_points=None,
+        metadata_only=False):
+        """
+        Disassemble the given binary buffer following the control flow
+        (branch, conditional branch and call targets) from the given entry
+        points instead of sweeping it linearly. Entry points default to the
+        start address.
+
+        @return : A list of (address, size, branch_delay_insn, insn_type,
+                    target, target2, disassembly) tuples sorted by address
+                    (without the disassembly if metadata_only is set).
+
+        """
+        if entry_points is None:
+            entry_points = [start_address]
+
+        return _opcodes.recursive_disassemble(
+            self._ptr, data, start_address, entry_points, metadata_only)
+
+    def recursive_disassemble_section(self, abfd, section,
+        metadata_only=False):
+        """
+        Disassemble the given section of the BFD following the control flow
+        from the BFD start address and every function symbol inside it.
+
+        """
+        # Sections of relocatable objects share the same (zero) address so
+        # symbols must belong to the section itself.
+        entry_points = [address for address, symbol in \
+            abfd.symbols_in_range(section.vma, section.vma + section.size) \
+            if symbol.flags & SymbolFlags.FUNCTION and \
+                symbol.section is section]
+
+        entry_points.append(abfd.start_address)
+
+        return self.recursive_disassemble(
+            section.content, section.vma, entry_points, metadata_only)
+
+    def build_xrefs(self, data, start_address=0):
+        """Disassemble the given binary buffer and return an XrefIndex with
+        its cross references."""
+        return XrefIndex(_opcodes.build_xrefs(
+            self._ptr, [(data, start_address)]))
+
+    def build_bfd_xrefs(self, abfd, sections=None):
+        """
+        Return an XrefIndex with the cross references of the given sections
+        of the BFD (every executable section by default).
+
+        """
+        if sections is None:
+            from parallel import get_code_sections
+            sections = get_code_sections(abfd)
+
+        return XrefIndex(_opcodes.build_xrefs(self._ptr,
+            [(section.content, section.vma) for section in sections]))
+
+    def close(self):
+        """Release the underlying native disassembler structures."""
+        if self._ptr is not None:
+            _opcodes.deinitialize(self._ptr)
+            self._ptr = None
+
+        while self._states:
+            key, ptr = self._states.popitem()
+            _opcodes.deinitialize(ptr)
 
     @property
     def architecture(self):
@@ -153,12 +505,9 @@ class Opcodes(object):
 
     @architecture.setter
     def architecture(self, architecture):
-        if self._ptr is not None:
-            self._ptr = _opcodes.deinitialize(self._ptr)
-
-        self._ptr = _opcodes.set_architecture(architecture)
-
-        self._architecture = architecture
+        # The machine and endian go back to their defaults so only a state
+        # already configured that way is reused.
+        self.configure(architecture, DEFAULT_MACHINE, DEFAULT_ENDIAN)
 
     @property
     def machine(self):
@@ -183,6 +532,85 @@ class Opcodes(object):
         """Return the current architecture name accoding to its index."""
         return get_architecture_name(self.architecture)
 
+class OpcodesPool(object):
+    """
+    Pool of ready-initialized Opcodes instances. The pool itself may be
+    shared by several threads: instances are handed out to a single thread
+    at a time and reused afterwards, keyed by (architecture, machine, endian)
+    or by the BFD format they were created from. The decoding itself is
+    serialized by the native module (see Opcodes).
+
+    """
+
+    def __init__(self, max_idle=None):
+        """max_idle limits the number of idle instances kept per key."""
+        self._lock = Lock()
+        self._idle = {}
+        self._max_idle = max_idle
+
+    @staticmethod
+    def _get_key(args):
+        """Return the pool key for the given Opcodes constructor arguments.
+        Only for internal use.
+
+        """
+        if args and args[0].__class__.__name__ == "Bfd":
+            abfd = args[0]
+            return ("bfd", abfd.target, abfd.architecture, abfd.machine,
+                abfd.arch_size, abfd.endian)
+
+        return tuple(args)
+
+    def acquire(self, *args):
+        """
+        Return an Opcodes instance initialized with the given arguments (a
+        BFD or architecture, machine and endian just like the Opcodes
+        constructor). It must be given back with release().
+
+        """
+        key = self._get_key(args)
+
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+
+        # Initialize new instances outside the lock.
+        opcodes = Opcodes(*args)
+        opcodes._pool_key = key
+
+        return opcodes
+
+    def release(self, opcodes):
+        """Give back an instance obtained from acquire()."""
+        with self._lock:
+            idle = self._idle.setdefault(opcodes._pool_key, [])
+
+            if self._max_idle is None or len(idle) < self._max_idle:
+                idle.append(opcodes)
+                return
+
+        opcodes.close()
+
+    @contextmanager
+    def disassembler(self, *args):
+        """Context manager acquiring an instance and releasing it on exit."""
+        opcodes = self.acquire(*args)
+        try:
+            yield opcodes
+        finally:
+            self.release(opcodes)
+
+    def clear(self):
+        """Release every idle instance."""
+        with self._lock:
+            idle = self._idle.values()
+            self._idle = {}
+
+        for instances in idle:
+            for opcodes in instances:
+                opcodes.close()
+
 def main():
     """Test case for simple opcode disassembly."""
     test_targets = (    
@@ -0,0 +1,130 @@
+# 
+# Copyright (c) 2013 Groundworks Technologies
+# 
+# This code is part PyBFD module (libbfd & libopcodes extension module)
+#
+
+from multiprocessing import Pool, cpu_count
+
+from opcodes import Opcodes
+from section import SectionFlags
+from symbol import SymbolFlags
+
+__author__      = "Groundworks Technologies OSS Team"
+__contact__     = "oss@groundworkstech.com"
+__company__     = "Groundworks Technologies"
+__year__        = "2013"
+__versaion__    = "0.1"
+
+__all__ = ["disassemble_bfd", "get_code_sections", "split_section"]
+
+# Sections larger than this are split in pieces disassembled separately.
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+CODE_SECTION_FLAGS = SectionFlags.CODE | SectionFlags.HAS_CONTENTS
+
+
+def get_code_sections(abfd):
+    """Return the executable sections with contents sorted by address."""
+    return sorted(
+        [section for section in abfd.sections.itervalues() \
+            if section.flags & CODE_SECTION_FLAGS == CODE_SECTION_FLAGS],
+        key=lambda section: section.vma)
+
+def split_section(abfd, section, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Split the section in pieces of about chunk_size bytes. Pieces only start
+    at function symbols (which are instruction boundaries) so sections
+    without them are never split.
+
+    @return : A list of (offset, size) tuples sorted by offset.
+
+    """
+    pieces = []
+    start = 0
+
+    for address, symbol in abfd.symbols_in_range(
+        section.vma, section.vma + section.size):
+
+        # Sections of relocatable objects share the same (zero) address.
+        if symbol.section is not section:
+            continue
+
+        offset = address - section.vma
+
+        if offset - start >= chunk_size and \
+            symbol.flags & SymbolFlags.FUNCTION:
+
+            pieces.append((start, offset - start))
+            start = offset
+
+    pieces.append((start, section.size - start))
+
+    return pieces
+
+# Disassembler of the BFD being processed by a worker process.
+_worker_opcodes = None
+
+def _init_worker(abfd):
+    """Create the disassembler of a worker process. The BFD is inherited
+    from the parent (fork) so only its in-memory description is used."""
+    global _worker_opcodes
+    _worker_opcodes = Opcodes(abfd)
+
+def _disassemble_piece(piece):
+    """Disassemble a (content, vma) piece in a worker process."""
+    return _worker_opcodes.disassemble(*piece)
+
+def disassemble_bfd(abfd, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Disassemble every executable section of the given BFD spreading the
+    work (whole sections or pieces of the large ones) among a pool of
+    worker processes. Most libopcodes backends aren't reentrant so threads
+    wouldn't decode in parallel. The parent reads the contents and merges
+    the results.
+
+    @return : A list of (section, instructions) tuples sorted by address
+                where instructions is a list of (vma, size, disassembly)
+                tuples just like Opcodes.disassemble returns.
+
+    """
+    if workers is None:
+        workers = cpu_count()
+
+    sections = get_code_sections(abfd)
+
+    tasks = [(section, offset, size) for section in sections \
+        for offset, size in split_section(abfd, section, chunk_size)]
+
+    # Contents are read on demand as the workers take the pieces.
+    pieces = ((section.get_content(offset, size), section.vma + offset) \
+        for section, offset, size in tasks)
+
+    if workers > 1 and len(tasks) > 1:
+        pool = Pool(min(workers, len(tasks)), _init_worker, (abfd,))
+        try:
+            # The results keep the order of the tasks.
+            results = list(pool.imap(_disassemble_piece, pieces))
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        opcodes = Opcodes(abfd)
+        try:
+            results = [opcodes.disassemble(*piece) for piece in pieces]
+        finally:
+            opcodes.close()
+
+    #
+    # Merge the pieces back into their sections.
+    #
+    merged = []
+
+    for (section, offset, size), instructions in zip(tasks, results):
+        if merged and merged[-1][0] is section:
+            merged[-1][1].extend(instructions)
+        else:
+            merged.append((section, instructions))
+
+    return merged
@@ -354,7 +354,8 @@ SectionAttributes = enum(
     "ALIGNMENT",
     "FLAGS",
     "FILE_POS",
-    "ENTSIZE"
+    "ENTSIZE",
+    "MAPPABLE"
     )
 
 
@@ -366,8 +367,38 @@ class BfdSectionException(BfdException):
 class BfdSection(object):
     """BFD section module handler."""
 
-    def __init__(self, bfd, section):
-        """Initialize BFD section instance."""
+    # Section attributes are cached in slots to avoid a round-trip to the
+    # native module on every access (and a per-instance dict).
+    __slots__ = (
+        "_bfd",
+        "_ptr",
+        "_index",
+        "_name",
+        "_size",
+        "_vma",
+        "_lma",
+        "_alignment",
+        "_flags",
+        "_file_offset",
+        "_entry_size",
+        "_mappable",
+        "_mapping",
+        "_compression_checked",
+        )
+
+    def __init__(self, bfd, section, attributes=None, mapping=None):
+        """Initialize BFD section instance.
+
+        @param bfd : The native bfd the section belongs to.
+        @param section : The native section pointer.
+        @param attributes : Optional sequence of the section attributes in
+                            SectionAttributes order (as returned by
+                            _bfd.get_sections_info). Fetched from the native
+                            section when not specified.
+        @param mapping : Optional memory map of the file holding the bfd.
+                            Used to read the content of mappable sections.
+
+        """
         self._ptr = section
         self.bfd = bfd
 
@@ -377,6 +408,33 @@ class BfdSection(object):
         if not section:
             raise BfdSectionException("Invalid BFD asection specified.")
 
+        if attributes is None:
+            attributes = [_bfd.get_section_attribute(section, attribute) \
+                for attribute in xrange(SectionAttributes.MAPPABLE + 1)]
+
+        self._index, self._name, self._size, self._vma, self._lma, \
+            self._alignment, self._flags, self._file_offset, \
+            self._entry_size, self._mappable = attributes
+
+        # Only uncompressed file-backed sections can be read from the map.
+        # Checking the compression reads the file so it's deferred until the
+        # map is actually used.
+        self._mapping = mapping if self._mappable else None
+        self._compression_checked = False
+
+    def _check_open(self):
+        """Raise if the BFD holding the section was closed. Only for internal
+        use."""
+        if self._ptr is None:
+            raise BfdSectionException("BFD already closed.")
+
+    def _detach(self):
+        """Forget the native section and the file memory map once the BFD is
+        closed. Only for internal use."""
+        self._ptr = None
+        self._bfd = None
+        self._mapping = None
+
     @property
     def bfd(self):
         return self._bfd
@@ -395,89 +453,143 @@ class BfdSection(object):
 
     @property
     def index(self):
-        #return self._index
-        return _bfd.get_section_attribute(self._ptr, SectionAttributes.INDEX)
-
-    #@index.setter
-    #def index(self, index):
-    #    self._index = index
+        return self._index
 
     @property
     def name(self):
-        return _bfd.get_section_attribute(self._ptr, SectionAttributes.NAME)
-        #return self._name
-
-    #@name.setter
-    #def name(self, name):
-    #    self._name = name
+        return self._name
 
     @property
     def size(self):
-        return _bfd.get_section_attribute(self._ptr, SectionAttributes.SIZE)
-        #return self._size
-
-    #@size.setter
-    #def size(self, size):
-    #    self._size = size
+        return self._size
 
     @property
     def vma(self):
-        return _bfd.get_section_attribute(self._ptr, SectionAttributes.VMA)
-        #return self._vma
-
-    #@vma.setter
-    #def vma(self, vma):
-    #    self._vma = vma
+        return self._vma
 
     @property
     def lma(self):
-        return _bfd.get_section_attribute(self._ptr, SectionAttributes.LMA)
-        #return self._lma
-
-    #@lma.setter
-    #def lma(self, lma):
-    #    self._lma = lma
+        return self._lma
 
     @property
     def alignment(self):
-        return _bfd.get_section_attribute(self._ptr, SectionAttributes.ALIGNMENT)
-        #return self._alignment
-
-    #@alignment.setter
-    #def alignment(self, alignment):
-    #    self._alignment = alignment
+        return self._alignment
 
     @property
     def flags(self):
-        return _bfd.get_section_attribute(self._ptr, SectionAttributes.FLAGS)
-        #return self._flags
-
-    #@flags.setter
-    #def flags(self, flags):
-    #    self._flags = flags
+        return self._flags
 
     @property
     def file_offset(self):
-        return _bfd.get_section_attribute(self._ptr, SectionAttributes.FILE_POS)
-        #return self._file_offset
-
-    #@file_offset.setter
-    #def file_offset(self, file_offset):
-    #    self._file_offset = file_offset
+        return self._file_offset
 
     @property
     def entry_size(self):
-        return _bfd.get_section_attribute(self._ptr, SectionAttributes.ENTSIZE)
+        return self._entry_size
+
+    @property
+    def mappable(self):
+        """
+        Indicate if the section content sits uncompressed on the file at the
+        section file offset.
+
+        """
+        if self._mappable and not self._compression_checked:
+            self._check_open()
+            self._compression_checked = True
+
+            if _bfd.section_is_compressed(self.bfd, self._ptr):
+                self._mappable = False
+                self._mapping = None
+
+        return self._mappable
 
     @property
     def content(self):
         """Return the entire section content."""
-        return _bfd.section_get_content(self.bfd, self._ptr, 0, self.size)
+        return self.get_content(0, self.size)
 
     def get_content(self, offset, size):
         """Return the specified number of bytes from the current section."""
+        self._check_open()
+
+        # Slice the file memory map when available instead of asking libbfd to
+        # allocate, read and copy the requested bytes.
+        if self._mapping is not None and self.mappable and 0 <= offset and \
+            offset + size <= self._size and \
+            self._file_offset + offset + size <= len(self._mapping):
+            start = self._file_offset + offset
+            return self._mapping[start : start + size]
+
         return _bfd.section_get_content(self.bfd, self._ptr, offset, size)
 
+    @property
+    def buffer(self):
+        """
+        Return the entire section content as a memoryview. The bytes are read
+        once, straight into the memory backing the view.
+
+        """
+        self._check_open()
+
+        return memoryview(
+            _bfd.section_get_buffer(self.bfd, self._ptr, 0, self.size))
+
+    def read_into(self, buffer, offset=0):
+        """
+        Fill the given writable buffer (bytearray, memoryview, etc.) in place
+        with the section content starting at the specified offset.
+
+        @return : The number of bytes read.
+
+        """
+        self._check_open()
+
+        return _bfd.section_read_into(self.bfd, self._ptr, buffer, offset)
+
+    def iter_chunks(self, chunk_size, overlap=0):
+        """
+        Iterate through the section content in chunks of at most chunk_size
+        bytes. Every chunk is read into the same preallocated buffer so
+        memory usage remains constant regardless of the section size.
+
+        Consecutive chunks share the given number of overlapping bytes (the
+        tail of a chunk is repeated at the beginning of the next one) to
+        allow pattern matching across chunk boundaries.
+
+        @return : A generator of (offset, chunk) tuples where chunk is a
+                    memoryview only valid until the next iteration.
+
+        """
+        if chunk_size <= 0:
+            raise BfdSectionException("Invalid chunk size (%d)" % chunk_size)
+
+        if not 0 <= overlap < chunk_size:
+            raise BfdSectionException("Invalid chunk overlap (%d)" % overlap)
+
+        chunk = bytearray(chunk_size)
+        view = memoryview(chunk)
+
+        # Section offset of the current chunk and amount of bytes kept from
+        # the previous one.
+        offset = 0
+        kept = 0
+
+        while offset + kept < self.size:
+            count = self.read_into(view[kept:], offset + kept)
+
+            yield offset, view[:kept + count]
+
+            if offset + kept + count >= self.size:
+                break
+
+            # Move the overlapping tail to the beginning of the buffer.
+            if overlap:
+                chunk[:overlap] = chunk[chunk_size - overlap:]
+
+            offset += chunk_size - overlap
+            kept = overlap
+
     def __str__(self):
         """Return section string representation."""
         return self.name
@@ -4,7 +4,11 @@
 # This code is part PyBFD module (libbfd & libopcodes extension module)
 #
 
-from collections import namedtuple
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple, Mapping
+from fnmatch import fnmatchcase
+from itertools import izip
 
 from bfd_base import BfdException
 
@@ -14,7 +18,8 @@ __company__     = "Groundworks Technologies"
 __year__        = "2013"
 __versaion__    = "0.1"
 
-__all__ = ["Symbol", "SymbolFlags", "SYMBOL_FLAGS_LIST", "SYMBOL_FLAGS_NAMES_SHORT"]
+__all__ = ["Symbol", "SymbolFlags", "SymbolTable", "SYMBOL_FLAGS_LIST",
+    "SYMBOL_FLAGS_NAMES_SHORT", "get_symbol_flags_names"]
 
 
 class SymbolFlags:
@@ -177,7 +182,322 @@ SYMBOL_FLAGS_NAMES_SHORT = {
     SymbolFlags.GNU_UNIQUE : "GNU_UNIQUE",
 }
 
+# Cache of the flag names present in every flagword value rendered so far.
+_SYMBOL_FLAGS_NAMES_CACHE = {}
+
+def get_symbol_flags_names(flags):
+    """Return a tuple with the names of the flags present in the given symbol
+    flagword.
+
+    """
+    try:
+        return _SYMBOL_FLAGS_NAMES_CACHE[flags]
+    except KeyError:
+        names = tuple([name for flag, name in \
+            SYMBOL_FLAGS_NAMES_SHORT.iteritems() if flags & flag == flag])
+
+        _SYMBOL_FLAGS_NAMES_CACHE[flags] = names
+
+        return names
+
+
 # A pointer to the BFD which owns the symbol. This information is necessary so
 # that a back end can work out what additional information (invisible to the
 # application writer) is carried with the symbol.
-Symbol = namedtuple("Symbol", "section, name, value, flags")
+class Symbol(namedtuple("Symbol", "section, name, value, flags")):
+    """Symbolic information. The flags are kept as the raw BFD flagword."""
+
+    __slots__ = ()
+
+    def has_flag(self, flag):
+        """Indicate if the given flag (or flags bitmask) is set."""
+        return self.flags & flag == flag
+
+    @property
+    def flags_names(self):
+        """Return a tuple with the names of the symbol flags."""
+        return get_symbol_flags_names(self.flags)
+
+
+class SymbolTable(Mapping):
+    """
+    Compact symbol table. Symbolic information is stored in parallel native
+    arrays (one entry per symbol) and every symbol name lives in a single
+    blob, so Symbol instances are only created when accessed.
+
+    It behaves as a read-only dictionary of symbols keyed by address (sorted
+    by address). Just like before, only the last symbol at a given address is
+    reachable this way and symbols belonging to unknown sections are left
+    out. Every symbol sharing an address is available through symbol_at().
+
+    """
+
+    def __init__(self, sections, addresses, values, flags, section_indexes,
+        names, name_offsets):
+        """
+        Initialize the symbol table from the columns returned by
+        _bfd.get_symbols_columns (arrays filled natively, used as is).
+
+        @param sections : Dictionary of sections keyed by section index.
+
+        """
+        self._sections = sections
+
+        self._addresses = addresses
+        self._values = values
+        self._flags = flags
+        self._section_indexes = section_indexes
+        self._names = names
+        self._name_offsets = name_offsets
+
+        # Table indexes sorted by symbol address, the sorted addresses
+        # themselves and the number of distinct addresses (built on first
+        # access by address).
+        self._order = None
+        self._sorted_addresses = None
+        self._distinct_addresses = 0
+
+        # Table indexes sorted by symbol name (built on first access by name).
+        self._name_order = None
+
+    @property
+    def count(self):
+        """Return the total number of symbols (including the unreachable
+        ones by address).
+
+        """
+        return len(self._addresses)
+
+    def name(self, index):
+        """Return the name of the symbol at the given table index."""
+        return self._names[
+            self._name_offsets[index] : self._name_offsets[index + 1]]
+
+    def symbol(self, index):
+        """Return a new Symbol instance for the given table index."""
+        return Symbol(
+            self._sections.get(self._section_indexes[index]),
+            self.name(index),
+            self._values[index],
+            self._flags[index])
+
+    def filter_flags(self, flags=SymbolFlags.NO_FLAGS,
+        exclude=SymbolFlags.NO_FLAGS):
+        """
+        Iterate through the symbols having every flag in the given bitmask set
+        and none of the flags in the exclude bitmask. Only the matching
+        symbols are created.
+
+        @return : A generator of (address, symbol) tuples.
+
+        """
+        sections = self._sections
+
+        for index, (symbol_flags, section_index) in \
+            enumerate(izip(self._flags, self._section_indexes)):
+
+            if symbol_flags & flags == flags and \
+                not symbol_flags & exclude and section_index in sections:
+
+                yield self._addresses[index], self.symbol(index)
+
+    def _build_address_index(self):
+        """Sort the symbols of known sections by address.
+        Only for internal use.
+
+        """
+        if self._order is not None:
+            return
+
+        addresses = self._addresses
+        sections = self._sections
+
+        # The sort is stable so symbols sharing an address keep their table
+        # order (the last one is the one reachable by key).
+        order = array("L", sorted(
+            [index for index, section_index in \
+                enumerate(self._section_indexes) if section_index in sections],
+            key=addresses.__getitem__))
+
+        sorted_addresses = array("L", [addresses[index] for index in order])
+
+        distinct = 0
+        previous = None
+        for address in sorted_addresses:
+            if address != previous:
+                distinct += 1
+                previous = address
+
+        self._order = order
+        self._sorted_addresses = sorted_addresses
+        self._distinct_addresses = distinct
+
+    def symbol_at(self, address):
+        """Return a list of every symbol located at the given address."""
+        self._build_address_index()
+
+        sorted_addresses = self._sorted_addresses
+
+        return [self.symbol(self._order[i]) for i in xrange(
+            bisect_left(sorted_addresses, address),
+            bisect_right(sorted_addresses, address))]
+
+    def nearest_symbol(self, address, flags=SymbolFlags.NO_FLAGS):
+        """
+        Return the closest symbol located at or before the given address
+        (i.e. the function containing it) having every flag in the given
+        bitmask set.
+
+        @return : A (symbol, offset) tuple where offset is the distance from
+                    the symbol address or None if there is no such symbol.
+
+        """
+        self._build_address_index()
+
+        i = bisect_right(self._sorted_addresses, address) - 1
+
+        while i >= 0:
+            index = self._order[i]
+
+            if self._flags[index] & flags == flags:
+                return self.symbol(index), address - self._addresses[index]
+
+            i -= 1
+
+        return None
+
+    def symbols_in_range(self, low, high):
+        """
+        Return a list of (address, symbol) tuples for every symbol located
+        between the low (inclusive) and high (exclusive) addresses sorted by
+        address.
+
+        """
+        self._build_address_index()
+
+        sorted_addresses = self._sorted_addresses
+
+        return [(sorted_addresses[i], self.symbol(self._order[i])) \
+            for i in xrange(
+                bisect_left(sorted_addresses, low),
+                bisect_left(sorted_addresses, high))]
+
+    def _build_name_index(self):
+        """Sort the symbols of known sections by name.
+        Only for internal use.
+
+        """
+        if self._name_order is not None:
+            return
+
+        sections = self._sections
+
+        self._name_order = array("L", sorted(
+            [index for index, section_index in \
+                enumerate(self._section_indexes) if section_index in sections],
+            key=self.name))
+
+    def _names_from(self, prefix):
+        """Iterate through the sorted name positions of every symbol whose
+        name starts with the given prefix. Only for internal use.
+
+        """
+        self._build_name_index()
+
+        order = self._name_order
+        count = len(order)
+
+        i = bisect_left(_SortedNames(self), prefix)
+
+        while i < count and self.name(order[i]).startswith(prefix):
+            yield i
+            i += 1
+
+    def symbols_by_name(self, name):
+        """Return a list of (address, symbol) tuples for every symbol with the
+        given name."""
+        self._build_name_index()
+
+        names = _SortedNames(self)
+
+        return [(self._addresses[self._name_order[i]],
+            self.symbol(self._name_order[i])) for i in xrange(
+                bisect_left(names, name), bisect_right(names, name))]
+
+    def symbols_with_prefix(self, prefix):
+        """Return a list of (address, symbol) tuples for every symbol whose
+        name starts with the given prefix sorted by name."""
+        return [(self._addresses[self._name_order[i]],
+            self.symbol(self._name_order[i])) for i in self._names_from(prefix)]
+
+    def symbols_matching(self, pattern):
+        """
+        Return a list of (address, symbol) tuples for every symbol whose name
+        matches the given glob pattern (e.g. "_ZN7MyClass*") sorted by name.
+        Only the names sharing the literal prefix of the pattern are tested.
+
+        """
+        prefix = pattern
+        for i, char in enumerate(pattern):
+            if char in "*?[":
+                prefix = pattern[:i]
+                break
+
+        result = []
+
+        for i in self._names_from(prefix):
+            index = self._name_order[i]
+            name = self.name(index)
+
+            if fnmatchcase(name, pattern):
+                result.append((self._addresses[index], self.symbol(index)))
+
+        return result
+
+    def __getitem__(self, address):
+        self._build_address_index()
+
+        i = bisect_right(self._sorted_addresses, address) - 1
+
+        if i < 0 or self._sorted_addresses[i] != address:
+            raise KeyError(address)
+
+        return self.symbol(self._order[i])
+
+    def __contains__(self, address):
+        self._build_address_index()
+
+        i = bisect_left(self._sorted_addresses, address)
+
+        return i < len(self._sorted_addresses) and \
+            self._sorted_addresses[i] == address
+
+    def __iter__(self):
+        self._build_address_index()
+
+        previous = None
+        for address in self._sorted_addresses:
+            if address != previous:
+                yield address
+                previous = address
+
+    def __len__(self):
+        self._build_address_index()
+
+        return self._distinct_addresses
+
+
+class _SortedNames(object):
+    """Sequence view of the symbol names in sorted order used to bisect the
+    name index of a SymbolTable."""
+
+    __slots__ = ("_table",)
+
+    def __init__(self, table):
+        self._table = table
+
+    def __getitem__(self, i):
+        return self._table.name(self._table._name_order[i])
+
+    def __len__(self):
+        return len(self._table._name_order)
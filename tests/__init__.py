@@ -0,0 +1,18 @@
+#
+# Copyright (c) 2013 Groundworks Technologies
+#
+# This code is part PyBFD module (libbfd & libopcodes extension module)
+#
+# The tests run against a built tree (python setup.py build) or an installed
+# package. The generated bfd_archs module and the extension modules are only
+# found there, so the build directory takes precedence over the sources.
+#
+
+import sys
+from glob import glob
+from os.path import abspath, dirname, join
+
+TOP_DIRECTORY = dirname(dirname(abspath(__file__)))
+
+for build_lib in glob(join(TOP_DIRECTORY, "build", "lib*")):
+    sys.path.insert(0, build_lib)
@@ -0,0 +1,112 @@
+#
+# Copyright (c) 2013 Groundworks Technologies
+#
+# This code is part PyBFD module (libbfd & libopcodes extension module)
+#
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from StringIO import StringIO
+
+try:
+    from pybfd import batch
+except ImportError:
+    batch = None
+
+
+def fake_scan_file(path, symbols=True, disassemble=False):
+    """Stand-in for batch.scan_file (inherited by the forked workers)
+    misbehaving according to the path name."""
+    if path.startswith("hang"):
+        time.sleep(60)
+    elif path.startswith("crash"):
+        os._exit(1)
+    elif path.startswith("error"):
+        raise ValueError("unknown format")
+
+    return {"path" : path, "symbols" : symbols}
+
+
+@unittest.skipIf(batch is None, "the pybfd extensions aren't built")
+class ScanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scan_file = batch.scan_file
+        batch.scan_file = fake_scan_file
+
+    def tearDown(self):
+        batch.scan_file = self.scan_file
+
+    def scan(self, paths, **kwargs):
+        """Return the number of files scanned and their records by path."""
+        output = StringIO()
+
+        count = batch.scan(paths, output, **kwargs)
+
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+
+        self.assertEqual(len(records), len(paths))
+
+        return count, dict((record["path"], record) for record in records)
+
+    def test_scan(self):
+        paths = ["file%d" % i for i in xrange(8)]
+
+        count, records = self.scan(paths, workers=3, symbols=False)
+
+        self.assertEqual(count, len(paths))
+        self.assertEqual(sorted(records), paths)
+        self.assertFalse(records["file0"]["symbols"])
+
+    def test_lost_workers(self):
+        paths = ["file0", "hang0", "crash0", "error0", "file1", "crash1",
+            "file2", "file3"]
+
+        start = time.time()
+        count, records = self.scan(paths, workers=2, timeout=1)
+
+        # Workers are replaced and every file is reported once.
+        self.assertEqual(count, len(paths))
+        self.assertEqual(records["hang0"]["error"], "timeout")
+        self.assertEqual(records["crash0"]["error"], "crashed")
+        self.assertEqual(records["crash1"]["error"], "crashed")
+        self.assertEqual(records["error0"]["error"], "unknown format")
+        self.assertNotIn("error", records["file3"])
+        self.assertLess(time.time() - start, 30)
+
+
+@unittest.skipIf(batch is None, "the pybfd extensions aren't built")
+class IterPathsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        os.makedirs(os.path.join(self.directory, "b"))
+        for name in ("a", "b/c", "b/d"):
+            open(os.path.join(self.directory, name), "w").close()
+
+        os.symlink(os.path.join(self.directory, "a"),
+            os.path.join(self.directory, "b", "link"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_iter_paths(self):
+        files_from = StringIO("listed0\n\nlisted1\r\n")
+
+        paths = list(batch.iter_paths(
+            [self.directory, "single"], files_from))
+
+        self.assertEqual(paths, ["listed0", "listed1",
+            os.path.join(self.directory, "a"),
+            os.path.join(self.directory, "b", "c"),
+            os.path.join(self.directory, "b", "d"),
+            "single"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+#
+# Copyright (c) 2013 Groundworks Technologies
+#
+# This code is part PyBFD module (libbfd & libopcodes extension module)
+#
+
+import sys
+import unittest
+from os.path import realpath
+
+try:
+    from pybfd.bfd import Bfd
+except ImportError:
+    Bfd = None
+
+# Any executable file does. The interpreter is always at hand.
+EXECUTABLE = realpath(sys.executable)
+
+
+@unittest.skipIf(Bfd is None, "the _bfd extension isn't built")
+class BfdTest(unittest.TestCase):
+
+    def setUp(self):
+        with open(EXECUTABLE, "rb") as fd:
+            self.data = fd.read()
+
+        self.abfd = Bfd(EXECUTABLE)
+
+    def tearDown(self):
+        self.abfd.close()
+
+    def test_lazy_loading(self):
+        # Nothing is extracted until the sections are used.
+        self.assertIsNone(self.abfd._sections)
+        self.assertIsNone(self.abfd._symbols)
+
+        self.assertIn(".text", self.abfd.sections)
+        self.assertIsNone(self.abfd._symbols)
+
+    def test_load(self):
+        abfd = Bfd(EXECUTABLE, load=True)
+
+        try:
+            self.assertIsNotNone(abfd._sections)
+            self.assertIsNotNone(abfd._symbols)
+        finally:
+            abfd.close()
+
+    def test_section_content(self):
+        text = self.abfd.sections[".text"]
+        offset = text.file_offset
+
+        self.assertEqual(text.content, self.data[offset : offset + text.size])
+        self.assertEqual(text.get_content(1, 2), text.content[1:3])
+        self.assertEqual(text.buffer.tobytes(), text.content)
+
+    def test_read_into(self):
+        text = self.abfd.sections[".text"]
+        buffer = bytearray(3)
+
+        self.assertEqual(text.read_into(buffer, 1), 3)
+        self.assertEqual(str(buffer), text.content[1:4])
+
+    def test_iter_chunks(self):
+        text = self.abfd.sections[".text"]
+        content = text.content
+
+        chunks = [(offset, chunk.tobytes()) \
+            for offset, chunk in text.iter_chunks(4096, overlap=16)]
+
+        for offset, chunk in chunks:
+            self.assertEqual(chunk, content[offset : offset + 4096])
+
+        # Consecutive chunks overlap and the last one reaches the end.
+        self.assertEqual([offset for offset, chunk in chunks],
+            range(0, len(chunks) * 4080, 4080))
+        self.assertEqual(chunks[-1][0] + len(chunks[-1][1]), len(content))
+
+    def test_from_bytes(self):
+        for data in (self.data, bytearray(self.data)):
+            abfd = Bfd.from_bytes(data)
+
+            try:
+                self.assertEqual(abfd.architecture, self.abfd.architecture)
+                self.assertEqual(sorted(abfd.sections),
+                    sorted(self.abfd.sections))
+                self.assertEqual(abfd.sections[".text"].content,
+                    self.abfd.sections[".text"].content)
+            finally:
+                abfd.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+#
+# Copyright (c) 2013 Groundworks Technologies
+#
+# This code is part PyBFD module (libbfd & libopcodes extension module)
+#
+
+import unittest
+
+try:
+    from pybfd.cfg import CfgBuilder, EdgeKind
+    from pybfd.opcodes import InstructionType
+except ImportError:
+    CfgBuilder = None
+else:
+    NON_BRANCH = InstructionType.NON_BRANCH
+    BRANCH = InstructionType.BRANCH
+    COND_BRANCH = InstructionType.COND_BRANCH
+    JSR = InstructionType.JSR
+
+    # (address, size, branch_delay_insns, insn_type, target, target2) like
+    # the ones of Opcodes.recursive_disassemble with metadata_only.
+    INSTRUCTIONS = [
+        # Loop calling the function at 0x200.
+        (0x100, 1, 0, NON_BRANCH, 0, 0),
+        (0x101, 2, 0, COND_BRANCH, 0x106, 0),
+        (0x103, 2, 0, JSR, 0x200, 0),
+        (0x105, 1, 0, NON_BRANCH, 0, 0),
+        (0x106, 1, 0, NON_BRANCH, 0, 0),
+        (0x107, 2, 0, COND_BRANCH, 0x101, 0),
+        (0x109, 1, 0, BRANCH, 0, 0),
+
+        (0x200, 1, 0, NON_BRANCH, 0, 0),
+        (0x201, 1, 0, BRANCH, 0, 0),
+
+        # Branches with a delay slot skipping unreachable code.
+        (0x300, 4, 1, BRANCH, 0x30c, 0),
+        (0x304, 4, 0, NON_BRANCH, 0, 0),
+        (0x308, 4, 0, NON_BRANCH, 0, 0),
+        (0x30c, 4, 1, BRANCH, 0, 0),
+        (0x310, 4, 0, NON_BRANCH, 0, 0),
+        ]
+
+
+@unittest.skipIf(CfgBuilder is None, "pybfd isn't built")
+class CfgBuilderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.builder = CfgBuilder(INSTRUCTIONS)
+
+    def test_blocks(self):
+        graph = self.builder.build(0x100)
+
+        self.assertEqual(list(graph), [(0x100, 0x101), (0x101, 0x103),
+            (0x103, 0x106), (0x106, 0x109), (0x109, 0x10a)])
+        self.assertEqual(graph.entry_block, 0)
+        self.assertEqual(graph.block_index(0x104), 2)
+        self.assertIsNone(graph.block_index(0x10a))
+        self.assertEqual(list(graph.calls), [0x200])
+
+    def test_edges(self):
+        graph = self.builder.build(0x100)
+
+        self.assertEqual(graph.edge_count, 6)
+        self.assertEqual(graph.successors(0), [(1, EdgeKind.FALLTHROUGH)])
+        self.assertEqual(graph.successors(1),
+            [(3, EdgeKind.CONDITIONAL), (2, EdgeKind.FALLTHROUGH)])
+        self.assertEqual(graph.successors(3),
+            [(1, EdgeKind.CONDITIONAL), (4, EdgeKind.FALLTHROUGH)])
+        self.assertEqual(graph.successors(4), [])
+
+        self.assertEqual(graph.predecessors(1), [0, 3])
+        self.assertEqual(graph.predecessors(3), [1, 2])
+        self.assertEqual(graph.predecessors(0), [])
+
+    def test_delay_slots(self):
+        graph = self.builder.build(0x300)
+
+        self.assertEqual(list(graph), [(0x300, 0x308), (0x30c, 0x314)])
+        self.assertEqual(graph.successors(0), [(1, EdgeKind.JUMP)])
+        self.assertEqual(graph.successors(1), [])
+
+    def test_iter_functions(self):
+        graphs = list(self.builder.iter_functions([0x200, 0x100, 0x150,
+            0x100]))
+
+        self.assertEqual([graph.entry for graph in graphs], [0x100, 0x200])
+        self.assertEqual(graphs[1].block_count, 1)
+        self.assertIsNone(self.builder.build(0x150))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,238 @@
+#
+# Copyright (c) 2013 Groundworks Technologies
+#
+# This code is part PyBFD module (libbfd & libopcodes extension module)
+#
+
+import unittest
+from array import array
+
+try:
+    from pybfd.opcodes import Opcodes, OpcodesPool, InstructionBatch, \
+        InstructionType, XrefIndex, \
+        PYBFD_DISASM_CONTINUE, PYBFD_DISASM_STOP, \
+        DEFAULT_MACHINE, DEFAULT_ENDIAN, ARCH_I386, \
+        MACH_I386_I386_INTEL_SYNTAX, MACH_X86_64_INTEL_SYNTAX, \
+        ENDIAN_LITTLE, ENDIAN_MONO
+except ImportError:
+    Opcodes = None
+
+# nop ; nop ; je +1 ; nop ; jmp -7 ; ret
+CODE = "\x90\x90\x74\x01\x90\xeb\xf9\xc3"
+ADDRESS = 0x1000
+
+
+@unittest.skipIf(Opcodes is None, "the _opcodes extension isn't built")
+class SmartDisassembleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.opcodes = Opcodes(
+            ARCH_I386, MACH_I386_I386_INTEL_SYNTAX, ENDIAN_MONO)
+        self.opcodes.initialize_smart_disassemble(CODE, ADDRESS)
+
+    def tearDown(self):
+        self.opcodes.close()
+
+    def test_callback_returning_nothing_continues(self):
+        addresses = []
+
+        def callback(address, size, branch_delay_insn, insn_type,
+            target, target2, disassembly):
+            addresses.append(address)
+
+        self.opcodes.start_smart_disassemble(0, callback)
+
+        self.assertEqual(addresses,
+            [0x1000, 0x1001, 0x1002, 0x1004, 0x1005, 0x1007])
+
+    def test_callback_integral_results(self):
+        for result, expected in ((True, 1), (1L, 1), (False, 6),
+            (PYBFD_DISASM_STOP, 1), (PYBFD_DISASM_CONTINUE, 6)):
+            addresses = []
+
+            def callback(address, *args):
+                addresses.append(address)
+                return result
+
+            self.opcodes.start_smart_disassemble(0, callback)
+
+            self.assertEqual(len(addresses), expected)
+
+    def test_callback_invalid_result(self):
+        self.assertRaises(TypeError, self.opcodes.start_smart_disassemble,
+            0, lambda *args: "stop")
+
+    def test_batch_callback_returning_nothing_continues(self):
+        batches = []
+
+        self.opcodes.start_smart_disassemble_batch(0, batches.append,
+            batch_size=4)
+
+        self.assertEqual([len(batch) for batch in batches], [4, 2])
+        self.assertEqual(batches[1][-1][0], 0x1007)
+
+    def test_metadata_only(self):
+        types = []
+
+        self.opcodes.start_smart_disassemble(0,
+            lambda *args: types.append(args[3]), metadata_only=True)
+
+        self.assertEqual(types[2], InstructionType.COND_BRANCH)
+        self.assertEqual(types[4], InstructionType.BRANCH)
+
+
+@unittest.skipIf(Opcodes is None, "the _opcodes extension isn't built")
+class DisassembleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.opcodes = Opcodes(
+            ARCH_I386, MACH_I386_I386_INTEL_SYNTAX, ENDIAN_MONO)
+
+    def tearDown(self):
+        self.opcodes.close()
+
+    def test_iter_disassemble(self):
+        instructions = self.opcodes.disassemble(CODE, ADDRESS)
+
+        self.assertEqual([instruction[:2] for instruction in instructions],
+            [(0x1000, 1), (0x1001, 1), (0x1002, 2), (0x1004, 1), (0x1005, 2),
+            (0x1007, 1)])
+        self.assertEqual(
+            list(self.opcodes.iter_disassemble(CODE, ADDRESS)), instructions)
+
+    def test_iter_disassemble_outlives_close(self):
+        instructions = self.opcodes.disassemble(CODE, ADDRESS)
+        iterator = self.opcodes.iter_disassemble(CODE, ADDRESS)
+        first = next(iterator)
+
+        self.opcodes.close()
+
+        self.assertEqual([first] + list(iterator), instructions)
+
+    def test_disassemble_batches(self):
+        batch = InstructionBatch(capacity=4)
+        counts = []
+        instructions = []
+
+        for filled in self.opcodes.disassemble_batches(CODE, ADDRESS, batch):
+            self.assertIs(filled, batch)
+            counts.append(len(batch))
+            instructions.extend(batch)
+
+        self.assertEqual(counts, [4, 2])
+        self.assertEqual(instructions,
+            self.opcodes.disassemble(CODE, ADDRESS))
+        self.assertEqual(batch.types[0], InstructionType.BRANCH)
+        self.assertEqual(batch.targets[0], 0x1000)
+        self.assertRaises(IndexError, batch.disassembly, 2)
+
+    def test_pool(self):
+        pool = OpcodesPool(max_idle=1)
+        args = (ARCH_I386, MACH_I386_I386_INTEL_SYNTAX, ENDIAN_MONO)
+
+        with pool.disassembler(*args) as first:
+            with pool.disassembler(*args) as second:
+                self.assertIsNot(first, second)
+
+        # Only one idle instance is kept (the other one is closed).
+        with pool.disassembler(*args) as opcodes:
+            self.assertIn(opcodes, (first, second))
+            self.assertEqual(opcodes.disassemble(CODE, ADDRESS),
+                self.opcodes.disassemble(CODE, ADDRESS))
+
+        self.assertEqual([first._ptr, second._ptr].count(None), 1)
+
+        pool.clear()
+        self.assertIsNone(opcodes._ptr)
+
+    def test_recursive_disassemble(self):
+        instructions = self.opcodes.recursive_disassemble(CODE, ADDRESS,
+            metadata_only=True)
+
+        # The ret after the backward jump is never reached.
+        self.assertEqual([instruction[0] for instruction in instructions],
+            [0x1000, 0x1001, 0x1002, 0x1004, 0x1005])
+        self.assertEqual(instructions[2][3:5],
+            (InstructionType.COND_BRANCH, 0x1005))
+
+        instructions = self.opcodes.recursive_disassemble(CODE, ADDRESS,
+            [ADDRESS + 7])
+
+        self.assertEqual(len(instructions), 1)
+        self.assertEqual(instructions[0][:2], (0x1007, 1))
+
+@unittest.skipIf(Opcodes is None, "the _opcodes extension isn't built")
+class XrefIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        # Sorted by source plus the permutation sorting them by target.
+        self.xrefs = XrefIndex((
+            array("L", [0x10, 0x10, 0x20, 0x30]),
+            array("L", [0x100, 0x200, 0x100, 0x10]),
+            array("B", [InstructionType.JSR, InstructionType.DREF,
+                InstructionType.BRANCH, InstructionType.COND_BRANCH]),
+            array("L", [3, 0, 2, 1]),
+            array("L", [0x10, 0x100, 0x100, 0x200])))
+
+    def test_xrefs_from(self):
+        self.assertEqual(self.xrefs.xrefs_from(0x10),
+            [(0x100, InstructionType.JSR), (0x200, InstructionType.DREF)])
+        self.assertEqual(self.xrefs.xrefs_from(0x18), [])
+
+    def test_xrefs_to(self):
+        self.assertEqual(self.xrefs.xrefs_to(0x100),
+            [(0x10, InstructionType.JSR), (0x20, InstructionType.BRANCH)])
+        self.assertEqual(self.xrefs.xrefs_to(0x30), [])
+
+    def test_iteration(self):
+        self.assertEqual(len(self.xrefs), 4)
+        self.assertEqual(list(self.xrefs)[-1],
+            (0x30, 0x10, InstructionType.COND_BRANCH))
+
+    def test_build_xrefs(self):
+        opcodes = Opcodes(
+            ARCH_I386, MACH_I386_I386_INTEL_SYNTAX, ENDIAN_MONO)
+
+        try:
+            xrefs = opcodes.build_xrefs(CODE, ADDRESS)
+        finally:
+            opcodes.close()
+
+        self.assertEqual(list(xrefs), [
+            (0x1002, 0x1005, InstructionType.COND_BRANCH),
+            (0x1005, 0x1000, InstructionType.BRANCH)])
+        self.assertEqual(xrefs.xrefs_to(0x1000),
+            [(0x1005, InstructionType.BRANCH)])
+
+
+@unittest.skipIf(Opcodes is None, "the _opcodes extension isn't built")
+class ConfigurationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.opcodes = Opcodes(
+            ARCH_I386, MACH_X86_64_INTEL_SYNTAX, ENDIAN_LITTLE)
+
+    def tearDown(self):
+        self.opcodes.close()
+
+    def test_architecture_resets_machine_and_endian(self):
+        self.opcodes.architecture = ARCH_I386
+
+        self.assertEqual(self.opcodes.architecture, ARCH_I386)
+        self.assertEqual(self.opcodes.machine, DEFAULT_MACHINE)
+        self.assertEqual(self.opcodes.endian, DEFAULT_ENDIAN)
+
+    def test_configure_reuses_exact_state(self):
+        ptr = self.opcodes._ptr
+
+        self.opcodes.architecture = ARCH_I386
+        self.assertNotEqual(self.opcodes._ptr, ptr)
+
+        self.opcodes.configure(
+            ARCH_I386, MACH_X86_64_INTEL_SYNTAX, ENDIAN_LITTLE)
+        self.assertEqual(self.opcodes._ptr, ptr)
+        self.assertEqual(self.opcodes.machine, MACH_X86_64_INTEL_SYNTAX)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+#
+# Copyright (c) 2013 Groundworks Technologies
+#
+# This code is part PyBFD module (libbfd & libopcodes extension module)
+#
+
+import unittest
+
+try:
+    from pybfd import parallel
+    from pybfd.opcodes import Opcodes, \
+        ARCH_I386, MACH_I386_I386_INTEL_SYNTAX, ENDIAN_MONO
+    from pybfd.section import SectionFlags
+    from pybfd.symbol import Symbol, SymbolFlags
+except ImportError:
+    parallel = None
+
+
+class FakeSection(object):
+    """Section holding its content in a string."""
+
+    def __init__(self, name, vma, content, code=True):
+        self.name = name
+        self.vma = vma
+        self.size = len(content)
+        self.content = content
+        self.flags = SectionFlags.HAS_CONTENTS | \
+            (SectionFlags.CODE if code else 0)
+
+    def get_content(self, offset, size):
+        return self.content[offset : offset + size]
+
+
+class FakeBfd(object):
+    """BFD made of fake sections and (address, Symbol) tuples."""
+
+    def __init__(self, sections, symbols):
+        self.sections = dict((section.name, section) for section in sections)
+        self.symbols = sorted(symbols)
+
+    def symbols_in_range(self, low, high):
+        return [(address, symbol) for address, symbol in self.symbols \
+            if low <= address < high]
+
+
+def function(address, section, flags=None):
+    """Return an (address, Symbol) tuple of a function symbol."""
+    if flags is None:
+        flags = SymbolFlags.GLOBAL | SymbolFlags.FUNCTION
+
+    return address, Symbol(section, "f_%x" % address, 0, flags)
+
+def create_opcodes(abfd):
+    """Opcodes factory used instead of the BFD based one."""
+    return Opcodes(ARCH_I386, MACH_I386_I386_INTEL_SYNTAX, ENDIAN_MONO)
+
+
+@unittest.skipIf(parallel is None, "pybfd isn't built")
+class SplitSectionTest(unittest.TestCase):
+
+    def test_split_at_functions(self):
+        text = FakeSection(".text", 0x1000, "\x90" * 0x50)
+        abfd = FakeBfd([text],
+            [function(address, text) for address in range(0x1000, 0x1050, 8)])
+
+        self.assertEqual(parallel.split_section(abfd, text, 16),
+            [(0, 16), (16, 16), (32, 16), (48, 16), (64, 16)])
+        self.assertEqual(parallel.split_section(abfd, text, 0x100),
+            [(0, 0x50)])
+
+    def test_split_ignores_other_symbols(self):
+        text = FakeSection(".text", 0, "\x90" * 0x40)
+        init = FakeSection(".init", 0, "\x90" * 0x40)
+        abfd = FakeBfd([text, init], [
+            function(0x10, text, SymbolFlags.GLOBAL),
+            function(0x20, init),
+            function(0x30, text),
+            ])
+
+        # Only function symbols of the section itself start pieces.
+        self.assertEqual(parallel.split_section(abfd, text, 16),
+            [(0, 0x30), (0x30, 0x10)])
+        self.assertEqual(parallel.split_section(abfd, init, 16),
+            [(0, 0x20), (0x20, 0x20)])
+
+    def test_split_without_symbols(self):
+        text = FakeSection(".text", 0x1000, "\x90" * 0x40)
+
+        self.assertEqual(parallel.split_section(FakeBfd([text], []), text, 1),
+            [(0, 0x40)])
+
+
+@unittest.skipIf(parallel is None, "the _opcodes extension isn't built")
+class DisassembleBfdTest(unittest.TestCase):
+
+    def setUp(self):
+        self.opcodes_class = parallel.Opcodes
+        parallel.Opcodes = create_opcodes
+
+        text = FakeSection(".text", 0x1000, "\x90\xc3" * 40)
+        init = FakeSection(".init", 0x800, "\xc3\x90" * 5)
+        data = FakeSection(".data", 0x2000, "\x90" * 8, code=False)
+
+        self.abfd = FakeBfd([text, init, data],
+            [function(address, text) for address in range(0x1000, 0x1050, 8)])
+
+    def tearDown(self):
+        parallel.Opcodes = self.opcodes_class
+
+    def test_workers_keep_order(self):
+        serial = parallel.disassemble_bfd(self.abfd, workers=1, chunk_size=16)
+        pooled = parallel.disassemble_bfd(self.abfd, workers=3, chunk_size=16)
+
+        self.assertEqual([(section.name, len(instructions)) \
+            for section, instructions in pooled],
+            [(".init", 10), (".text", 80)])
+        self.assertEqual([instruction[0] for instruction in pooled[1][1]],
+            range(0x1000, 0x1050))
+        self.assertEqual(serial, pooled)
+
+
+if __name__ == "__main__":
+    unittest.main()
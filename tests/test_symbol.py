@@ -0,0 +1,154 @@
+#
+# Copyright (c) 2013 Groundworks Technologies
+#
+# This code is part PyBFD module (libbfd & libopcodes extension module)
+#
+
+import unittest
+from array import array
+
+try:
+    from pybfd.symbol import Symbol, SymbolFlags, SymbolTable
+except ImportError:
+    SymbolTable = None
+else:
+    FUNCTION = SymbolFlags.GLOBAL | SymbolFlags.FUNCTION
+    STATIC_FUNCTION = SymbolFlags.LOCAL | SymbolFlags.FUNCTION
+    OBJECT = SymbolFlags.GLOBAL
+
+    # (address, value, flags, section index, name) in table order.
+    SYMBOLS = [
+        (0x1000, 0x00, FUNCTION, 1, "main"),
+        (0x1010, 0x10, STATIC_FUNCTION, 1, "helper"),
+        (0x1010, 0x10, OBJECT, 1, "alias"),
+        (0x2000, 0x00, OBJECT, 2, "counter"),
+        (0x0000, 0x00, OBJECT, 99, "undefined"),
+        (0x1030, 0x30, FUNCTION, 1, "main_loop"),
+        ]
+
+TEXT = ".text"
+DATA = ".data"
+
+
+def create_table(symbols=None):
+    """Build a table (of SYMBOLS by default) from the same columns
+    _bfd.get_symbols_columns returns."""
+    if symbols is None:
+        symbols = SYMBOLS
+
+    offsets = array("L", [0])
+    for symbol in symbols:
+        offsets.append(offsets[-1] + len(symbol[4]))
+
+    return SymbolTable({1 : TEXT, 2 : DATA},
+        array("L", [symbol[0] for symbol in symbols]),
+        array("L", [symbol[1] for symbol in symbols]),
+        array("I", [symbol[2] for symbol in symbols]),
+        array("i", [symbol[3] for symbol in symbols]),
+        "".join([symbol[4] for symbol in symbols]),
+        offsets)
+
+def names(symbols):
+    """Return the names of a list of (address, symbol) tuples."""
+    return [symbol.name for address, symbol in symbols]
+
+
+@unittest.skipIf(SymbolTable is None, "pybfd isn't built")
+class SymbolTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = create_table()
+
+    def test_columns(self):
+        self.assertEqual(self.table.count, len(SYMBOLS))
+        self.assertEqual(self.table.name(5), "main_loop")
+        self.assertEqual(self.table.symbol(1),
+            Symbol(TEXT, "helper", 0x10, STATIC_FUNCTION))
+
+    def test_mapping_by_address(self):
+        # Symbols of unknown sections are left out.
+        self.assertEqual(list(self.table), [0x1000, 0x1010, 0x1030, 0x2000])
+        self.assertEqual(len(self.table), 4)
+        self.assertNotIn(0, self.table)
+
+        # The last symbol at an address is the one reachable by key.
+        self.assertEqual(self.table[0x1010].name, "alias")
+        self.assertEqual(self.table[0x2000].section, DATA)
+        self.assertRaises(KeyError, self.table.__getitem__, 0x1004)
+
+    def test_filter_flags(self):
+        self.assertEqual(names(self.table.filter_flags(SymbolFlags.FUNCTION)),
+            ["main", "helper", "main_loop"])
+        self.assertEqual(names(self.table.filter_flags(SymbolFlags.FUNCTION,
+            exclude=SymbolFlags.GLOBAL)), ["helper"])
+
+    def test_empty(self):
+        table = create_table([])
+
+        self.assertEqual(table.count, 0)
+        self.assertEqual(len(table), 0)
+        self.assertEqual(list(table), [])
+
+    def test_symbol_flags(self):
+        symbol = self.table.symbol(0)
+
+        self.assertTrue(symbol.has_flag(SymbolFlags.FUNCTION))
+        self.assertFalse(symbol.has_flag(STATIC_FUNCTION))
+        self.assertIn("FUNCTION", symbol.flags_names)
+
+    def test_symbol_at(self):
+        self.assertEqual([symbol.name for symbol in self.table.symbol_at(
+            0x1010)], ["helper", "alias"])
+        self.assertEqual(self.table.symbol_at(0x1014), [])
+
+    def test_nearest_symbol(self):
+        symbol, offset = self.table.nearest_symbol(0x1015)
+        self.assertEqual((symbol.name, offset), ("alias", 5))
+
+        symbol, offset = self.table.nearest_symbol(0x1025,
+            SymbolFlags.FUNCTION)
+        self.assertEqual((symbol.name, offset), ("helper", 0x15))
+
+        self.assertEqual(self.table.nearest_symbol(0x1000)[1], 0)
+        self.assertIsNone(self.table.nearest_symbol(0xfff))
+
+    def test_symbols_in_range(self):
+        self.assertEqual(self.table.symbols_in_range(0x1010, 0x2000),
+            [(0x1010, self.table.symbol(1)), (0x1010, self.table.symbol(2)),
+            (0x1030, self.table.symbol(5))])
+        self.assertEqual(self.table.symbols_in_range(0x1031, 0x2000), [])
+
+    def test_symbols_by_name(self):
+        self.assertEqual(self.table.symbols_by_name("main"),
+            [(0x1000, self.table.symbol(0))])
+        self.assertEqual(self.table.symbols_by_name("mai"), [])
+
+        # Symbols of unknown sections are left out.
+        self.assertEqual(self.table.symbols_by_name("undefined"), [])
+
+    def test_symbols_with_prefix(self):
+        self.assertEqual(names(self.table.symbols_with_prefix("main")),
+            ["main", "main_loop"])
+        self.assertEqual(names(self.table.symbols_with_prefix("")),
+            ["alias", "counter", "helper", "main", "main_loop"])
+        self.assertEqual(self.table.symbols_with_prefix("z"), [])
+
+    def test_symbols_matching(self):
+        self.assertEqual(names(self.table.symbols_matching("main*")),
+            ["main", "main_loop"])
+        self.assertEqual(names(self.table.symbols_matching("*l*")),
+            ["alias", "helper", "main_loop"])
+        self.assertEqual(names(self.table.symbols_matching("?elper")),
+            ["helper"])
+        self.assertEqual(names(self.table.symbols_matching("[ac]*")),
+            ["alias", "counter"])
+
+    def test_name_lookups_skip_address_index(self):
+        self.table.symbols_by_name("main")
+        self.table.symbols_matching("main*")
+
+        self.assertIsNone(self.table._order)
+
+
+if __name__ == "__main__":
+    unittest.main()